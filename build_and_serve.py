@@ -12,12 +12,23 @@ import http.server
 import socketserver
 import threading
 import time
-from datetime import datetime
+import uuid
+import sqlite3
+from datetime import datetime, timezone
+
+# The Range parser is shared with the SSH build tool's server
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "ssh_build_tool"))
+from build_server import parse_range_header
 
 # Configuration
 PROJECT_DIR = "/Users/ethfr/Downloads/SwiftSignerPro-Core"
 IPA_NAME = "Ksign.ipa"
 PORT = 8080
+# Same schema as the SSH build tool's history; report with: build_server.py --report --history <this file>
+HISTORY_DB = os.path.join(PROJECT_DIR, ".build", "build_history.sqlite3")
+
+# (name, kind, seconds) of each timed step of this run
+TIMINGS = []
 
 # Colors
 class Colors:
@@ -50,6 +61,53 @@ def print_error(msg):
 def print_info(msg):
     print(f"{Colors.YELLOW}ℹ {msg}{Colors.END}")
 
+def run_timed(name, step):
+    """Run a build step and record how long it took on the monotonic clock"""
+    started = time.monotonic()
+    try:
+        return step()
+    finally:
+        elapsed = time.monotonic() - started
+        TIMINGS.append((name, "phase", elapsed))
+        print_info(f"{name}: {elapsed:.1f}s")
+
+def record_history(started_at, duration, succeeded):
+    """Add this run and its step timings to the build history database"""
+    ipa_path = os.path.join(PROJECT_DIR, "packages", IPA_NAME)
+    branch = subprocess.run(["git", "rev-parse", "--abbrev-ref", "HEAD"], cwd=PROJECT_DIR,
+                            capture_output=True, text=True).stdout.strip() or "unknown"
+    try:
+        os.makedirs(os.path.dirname(HISTORY_DB), exist_ok=True)
+        connection = sqlite3.connect(HISTORY_DB, timeout=10)
+        try:
+            with connection:
+                connection.executescript("""
+                    CREATE TABLE IF NOT EXISTS builds (
+                        id INTEGER PRIMARY KEY, started_at TEXT NOT NULL, host TEXT NOT NULL, branch TEXT NOT NULL,
+                        project TEXT, outcome TEXT NOT NULL, duration REAL NOT NULL, artifact_size INTEGER, result_cache TEXT);
+                    CREATE INDEX IF NOT EXISTS builds_by_branch ON builds (branch, started_at);
+                    CREATE INDEX IF NOT EXISTS builds_by_host ON builds (host, started_at);
+                    CREATE INDEX IF NOT EXISTS builds_by_date ON builds (started_at);
+                    CREATE TABLE IF NOT EXISTS phases (
+                        build_id INTEGER NOT NULL REFERENCES builds (id) ON DELETE CASCADE, position INTEGER NOT NULL,
+                        name TEXT NOT NULL, kind TEXT NOT NULL, duration REAL NOT NULL, cached INTEGER NOT NULL DEFAULT 0);
+                    CREATE INDEX IF NOT EXISTS phases_by_build ON phases (build_id);
+                """)
+                build_id = connection.execute(
+                    "INSERT INTO builds (started_at, host, branch, project, outcome, duration, artifact_size) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (started_at.isoformat(), socket.gethostname(), branch, "Ksign",
+                     "succeeded" if succeeded else "failed", duration,
+                     os.path.getsize(ipa_path) if succeeded and os.path.exists(ipa_path) else None)
+                ).lastrowid
+                connection.executemany(
+                    "INSERT INTO phases (build_id, position, name, kind, duration) VALUES (?, ?, ?, ?, ?)",
+                    [(build_id, position, name, kind, seconds) for position, (name, kind, seconds) in enumerate(TIMINGS)])
+        finally:
+            connection.close()
+    except sqlite3.Error as e:
+        print_error(f"Could not record build history: {e}")
+
 def get_local_ip():
     """Get the local IP address"""
     try:
@@ -61,6 +119,95 @@ def get_local_ip():
     except:
         return "127.0.0.1"
 
+class RangeRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """SimpleHTTPRequestHandler with single/multi-range, HEAD and If-Range support"""
+
+    _ranges = None
+    _boundary = None
+
+    def end_headers(self):
+        if not self._ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        super().end_headers()
+
+    def send_head(self):
+        self._ranges = None
+        range_header = self.headers.get("Range")
+        path = self.translate_path(self.path)
+        if not range_header or not os.path.isfile(path):
+            return super().send_head()
+
+        try:
+            f = open(path, "rb")
+        except OSError:
+            self.send_error(404, "File not found")
+            return None
+
+        stat = os.fstat(f.fileno())
+        size = stat.st_size
+        last_modified = self.date_time_string(stat.st_mtime)
+
+        # If-Range only carries dates here since no ETags are issued
+        if_range = self.headers.get("If-Range")
+        if if_range and if_range.strip() != last_modified:
+            f.close()
+            return super().send_head()
+
+        ranges = parse_range_header(range_header, size)
+        if ranges is None:
+            f.close()
+            return super().send_head()
+        if not ranges:
+            f.close()
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None
+
+        content_type = self.guess_type(path)
+        self._ranges = ranges
+        self.send_response(206)
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.send_header("Content-Length", str(end - start + 1))
+        else:
+            self._boundary = uuid.uuid4().hex
+            self._part_headers = [
+                (f"\r\n--{self._boundary}\r\nContent-Type: {content_type}\r\n"
+                 f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n").encode("latin-1")
+                for start, end in ranges
+            ]
+            length = sum(len(h) for h in self._part_headers) + len(f"\r\n--{self._boundary}--\r\n")
+            length += sum(end - start + 1 for start, end in ranges)
+            self.send_header("Content-Type", f"multipart/byteranges; boundary={self._boundary}")
+            self.send_header("Content-Length", str(length))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Last-Modified", last_modified)
+        self.end_headers()
+        return f
+
+    def copyfile(self, source, outputfile):
+        if not self._ranges:
+            return super().copyfile(source, outputfile)
+
+        multipart = len(self._ranges) > 1
+        for i, (start, end) in enumerate(self._ranges):
+            if multipart:
+                outputfile.write(self._part_headers[i])
+            source.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = source.read(min(64 * 1024, remaining))
+                if not chunk:
+                    break
+                outputfile.write(chunk)
+                remaining -= len(chunk)
+        if multipart:
+            outputfile.write(f"\r\n--{self._boundary}--\r\n".encode("latin-1"))
+
 def build_ipa():
     """Build the Ksign IPA"""
     os.chdir(PROJECT_DIR)
@@ -148,11 +295,13 @@ def create_ipa():
             subprocess.run(["cp", f"deps/{f}", "Payload/Ksign.app/"], capture_output=True)
     
     # Create IPA
+    zip_started = time.monotonic()
     result = subprocess.run(
         ["zip", "-r9", f"packages/{IPA_NAME}", "Payload"],
         capture_output=True,
         text=True
     )
+    TIMINGS.append(("zip", "step", time.monotonic() - zip_started))
     
     if result.returncode != 0:
         print_error("Failed to create IPA")
@@ -254,7 +403,7 @@ def serve_ipa():
         f.write(html_content)
     
     # Custom handler
-    class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    class QuietHandler(RangeRequestHandler):
         def log_message(self, format, *args):
             if ".ipa" in args[0]:
                 print(f"{Colors.GREEN}📥 Download started: {args[0]}{Colors.END}")
@@ -283,13 +432,13 @@ def serve_ipa():
 
 def main():
     print_banner()
+    started_at = datetime.now(timezone.utc)
+    started = time.monotonic()
     
-    # Build
-    if not build_ipa():
-        sys.exit(1)
-    
-    # Create IPA
-    if not create_ipa():
+    # Build, then create the IPA
+    succeeded = run_timed("xcodebuild", build_ipa) and run_timed("Create IPA", create_ipa)
+    record_history(started_at, time.monotonic() - started, succeeded)
+    if not succeeded:
         sys.exit(1)
     
     # Serve
@@ -4,19 +4,43 @@ EthSign SSH Build Tool - Interactive CLI
 A menu-based CLI tool to remotely build iOS apps via SSH and serve the compiled IPA
 """
 
+import io
+import codecs
+import zlib
+import re
 import os
 import sys
 import time
 import json
+import shlex
+import shutil
+import argparse
+import html
+import zipfile
+import plistlib
 import socket
+import select
+import bisect
+import collections
+import contextlib
+import gzip
+import hashlib
+import hmac
+import sqlite3
+import unicodedata
 import threading
+import uuid
+import urllib.error
+import urllib.parse
+import urllib.request
 import subprocess
+import email.utils
 import http.server
 import socketserver
 import concurrent.futures
 from pathlib import Path
-from typing import Optional, List, Tuple
-from datetime import datetime
+from typing import Callable, Optional, List, Tuple
+from datetime import datetime, timedelta, timezone
 
 try:
     import paramiko
@@ -56,13 +80,142 @@ class Colors:
 
 def clear_screen():
     """Clear the terminal screen"""
-    os.system('cls' if os.name == 'nt' else 'clear')
+    print("\033[H\033[2J", end="", flush=True)
 
 
-def print_header():
-    """Print the application header"""
-    clear_screen()
-    print(f"""
+_ANSI_PATTERN = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+
+
+def visible_width(text: str) -> int:
+    """Terminal columns taken by `text`, ignoring color codes and counting wide characters twice"""
+    plain = _ANSI_PATTERN.sub("", text)
+    return sum(2 if unicodedata.east_asian_width(char) in ("W", "F") else 1 for char in plain)
+
+
+def fit_line(text: str, width: int) -> str:
+    """`text` unchanged if it fits in `width` columns, otherwise uncolored and cut short"""
+    if visible_width(text) <= width:
+        return text
+    plain = _ANSI_PATTERN.sub("", text)
+    while plain and visible_width(plain) > width - 1:
+        plain = plain[:-1]
+    return plain + "…"
+
+
+class ConsoleRouter(io.TextIOBase):
+    """sys.stdout replacement while the dashboard owns the screen.
+
+    The main thread writes to the terminal as usual. Output of other threads
+    (background builds, the web server) is kept as recent plain-text lines for
+    the dashboard to show; a carriage return replaces the current line.
+    """
+    
+    def __init__(self, terminal, max_lines: int = 200):
+        self.terminal = terminal
+        self.lines = collections.deque(maxlen=max_lines)
+        self._partial = ""
+        self._lock = threading.Lock()
+    
+    def write(self, text: str) -> int:
+        if threading.current_thread() is threading.main_thread():
+            return self.terminal.write(text)
+        with self._lock:
+            lines = (self._partial + _ANSI_PATTERN.sub("", text)).split("\n")
+            self._partial = lines.pop().rsplit("\r", 1)[-1]
+            self.lines.extend(line.rsplit("\r", 1)[-1] for line in lines if line.strip())
+        return len(text)
+    
+    def recent(self, count: int) -> List[str]:
+        with self._lock:
+            lines = list(self.lines) + ([self._partial] if self._partial.strip() else [])
+        return lines[-count:]
+    
+    def flush(self):
+        self.terminal.flush()
+    
+    def isatty(self) -> bool:
+        return self.terminal.isatty()
+    
+    def fileno(self) -> int:
+        return self.terminal.fileno()
+    
+    @property
+    def encoding(self):
+        return self.terminal.encoding
+
+
+class Dashboard:
+    """Draws a screen once, then rewrites only the lines that changed.
+
+    Updates move the cursor up from the prompt below the frame and restore it
+    afterwards, so whatever the user is typing at the prompt stays put. Without
+    a POSIX terminal the screen is drawn once and input blocks as before.
+    """
+    
+    REFRESH_INTERVAL = 0.5
+    
+    def __init__(self):
+        self.frame: List[str] = []
+        self.size = None
+    
+    @property
+    def live(self) -> bool:
+        return os.name != "nt" and sys.stdin.isatty() and sys.stdout.isatty()
+    
+    def draw(self, lines: List[str], prompt: str):
+        clear_screen()
+        print("\n".join(lines))
+        print(f"\n{prompt}", end="", flush=True)
+        self.frame = list(lines)
+        self.size = shutil.get_terminal_size()
+    
+    def update(self, lines: List[str], prompt: str):
+        size = shutil.get_terminal_size()
+        if len(lines) != len(self.frame) or size != self.size:
+            self.draw(lines, prompt)
+            return
+        
+        rows = [max(1, -(-visible_width(line) // size.columns)) for line in self.frame]
+        # The prompt row is the last on screen; rows further up than the screen can't be reached
+        reachable = min(sum(rows) + 2, size.lines)
+        updates = []
+        for index, (old, new) in enumerate(zip(self.frame, lines)):
+            if old == new:
+                continue
+            if rows[index] > 1 or visible_width(new) > size.columns:
+                self.draw(lines, prompt)
+                return
+            up = sum(rows[index:]) + 1
+            if up < reachable:
+                updates.append(f"\0337\033[{up}A\r\033[2K{new}\0338")
+        self.frame = list(lines)
+        if updates:
+            sys.stdout.write("".join(updates))
+            sys.stdout.flush()
+    
+    def read_choice(self, render: Callable[[], List[str]], prompt: str,
+                    interrupt: Callable[[], bool] = None) -> Optional[str]:
+        """Show `render()`, refreshing it until the user enters a line.
+
+        Returns None as soon as `interrupt()` is true, before the user entered anything.
+        """
+        self.draw(render(), prompt)
+        if not self.live:
+            return input().strip()
+        while True:
+            ready, _, _ = select.select([sys.stdin], [], [], self.REFRESH_INTERVAL)
+            if ready:
+                line = sys.stdin.readline()
+                if not line:
+                    raise EOFError
+                return line.strip()
+            if interrupt and interrupt():
+                print()
+                return None
+            self.update(render(), prompt)
+
+
+HEADER = f"""
 {Colors.CYAN}╔═══════════════════════════════════════════════════════════════════════════════╗
 ║                                                                               ║
 ║   {Colors.GREEN}███████╗████████╗██╗  ██╗███████╗██╗ ██████╗ ███╗   ██╗{Colors.CYAN}                    ║
@@ -75,7 +228,13 @@ def print_header():
 ║                    {Colors.WHITE}SSH Build Tool & IPA Server v2.0{Colors.CYAN}                         ║
 ║                    {Colors.GRAY}Remote Xcode Build System{Colors.CYAN}                                 ║
 ╚═══════════════════════════════════════════════════════════════════════════════╝{Colors.ENDC}
-""")
+"""
+
+
+def print_header():
+    """Print the application header"""
+    clear_screen()
+    print(HEADER)
 
 
 def print_box(title: str, content: list, width: int = 60):
@@ -111,14 +270,44 @@ class ConfigManager:
             "branch": "main",
             "target_dir": "~/EthSign-build",
             "use_makefile": True,
-            "project_name": "Ksign"
+            "project_name": "Ksign",
+            "workspace_mode": "incremental",
+            "cache_dir": "~/.ethsign-build-cache",
+            "cache_limit_gb": 30
         },
         "server": {
             "port": 8080,
-            "auto_start": True
+            "auto_start": True,
+            "max_connections": 64,
+            "idle_timeout": 15,
+            "write_timeout": 60,
+            "bandwidth_limit_mbps": 0,
+            "priority_reserve": 4
+        },
+        "farm": {
+            "hosts": [],
+            "required_xcode": "",
+            "min_free_gb": 20
+        },
+        "daemon": {
+            "api_bind": "127.0.0.1",
+            "api_port": 8081,
+            "api_token": "",
+            "concurrency": 1,
+            "keep_jobs": 200
         },
         "output": {
-            "local_dir": "./build_output"
+            "local_dir": "./build_output",
+            "log_tail_lines": 2000,
+            "keep_build_logs": 20
+        },
+        "transfer": {
+            "channels": 4,
+            "chunk_size_mb": 8,
+            "packaging": "remote",
+            "keep_remote_package": True,
+            "benchmark_mb": 64,
+            "tuning": {}
         }
     }
     
@@ -166,41 +355,286 @@ class ConfigManager:
         for key in keys[:-1]:
             config = config.setdefault(key, {})
         config[keys[-1]] = value
+    
+    def overlay(self, **sections: dict) -> "ConfigOverlay":
+        """A view of this configuration with some keys of the given sections replaced"""
+        return ConfigOverlay(self, sections)
+    
+    def for_host(self, host: dict) -> "ConfigOverlay":
+        """A view of this configuration with the SSH settings of one build farm host"""
+        return self.overlay(ssh=host)
+
+
+class ConfigOverlay(ConfigManager):
+    """Configuration view used for one build host or one queued job.
+
+    Keys missing from an overridden section fall back to the parent's values.
+    Every other section is shared with the parent configuration, and saving
+    goes through the parent. The overrides themselves are never saved.
+    """
+    
+    def __init__(self, parent: ConfigManager, sections: dict):
+        self.parent = parent
+        self.config = dict(parent.config)
+        for section, values in sections.items():
+            self.config[section] = {**parent.config.get(section, {}), **values}
+    
+    def save(self):
+        self.parent.save()
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # SSH BUILD CLIENT
 # ═══════════════════════════════════════════════════════════════════════════════
 
+class BuildSupervisor:
+    """Scans remote output for fatal errors as it streams in.
+
+    Once a fatal line is seen the supervisor trips; `execute` then kills the
+    remote process group. The first few error lines are kept for the summary.
+    """
+    
+    # Each pattern is tied to the start of a diagnostic line, so log text that merely
+    # mentions an error (notes, warnings, test names) never stops a build
+    FATAL_PATTERNS = [
+        re.compile(rb"^(?:[^\s:][^:]*:\d+:(?:\d+:)? )?(?:fatal )?error: "),  # [<file>:<line>[:<col>]: ]error: ...
+        re.compile(rb"^(?:clang(?:\+\+)?|swift(?:c|-frontend)?|ld|xcodebuild|xcrun|codesign|libtool|lipo|actool|ibtool): "
+                   rb"(?:fatal )?error: "),  # clang: error: linker command failed, xcodebuild: error: ...
+        re.compile(rb"^ld: (?!warning: |note: )"),  # ld: library not found for -lPods, ld: symbol(s) not found
+        re.compile(rb"^\*\* (?:ARCHIVE|BUILD|CLEAN) FAILED \*\*"),
+        re.compile(rb"^(?:Code ?Sign(?:ing)? [Ee]rror: |[^\s:][^:]*: errSecInternalComponent$)"),
+        re.compile(rb"^fatal: "),  # git
+    ]
+    MAX_ERRORS = 10
+    
+    def __init__(self, patterns: List["re.Pattern"] = None):
+        self.patterns = patterns or self.FATAL_PATTERNS
+        self.errors: List[str] = []
+        self._partial = b""
+    
+    @property
+    def tripped(self) -> bool:
+        return bool(self.errors)
+    
+    def feed(self, data: bytes) -> bool:
+        """Scan a chunk of output; returns True once a fatal pattern has matched"""
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        if len(self.errors) < self.MAX_ERRORS:
+            for line in lines:
+                line = line.rstrip(b"\r")
+                if any(pattern.match(line) for pattern in self.patterns):
+                    self.errors.append(line.decode(errors="replace"))
+                    if len(self.errors) >= self.MAX_ERRORS:
+                        break
+        return self.tripped
+
+
+class BuildCancelled(Exception):
+    """Raised by SSHBuildClient.execute once the build has been cancelled"""
+
+
+class BuildLog:
+    """Remote output log: a fixed-size tail in memory plus a gzip spool of each full build.
+
+    Output is appended as raw bytes; only complete lines enter the tail, and they
+    are decoded only when the tail is read.
+    """
+    
+    def __init__(self, max_lines: int = 2000):
+        self.lines = collections.deque(maxlen=max_lines)
+        self.spool_path: Optional[str] = None
+        self._spool = None
+        self._partial = b""
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self.lines)
+    
+    def command(self, command: str):
+        """Log the start of a remote command, terminating any unfinished output line"""
+        prefix = b"\n" if self._partial else b""
+        self.write(prefix + f"$ {command}\n".encode())
+    
+    def write(self, data: bytes):
+        with self._lock:
+            if self._spool:
+                self._spool.write(data)
+            lines = (self._partial + data).split(b"\n")
+            self._partial = lines.pop()
+            self.lines.extend(lines)
+    
+    def tail(self, count: int = 50) -> List[str]:
+        with self._lock:
+            lines = list(self.lines)[-count:]
+        return [line.decode(errors="replace").rstrip("\r") for line in lines]
+    
+    def start_spool(self, directory: str, keep: int = 20, label: str = None) -> str:
+        """Start writing all output to a new `build-<timestamp>[-<label>].log.gz` in `directory`"""
+        self.stop_spool()
+        os.makedirs(directory, exist_ok=True)
+        name = f"build-{datetime.now().strftime('%Y%m%d-%H%M%S')}{f'-{label}' if label else ''}.log.gz"
+        path = os.path.join(directory, name)
+        with self._lock:
+            self._spool = gzip.open(path, "ab", compresslevel=6)
+            self.spool_path = path
+        
+        spools = sorted(Path(directory).glob("build-*.log.gz"), reverse=True)
+        for stale in spools[keep:]:
+            stale.unlink()
+        return path
+    
+    def stop_spool(self):
+        with self._lock:
+            if self._spool:
+                if self._partial:
+                    self.lines.append(self._partial)
+                    self._partial = b""
+                self._spool.close()
+                self._spool = None
+
+
+class BuildProgress:
+    """Live state of one build, updated from the build's threads and read by viewers.
+
+    Every change is also kept as a timestamped event, newest last.
+    """
+    
+    def __init__(self):
+        self.phase = "Waiting"
+        self.steps: "collections.OrderedDict[str, str]" = collections.OrderedDict()
+        self.transferred = 0
+        self.transfer_total = 0
+        self.rate = 0.0
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+        self.succeeded: Optional[bool] = None
+        self.events = collections.deque(maxlen=100)
+        # (name, "phase" or "step", seconds, skipped because cached), in the order they finished
+        self.timings: List[Tuple[str, str, float, bool]] = []
+        self._phase_started: Optional[float] = None
+        self._step_started = {}
+        self._transfer_started: Optional[float] = None
+        self._transfer_base = 0
+        self._lock = threading.Lock()
+    
+    def _event(self, kind: str, detail: str):
+        self.events.append((time.time(), kind, detail))
+    
+    def _close_phase(self):
+        if self._phase_started is not None:
+            self.timings.append((self.phase, "phase", time.monotonic() - self._phase_started, False))
+            self._phase_started = None
+    
+    def set_phase(self, phase: str):
+        with self._lock:
+            self._close_phase()
+            self.phase = phase
+            self._phase_started = time.monotonic()
+            self._transfer_started = None
+            self._event("phase", phase)
+    
+    def end_phase(self):
+        """Stop timing the current phase"""
+        with self._lock:
+            self._close_phase()
+    
+    def set_step(self, name: str, state: str):
+        """Record a pipeline step as running, done, skipped or failed"""
+        with self._lock:
+            self.steps[name] = state
+            if state == "running":
+                self._step_started[name] = time.monotonic()
+            else:
+                started = self._step_started.pop(name, None)
+                elapsed = time.monotonic() - started if started is not None else 0.0
+                self.timings.append((name, "step", elapsed, state == "skipped"))
+            self._event("step", f"{name}: {state}")
+    
+    def set_transfer(self, transferred: int, total: int = 0):
+        with self._lock:
+            now = time.monotonic()
+            if self._transfer_started is None:
+                self._transfer_started = now
+                self._transfer_base = transferred
+            self.transferred = transferred
+            self.transfer_total = total
+            self.rate = (transferred - self._transfer_base) / max(now - self._transfer_started, 1e-6)
+    
+    def finish(self, succeeded: bool):
+        with self._lock:
+            self._close_phase()
+            self.finished = time.monotonic()
+            self.succeeded = succeeded
+            self.phase = "Done" if succeeded else "Failed"
+            self._event("finished", self.phase)
+    
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+    
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "phase": self.phase,
+                "steps": dict(self.steps),
+                "transferred": self.transferred,
+                "transfer_total": self.transfer_total,
+                "rate": round(self.rate),
+                "elapsed": round(self.elapsed, 1)
+            }
+
+
 class SSHBuildClient:
     """SSH client for remote Xcode builds"""
     
+    # xcodebuild settings that affect the produced IPA; part of the build result cache key
+    ARCHIVE_FLAGS = ("-configuration Release -sdk iphoneos -destination generic/platform=iOS "
+                     "-skipPackagePluginValidation -skipMacroValidation archive "
+                     "CODE_SIGNING_ALLOWED=NO CODE_SIGNING_REQUIRED=NO CODE_SIGN_IDENTITY= DEVELOPMENT_TEAM=")
+    # Number of build results kept on each side
+    RESULT_CACHE_SIZE = 10
+    # Artifact downloads resume from their journal after a dropped connection
+    DOWNLOAD_ATTEMPTS = 3
+    SFTP_WINDOW_SIZE = 16 * 1024 * 1024
+    # Transfer strategies besides chunked SFTP: remote command whose stdout is the file
+    EXEC_METHODS = {
+        "cat": "cat {path}",
+        "gzip": "gzip -1 -c {path}"
+    }
+    # Below this much free space on the build volume, preflight warns
+    MIN_FREE_DISK_GB = 20
+    # Build outputs inside the workspace that this repo does not gitignore; `git clean` keeps them
+    WORKSPACE_OUTPUTS = ("build", "packages", "deps")
+    # Ciphers tried by the transfer benchmark, if this paramiko supports them
+    BENCHMARK_CIPHERS = ("aes128-gcm@openssh.com", "aes128-ctr", "aes256-gcm@openssh.com")
+    
     def __init__(self, config: ConfigManager):
         self.config = config
         self.client: Optional[paramiko.SSHClient] = None
         self.connected = False
-        self.last_log = []
+        self.last_log = BuildLog(int(config.get("output", "log_tail_lines") or 2000))
+        self.remote_sha256: Optional[str] = None
+        self.last_errors: List[str] = []
+        # "local" or "remote" when the last build result came from the result cache
+        self.result_cache_hit: Optional[str] = None
+        self.progress = BuildProgress()
+        # Set by cancel(); process groups of running commands are killed then
+        self.cancelled = threading.Event()
+        self._process_groups = set()
         
     def connect(self) -> bool:
         """Establish SSH connection to the Mac"""
         try:
-            self.client = paramiko.SSHClient()
-            self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
             host = self.config.get("ssh", "host")
             port = self.config.get("ssh", "port")
-            username = self.config.get("ssh", "username")
-            password = self.config.get("ssh", "password")
-            key_path = self.config.get("ssh", "key_path")
+            tuning = self.transfer_tuning()
             
             print(f"\n{Colors.CYAN}🔗 Connecting to {host}:{port}...{Colors.ENDC}")
+            if tuning:
+                print(f"   {Colors.GRAY}Tuned transport: {_describe_tuning(tuning)}{Colors.ENDC}")
             
-            if key_path and os.path.exists(key_path):
-                key = paramiko.RSAKey.from_private_key_file(key_path)
-                self.client.connect(hostname=host, port=port, username=username, pkey=key)
-            else:
-                self.client.connect(hostname=host, port=port, username=username, password=password)
-            
+            self.client = self._open_client(tuning.get("compress", False), tuning.get("cipher"))
             self.connected = True
             print(f"{Colors.GREEN}✅ Connected successfully!{Colors.ENDC}")
             return True
@@ -212,114 +646,811 @@ class SSHBuildClient:
             print(f"{Colors.RED}❌ Connection failed: {e}{Colors.ENDC}")
             return False
     
-    def execute(self, command: str, show_output: bool = True) -> tuple[int, str]:
-        """Execute a command on the remote Mac"""
+    def _open_client(self, compress: bool = False, cipher: str = None) -> "paramiko.SSHClient":
+        """Open a new SSH connection, optionally with compression or a single allowed cipher"""
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        
+        options = {
+            "hostname": self.config.get("ssh", "host"),
+            "port": self.config.get("ssh", "port"),
+            "username": self.config.get("ssh", "username"),
+            "compress": compress
+        }
+        if cipher:
+            options["disabled_algorithms"] = {
+                "ciphers": [c for c in paramiko.Transport._preferred_ciphers if c != cipher]
+            }
+        
+        key_path = self.config.get("ssh", "key_path")
+        if key_path and os.path.exists(key_path):
+            options["pkey"] = paramiko.RSAKey.from_private_key_file(key_path)
+        else:
+            options["password"] = self.config.get("ssh", "password")
+        client.connect(**options)
+        return client
+    
+    def transfer_tuning(self) -> dict:
+        """The benchmark winner cached for the configured host, or {} if it was never measured"""
+        return (self.config.get("transfer", "tuning") or {}).get(self.config.get("ssh", "host")) or {}
+    
+    def execute(self, command: str, show_output: bool = True, capture: bool = True,
+                supervisor: BuildSupervisor = None) -> tuple[int, str]:
+        """Execute a command on the remote Mac.
+
+        stdout and stderr arrive as one raw byte stream (no PTY). Everything goes to
+        the build log; only with `capture` is the output also kept and returned.
+        With a `supervisor`, the command's process group is killed as soon as a
+        fatal error shows up in the output, and the exit code is non-zero.
+        """
+        if not self.client:
+            raise Exception("Not connected")
+        if self.cancelled.is_set():
+            raise BuildCancelled()
+        
+        self.last_log.command(command)
+        channel = self.client.get_transport().open_session()
+        channel.set_combine_stderr(True)
+        # A non-interactive shell started by sshd leads its own process group; report it first
+        channel.exec_command(f"echo $$; {command}")
+        
+        output = bytearray()
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        at_line_start = True
+        header = b""
+        pgid = None
+        killed = False
+        try:
+            while True:
+                data = channel.recv(65536)
+                if not data:
+                    break
+                if pgid is None:
+                    header += data
+                    if b"\n" not in header:
+                        continue
+                    first, data = header.split(b"\n", 1)
+                    pgid = int(first) if first.strip().isdigit() else 0
+                    self._process_groups.add(pgid)
+                    if self.cancelled.is_set():
+                        self.kill_process_group(pgid)
+                    if not data:
+                        continue
+                self.last_log.write(data)
+                if capture:
+                    output += data
+                if show_output:
+                    text = decoder.decode(data)
+                    if text:
+                        indented = text.replace("\n", "\n  ")
+                        if text.endswith("\n"):
+                            indented = indented[:-2]
+                        print(f"{'  ' if at_line_start else ''}{Colors.GRAY}{indented}{Colors.ENDC}", end="", flush=True)
+                        at_line_start = text.endswith("\n")
+                if supervisor and not killed and supervisor.feed(data):
+                    killed = True
+                    self.kill_process_group(pgid)
+        except KeyboardInterrupt:
+            # Don't leave a build running on the Mac when the user aborts
+            self.kill_process_group(pgid)
+            channel.close()
+            raise
+        finally:
+            self._process_groups.discard(pgid)
+        if show_output and not at_line_start:
+            print()
+        
+        exit_code = channel.recv_exit_status()
+        channel.close()
+        if self.cancelled.is_set():
+            raise BuildCancelled()
+        if killed and exit_code == 0:
+            exit_code = -1
+        return exit_code, output.decode(errors="replace")
+    
+    def cancel(self):
+        """Stop the running build from another thread; the blocked execute() raises BuildCancelled"""
+        self.cancelled.set()
+        for pgid in list(self._process_groups):
+            self.kill_process_group(pgid)
+    
+    def kill_process_group(self, pgid: Optional[int]):
+        """Terminate a remote process group, escalating to SIGKILL if it lingers"""
+        if not pgid:
+            return
+        print(f"\n{Colors.RED}🛑 Stopping remote process group {pgid}...{Colors.ENDC}")
+        self.execute_batch([
+            f"kill -TERM -- -{pgid} 2>/dev/null; for i in 1 2 3 4 5; do "
+            f"kill -0 -- -{pgid} 2>/dev/null || exit 0; sleep 1; done; kill -KILL -- -{pgid} 2>/dev/null; true"
+        ])
+    
+    def execute_batch(self, commands: List[str]) -> List[Tuple[int, str]]:
+        """Run several short commands over a single channel.
+
+        Each command runs in its own subshell with stderr merged into stdout and is
+        followed by a sentinel line carrying its exit code. Returns one
+        (exit code, output) pair per command.
+        """
         if not self.client:
             raise Exception("Not connected")
         
-        self.last_log.append(f"$ {command}")
-        stdin, stdout, stderr = self.client.exec_command(command, get_pty=True)
+        sentinel = f"__ethsign_{uuid.uuid4().hex}__"
+        script = "\n".join(f"( {command}\n) </dev/null 2>&1; printf '\\n{sentinel} %d\\n' $?" for command in commands)
+        stdin, stdout, stderr = self.client.exec_command(script)
+        output = stdout.read().decode(errors="replace")
+        stdout.channel.recv_exit_status()
+        
+        # Split yields output, code, output, code, ... with a trailing remainder
+        parts = re.split(rf"\n{sentinel} (\d+)\n", output)
+        results = [(int(code), text) for text, code in zip(parts[0::2], parts[1::2])]
+        for command, (_, text) in zip(commands, results):
+            self.last_log.command(command)
+            self.last_log.write(text.encode())
+        # Commands after a lost connection never reported back
+        results += [(-1, "")] * (len(commands) - len(results))
+        return results
+    
+    def preflight(self) -> bool:
+        """Check the Mac has the tools, disk space and branch a build needs, in one round trip"""
+        repo_url = self.config.get("build", "repo_url")
+        branch = self.config.get("build", "branch")
+        target_dir = self.config.get("build", "target_dir")
+        
+        checks = [
+            ("Git", "git --version"),
+            ("Xcode", "version=$(xcodebuild -version) && echo \"$version\" | head -1"),
+            ("zip / shasum", "command -v zip >/dev/null && command -v shasum >/dev/null && echo available"),
+            ("Free disk", f"mkdir -p {target_dir} && df -k {target_dir} | awk 'NR == 2 {{print $4}}'")
+        ]
+        if not re.fullmatch(r"[0-9a-f]{7,40}", branch):
+            # Like git clone --branch, a tag of that name is accepted as well
+            checks.append(("Branch", f"head=$(git ls-remote --exit-code {repo_url} refs/heads/{branch} refs/tags/{branch}) && "
+                                     f"echo \"$head\" | head -1 | cut -c1-12"))
         
-        output_lines = []
-        for line in iter(stdout.readline, ''):
-            if show_output:
-                print(f"  {Colors.GRAY}{line}{Colors.ENDC}", end='')
-            output_lines.append(line.strip())
-            self.last_log.append(line.strip())
+        print(f"\n{Colors.HEADER}🩺 PREFLIGHT CHECKS{Colors.ENDC}")
+        results = self.execute_batch([command for _, command in checks])
         
-        exit_code = stdout.channel.recv_exit_status()
-        return exit_code, '\n'.join(output_lines)
+        ok = True
+        for (name, _), (exit_code, output) in zip(checks, results):
+            detail = output.strip().splitlines()[-1] if output.strip() else ""
+            if name == "Free disk" and exit_code == 0 and detail.isdigit():
+                free_gb = int(detail) / 1024 / 1024
+                detail = f"{free_gb:.1f} GB"
+                if free_gb < self.MIN_FREE_DISK_GB:
+                    print(f"   {Colors.YELLOW}⚠️  {name}: {detail} (builds may need {self.MIN_FREE_DISK_GB} GB){Colors.ENDC}")
+                    continue
+            if exit_code == 0:
+                print(f"   {Colors.GREEN}✅ {name}: {detail}{Colors.ENDC}")
+            else:
+                print(f"   {Colors.RED}❌ {name}: {detail or f'failed ({exit_code})'}{Colors.ENDC}")
+                ok = False
+        return ok
     
     def clone_repo(self) -> bool:
-        """Clone the Git repository"""
+        """Clone the Git repository, or bring the persistent workspace up to date"""
         repo_url = self.config.get("build", "repo_url")
         branch = self.config.get("build", "branch")
         target_dir = self.config.get("build", "target_dir")
+        workspace_mode = self.config.get("build", "workspace_mode") or "incremental"
         
         print(f"\n{Colors.HEADER}📦 CLONING REPOSITORY{Colors.ENDC}")
         print(f"   {Colors.GRAY}Repository:{Colors.ENDC} {repo_url}")
         print(f"   {Colors.GRAY}Branch:{Colors.ENDC} {branch}")
         print(f"   {Colors.GRAY}Target:{Colors.ENDC} {target_dir}")
+        print(f"   {Colors.GRAY}Workspace:{Colors.ENDC} {workspace_mode}")
         print()
         
-        self.execute(f"rm -rf {target_dir}", show_output=False)
-        exit_code, _ = self.execute(f"git clone --recursive --branch {branch} {repo_url} {target_dir}")
+        if workspace_mode == "fresh":
+            self.execute(f"rm -rf {target_dir}", show_output=False)
+            exit_code, _ = self.execute(f"git clone --recursive --branch {branch} {repo_url} {target_dir}")
+            success = exit_code == 0
+        else:
+            success = False
+            if self._workspace_usable(target_dir, repo_url):
+                success = self._update_workspace(target_dir, branch)
+                if not success:
+                    print(f"\n{Colors.YELLOW}⚠️  Incremental update failed, re-cloning workspace...{Colors.ENDC}")
+            else:
+                print(f"{Colors.YELLOW}⚠️  No usable workspace found, cloning...{Colors.ENDC}")
+            
+            if not success:
+                # Blobless clone: full history for later fetches, file contents only for the checkout
+                self.execute(f"rm -rf {target_dir}", show_output=False)
+                exit_code, _ = self.execute(f"git clone --filter=blob:none --no-checkout {repo_url} {target_dir}")
+                success = exit_code == 0 and self._update_workspace(target_dir, branch)
         
-        if exit_code == 0:
+        if success:
             print(f"\n{Colors.GREEN}✅ Repository cloned successfully!{Colors.ENDC}")
             return True
         else:
             print(f"\n{Colors.RED}❌ Clone failed!{Colors.ENDC}")
             return False
     
+    def _workspace_usable(self, target_dir: str, repo_url: str) -> bool:
+        """Whether target_dir holds an intact clone of repo_url that can be updated in place"""
+        exit_code, output = self.execute(
+            f"cd {target_dir} 2>/dev/null && git rev-parse --verify -q HEAD >/dev/null && git remote get-url origin",
+            show_output=False)
+        return exit_code == 0 and output.strip() == repo_url
+    
+    def _update_workspace(self, target_dir: str, branch: str) -> bool:
+        """Fetch only new objects, hard-reset to `branch` (or a commit SHA) and sync changed submodules.
+
+        Untracked files are cleaned, except the WORKSPACE_OUTPUTS (the archive, the IPA
+        and the downloaded dependencies), so unchanged build steps can be skipped.
+        """
+        keep = " ".join(f"-e /{output}" for output in self.WORKSPACE_OUTPUTS)
+        # `git submodule status` marks submodules whose checkout differs from the
+        # pinned SHA with "+" and uninitialized ones with "-"; only those are updated.
+        update_cmd = f"""cd {target_dir} && \
+            git fetch --prune --no-tags origin {branch} && \
+            git reset -q --hard FETCH_HEAD && \
+            git clean -qffd {keep} && \
+            stale=$(git submodule status | awk '/^[-+U]/ {{print $2}}') && \
+            if [ -n "$stale" ]; then \
+                echo "Syncing submodules:" $stale && \
+                git submodule sync -q --recursive -- $stale && \
+                git submodule update --init --recursive -- $stale; \
+            else echo "Submodules up to date"; fi && \
+            git submodule foreach -q --recursive 'git reset -q --hard && git clean -qffd' && \
+            git log -1 --format='HEAD is now at %h %s'"""
+        exit_code, _ = self.execute(update_cmd)
+        return exit_code == 0
+    
+    def build_steps(self, cache_flags: str = "") -> List["BuildStep"]:
+        """The codemagic.yaml workflow as a step graph.
+
+        Submodules and dependencies are independent and run together. In stream
+        packaging, download_ipa zips the archive, so there is no packaging step.
+        """
+        project_name = self.config.get("build", "project_name")
+        app_path = f"build/{project_name}.xcarchive/Products/Applications/{project_name}.app"
+        # Step outputs live in WORKSPACE_OUTPUTS, which the workspace update keeps; they
+        # must not count as source changes, or every rebuild would look different
+        sources = " ".join(f"':(exclude){output}'" for output in self.WORKSPACE_OUTPUTS)
+        
+        steps = [
+            # The pinned gitlinks, not `submodule status`, whose output changes once they are checked out
+            BuildStep("Initialize submodules", "git submodule update --init --recursive",
+                      inputs="git ls-tree -r HEAD | grep '^160000' || true", supervise=True),
+            BuildStep("Download dependencies", "make deps || true",
+                      inputs="cat makefile", outputs=("deps/commonName.txt",), allow_failure=True),
+            # Without a PTY, NSUnbufferedIO keeps xcodebuild from block-buffering its output
+            BuildStep("Build iOS Archive",
+                      f"NSUnbufferedIO=YES xcodebuild -project {project_name}.xcodeproj -scheme {project_name} "
+                      f"-archivePath build/{project_name}.xcarchive {cache_flags}{self.ARCHIVE_FLAGS}",
+                      needs=("Initialize submodules", "Download dependencies"),
+                      inputs=f"git rev-parse HEAD; git submodule status --recursive; git status --porcelain -- {sources}; ls deps",
+                      outputs=(app_path,), supervise=True),
+        ]
+        if self.config.get("transfer", "packaging") != "stream":
+            # Payload and the old IPA are cleared first: zip -r would otherwise update the old archive in place
+            steps.append(BuildStep(
+                "Create unsigned IPA",
+                f"mkdir -p packages && rm -f packages/{project_name}.ipa && "
+                f"cd build/{project_name}.xcarchive/Products/Applications && "
+                f"rm -rf Payload && mkdir -p Payload && cp -r {project_name}.app Payload/ && "
+                f"zip -r ../../../../packages/{project_name}.ipa Payload",
+                needs=("Build iOS Archive",),
+                inputs=f"ls -lRT {app_path} 2>/dev/null || ls -lR --full-time {app_path}",
+                outputs=(f"packages/{project_name}.ipa",)))
+        return steps
+    
     def build(self) -> bool:
         """Build the project with Xcode using codemagic.yaml commands"""
         target_dir = self.config.get("build", "target_dir")
         project_name = self.config.get("build", "project_name")
         
         print(f"\n{Colors.HEADER}🔨 BUILDING PROJECT (Codemagic Style){Colors.ENDC}")
-        print(f"   {Colors.GRAY}Running exact commands from codemagic.yaml{Colors.ENDC}")
+        print(f"   {Colors.GRAY}Running the codemagic.yaml steps as a dependency graph{Colors.ENDC}")
         print()
         
-        # Step 1: Initialize submodules
-        print(f"{Colors.CYAN}� Step 1/4: Initializing submodules...{Colors.ENDC}")
-        self.execute(f"cd {target_dir} && git submodule update --init --recursive")
-        
-        # Step 2: Download dependencies
-        print(f"\n{Colors.CYAN}📥 Step 2/4: Downloading dependencies...{Colors.ENDC}")
-        self.execute(f"cd {target_dir} && make deps || true")
-        
-        # Step 3: Build iOS Archive
-        print(f"\n{Colors.CYAN}🏗️ Step 3/4: Building iOS Archive...{Colors.ENDC}")
-        build_cmd = f"cd {target_dir} && xcodebuild -project {project_name}.xcodeproj -scheme {project_name} -configuration Release -sdk iphoneos -destination generic/platform=iOS -archivePath build/{project_name}.xcarchive -skipPackagePluginValidation -skipMacroValidation archive CODE_SIGNING_ALLOWED=NO CODE_SIGNING_REQUIRED=NO CODE_SIGN_IDENTITY= DEVELOPMENT_TEAM="
-        exit_code, _ = self.execute(build_cmd)
-        
-        # Step 4: Create unsigned IPA (exact codemagic command)
-        print(f"\n{Colors.CYAN}📱 Step 4/4: Creating unsigned IPA...{Colors.ENDC}")
-        ipa_cmd = f"""cd {target_dir} && \\
-            mkdir -p packages && \\
-            cd build/{project_name}.xcarchive/Products/Applications && \\
-            mkdir -p Payload && \\
-            cp -r {project_name}.app Payload/ && \\
-            zip -r ../../../../packages/{project_name}.ipa Payload"""
-        self.execute(ipa_cmd)
-        
-        # Check for IPA
-        check_code, output = self.execute(f"ls -la {target_dir}/packages/*.ipa 2>/dev/null", show_output=False)
-        
-        if f"{project_name}.ipa" in output:
+        self.last_errors = []
+        cache_flags = ""
+        cache_key_dir = self.prepare_build_cache()
+        if cache_key_dir:
+            cache_flags = f"-derivedDataPath {cache_key_dir}/DerivedData -clonedSourcePackagesDirPath {cache_key_dir}/SourcePackages "
+        
+        succeeded = StepPipeline(self, target_dir, self.build_steps(cache_flags)).run()
+        if cache_key_dir:
+            self.evict_build_caches(cache_key_dir)
+        if not succeeded:
+            return False
+        
+        if self.config.get("transfer", "packaging") == "stream":
+            # The IPA is zipped on the fly by download_ipa, overlapping packaging with transfer
+            self.remote_sha256 = None
+            [(check_code, _)] = self.execute_batch(
+                [f"test -d {target_dir}/build/{project_name}.xcarchive/Products/Applications/{project_name}.app"])
+            if check_code == 0:
+                print(f"\n{Colors.GREEN}✅ Build successful! Archive ready to stream.{Colors.ENDC}")
+                return True
+            print(f"\n{Colors.RED}❌ Build failed or archive not created.{Colors.ENDC}")
+            return False
+        
+        # Check for IPA, hashing it in the same round trip
+        package = f"{target_dir}/packages/{project_name}.ipa"
+        (check_code, listing), (hash_code, digest) = self.execute_batch([f"ls -la {package}", f"shasum -a 256 {package}"])
+        self.remote_sha256 = _parse_shasum(digest) if hash_code == 0 else None
+        
+        if check_code == 0:
+            print(f"   {Colors.GRAY}{listing.strip()}{Colors.ENDC}")
             print(f"\n{Colors.GREEN}✅ Build successful! IPA created.{Colors.ENDC}")
             return True
         else:
             print(f"\n{Colors.RED}❌ Build failed or IPA not created.{Colors.ENDC}")
             return False
     
-    def download_ipa(self) -> Optional[str]:
-        """Download the built IPA"""
+    def build_artifact(self) -> Optional[str]:
+        """Connect, update the workspace, then reuse a cached result or build and download a new one.
+
+        Returns the local IPA path, or None if a stage failed (the stage has already reported why).
+        Every build, finished or not, is added to the build history with its phase timings.
+        """
+        started_at = datetime.now(timezone.utc)
+        started = time.monotonic()
+        first_timing = len(self.progress.timings)
+        self.result_cache_hit = None
+        outcome, ipa_path = "failed", None
+        try:
+            ipa_path = self._build_artifact(self.progress)
+            outcome = "succeeded" if ipa_path else "failed"
+            return ipa_path
+        except BuildCancelled:
+            outcome = "cancelled"
+            raise
+        finally:
+            self.progress.end_phase()
+            HISTORY.record(
+                started_at=started_at, duration=time.monotonic() - started, outcome=outcome,
+                host=self.config.get("ssh", "host"), branch=self.config.get("build", "branch"),
+                project=self.config.get("build", "project_name"),
+                artifact_size=os.path.getsize(ipa_path) if ipa_path else None,
+                result_cache=self.result_cache_hit, phases=self.progress.timings[first_timing:])
+    
+    def _build_artifact(self, progress: "BuildProgress") -> Optional[str]:
+        progress.set_phase("Connecting")
+        if not self.connected and not self.connect():
+            return None
+        progress.set_phase("Preflight")
+        if not self.preflight():
+            return None
+        progress.set_phase("Updating workspace")
+        if not self.clone_repo():
+            return None
+        
+        # Unchanged commit, submodules and flags: reuse the earlier result
+        progress.set_phase("Checking build cache")
+        build_key = self.build_key()
+        ipa_path = self.fetch_cached_ipa(build_key) if build_key else None
+        if ipa_path:
+            return ipa_path
+        
+        progress.set_phase("Building")
+        if not self.build():
+            return None
+        progress.set_phase("Downloading")
+        ipa_path = self.download_ipa()
+        if ipa_path and build_key:
+            progress.set_phase("Caching result")
+            self.store_build_result(build_key, ipa_path)
+        return ipa_path
+    
+    def _build_failed(self, step: str, exit_code: int, supervisor: BuildSupervisor = None) -> bool:
+        """Report a failed build step with the first errors seen; always returns False"""
+        self.last_errors = supervisor.errors if supervisor else []
+        reason = "stopped on first fatal error" if supervisor and supervisor.tripped else f"exit code {exit_code}"
+        print(f"\n{Colors.RED}❌ {step} failed ({reason}); skipping remaining steps.{Colors.ENDC}")
+        for error in self.last_errors[:5]:
+            print(f"   {Colors.RED}{error}{Colors.ENDC}")
+        return False
+    
+    def prepare_build_cache(self) -> Optional[str]:
+        """Create the DerivedData/SourcePackages cache for this branch and Xcode version.
+
+        Returns the remote cache directory, or None when caching is disabled or
+        the Xcode version can't be determined.
+        """
+        cache_dir = self.config.get("build", "cache_dir")
+        if not cache_dir:
+            return None
+        
+        exit_code, output = self.execute("xcodebuild -version", show_output=False)
+        if exit_code != 0 or not output.strip():
+            return None
+        xcode_version = "-".join(line.split()[-1] for line in output.strip().splitlines() if line.strip())
+        key_dir = f"{cache_dir.rstrip('/')}/{build_cache_key(self.config.get('build', 'branch'), xcode_version)}"
+        
+        # The key directory's mtime is its last use, which drives LRU eviction
+        exit_code, _ = self.execute(f"mkdir -p {key_dir}/DerivedData {key_dir}/SourcePackages && touch {key_dir}", show_output=False)
+        if exit_code != 0:
+            return None
+        print(f"   {Colors.GRAY}Build cache:{Colors.ENDC} {key_dir}")
+        return key_dir
+    
+    def evict_build_caches(self, keep_dir: str):
+        """Delete least recently used build caches until the total fits in cache_limit_gb"""
+        cache_dir = self.config.get("build", "cache_dir").rstrip("/")
+        limit_kb = float(self.config.get("build", "cache_limit_gb") or 0) * 1024 * 1024
+        if not limit_kb:
+            return
+        
+        exit_code, output = self.execute(
+            f"cd {cache_dir} && for d in */; do "
+            f"printf '%s %s %s\\n' \"$(stat -f %m \"$d\")\" \"$(du -sk \"$d\" | cut -f1)\" \"${{d%/}}\"; done",
+            show_output=False)
+        if exit_code != 0:
+            return
+        
+        caches = []
+        for line in output.splitlines():
+            parts = line.split(" ", 2)
+            if len(parts) == 3 and parts[0].isdigit() and parts[1].isdigit():
+                caches.append((int(parts[0]), int(parts[1]), parts[2]))
+        
+        total_kb = sum(size for _, size, _ in caches)
+        keep_name = keep_dir.rstrip("/").rsplit("/", 1)[-1]
+        evicted = []
+        for _, size, name in sorted(caches):
+            if total_kb <= limit_kb:
+                break
+            if name == keep_name:
+                continue
+            evicted.append((name, size))
+            total_kb -= size
+        
+        if evicted:
+            self.execute_batch([f"rm -rf {cache_dir}/{name}" for name, _ in evicted])
+        for name, size in evicted:
+            print(f"   {Colors.GRAY}Evicted build cache {name} ({size / 1024 / 1024:.1f} GB){Colors.ENDC}")
+    
+    def build_key(self) -> Optional[str]:
+        """Content address of the build the workspace would produce.
+
+        Hashes the checked-out commit, every pinned submodule SHA, the project
+        name and the archive flags. Returns None if the workspace can't be read.
+        """
+        target_dir = self.config.get("build", "target_dir")
+        exit_code, output = self.execute(
+            f"cd {target_dir} && git rev-parse HEAD && git submodule status --recursive", show_output=False)
+        if exit_code != 0 or not output.strip():
+            return None
+        
+        commit, *submodules = output.strip().splitlines()
+        # Status lines are "<flag><sha> <path> (<describe>)"; the flag column is dropped
+        pins = sorted(line[1:].split(" (")[0] for line in submodules if line.strip())
+        material = json.dumps([commit.strip(), pins, self.config.get("build", "project_name"), self.ARCHIVE_FLAGS])
+        return hashlib.sha256(material.encode()).hexdigest()
+    
+    def _result_paths(self, key: str) -> Tuple[str, str]:
+        project_name = self.config.get("build", "project_name")
+        local_cache = os.path.join(self.config.get("output", "local_dir"), "cache", f"{key}.ipa")
+        remote_cache = f"{self.config.get('build', 'cache_dir').rstrip('/')}/results/{project_name}-{key}.ipa"
+        return local_cache, remote_cache
+    
+    def local_ipa_path(self) -> str:
+        """Where the IPA of this build goes: output.ipa_name (set per queued job) or <project>.ipa"""
+        name = self.config.get("output", "ipa_name") or f"{self.config.get('build', 'project_name')}.ipa"
+        return os.path.join(self.config.get("output", "local_dir"), name)
+    
+    def fetch_cached_ipa(self, key: str) -> Optional[str]:
+        """Place a cached build result for `key` at the local IPA path, or return None on a miss"""
+        local_path = self.local_ipa_path()
+        local_cache, remote_cache = self._result_paths(key)
+        
+        if not os.path.isfile(local_cache):
+            if not self.config.get("build", "cache_dir"):
+                return None
+            exit_code, output = self.execute(f"shasum -a 256 {remote_cache}", show_output=False)
+            if exit_code != 0:
+                return None
+            print(f"\n{Colors.GREEN}♻️  Build result cached on the build host ({key[:12]}){Colors.ENDC}")
+            ipa_path = self.download_ipa(remote_cache, _parse_shasum(output))
+            if ipa_path:
+                self.result_cache_hit = "remote"
+                self._store_local_result(key, ipa_path)
+            return ipa_path
+        
+        print(f"\n{Colors.GREEN}♻️  Build result cached locally ({key[:12]}){Colors.ENDC}")
+        self.result_cache_hit = "local"
+        if os.path.exists(local_path) and os.path.samefile(local_cache, local_path):
+            return os.path.abspath(local_path)
+        DELTAS.retain(local_path)
+        # Renamed into place, so the previous IPA (and the base linked to it) is never written through;
+        # the manifest is staged first and renamed right after it
+        discard_download(local_path)
+        _link_or_copy(local_cache, f"{local_path}.part")
+        manifest_path = f"{local_path}{MANIFEST_SUFFIX}"
+        if os.path.exists(f"{local_cache}{MANIFEST_SUFFIX}"):
+            shutil.copyfile(f"{local_cache}{MANIFEST_SUFFIX}", f"{manifest_path}.tmp")
+        os.replace(f"{local_path}.part", local_path)
+        if os.path.exists(f"{manifest_path}.tmp"):
+            os.replace(f"{manifest_path}.tmp", manifest_path)
+        return os.path.abspath(local_path)
+    
+    def store_build_result(self, key: str, local_path: str):
+        """Record a fresh build under `key` on the build host and in local_dir/cache"""
+        target_dir = self.config.get("build", "target_dir")
+        project_name = self.config.get("build", "project_name")
+        _, remote_cache = self._result_paths(key)
+        package = f"{target_dir}/packages/{project_name}.ipa"
+        
+        streamed_only = (self.config.get("transfer", "packaging") == "stream"
+                         and not self.config.get("transfer", "keep_remote_package"))
+        if self.config.get("build", "cache_dir") and streamed_only:
+            # The streamed IPA was only written locally; there is nothing on the build host to cache
+            print(f"{Colors.GRAY}   Build result cached locally only: stream packaging without "
+                  f"transfer.keep_remote_package leaves no IPA on the build host{Colors.ENDC}")
+        elif self.config.get("build", "cache_dir"):
+            results_dir = remote_cache.rsplit("/", 1)[0]
+            # cp -c makes an APFS clone, so the copy costs no extra space until either side changes
+            exit_code, _ = self.execute(
+                f"mkdir -p {results_dir} && (cp -c {package} {remote_cache} 2>/dev/null || "
+                f"cp {package} {remote_cache}) && "
+                f"cd {results_dir} && ls -t | tail -n +{self.RESULT_CACHE_SIZE + 1} | xargs rm -f",
+                show_output=False)
+            if exit_code != 0:
+                print(f"{Colors.YELLOW}⚠️  Could not cache the build result on the build host ({package}){Colors.ENDC}")
+        self._store_local_result(key, local_path)
+    
+    def _store_local_result(self, key: str, local_path: str):
+        local_cache, _ = self._result_paths(key)
+        keep = self.RESULT_CACHE_SIZE
+        os.makedirs(os.path.dirname(local_cache), exist_ok=True)
+        if os.path.exists(local_cache):
+            os.remove(local_cache)
+        _link_or_copy(local_path, local_cache)
+        if os.path.exists(f"{local_path}{MANIFEST_SUFFIX}"):
+            shutil.copyfile(f"{local_path}{MANIFEST_SUFFIX}", f"{local_cache}{MANIFEST_SUFFIX}")
+        cached = sorted(Path(local_cache).parent.glob("*.ipa"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for stale in cached[keep:]:
+            stale.unlink()
+            Path(f"{stale}{MANIFEST_SUFFIX}").unlink(missing_ok=True)
+    
+    def download_ipa(self, remote_path: str = None, remote_sha256: str = None) -> Optional[str]:
+        """Download the built IPA (or a cached build result at `remote_path`) and verify its SHA-256"""
         target_dir = self.config.get("build", "target_dir")
         project_name = self.config.get("build", "project_name")
         local_dir = self.config.get("output", "local_dir")
         
-        remote_path = f"{target_dir}/packages/{project_name}.ipa"
+        streaming = not remote_path and self.config.get("transfer", "packaging") == "stream"
+        if not remote_path:
+            remote_sha256 = remote_sha256 or self.remote_sha256
+        remote_path = remote_path or f"{target_dir}/packages/{project_name}.ipa"
         # Expand ~ in remote path
         remote_path = remote_path.replace("~", f"/Users/{self.config.get('ssh', 'username')}")
-        local_path = os.path.join(local_dir, f"{project_name}.ipa")
+        local_path = self.local_ipa_path()
+        
+        method = self.transfer_tuning().get("method", "sftp")
+        if method not in self.EXEC_METHODS:
+            method = "sftp"
         
         print(f"\n{Colors.HEADER}📥 DOWNLOADING IPA{Colors.ENDC}")
         
+        downloader = ChunkedDownloader(
+            self._open_sftp,
+            channels=int(self.config.get("transfer", "channels") or 1),
+            chunk_size=int(float(self.config.get("transfer", "chunk_size_mb") or 8) * 1024 * 1024),
+            on_progress=self.progress.set_transfer,
+            cancelled=self.cancelled)
+        
+        for attempt in range(1, self.DOWNLOAD_ATTEMPTS + 1):
+            try:
+                os.makedirs(local_dir, exist_ok=True)
+                # Keep the previous build as a delta base for devices still running it; it is
+                # linked, and stays in place until the finished download is renamed over it
+                DELTAS.retain(local_path)
+                started = time.monotonic()
+                if streaming:
+                    file_size, sha256, remote_sha256 = self._stream_archive(local_path)
+                    source = f"{self.config.get('ssh', 'host')}:{target_dir}/build/{project_name}.xcarchive (streamed)"
+                elif method == "sftp":
+                    file_size, sha256 = downloader.download(remote_path, local_path)
+                    source = f"{self.config.get('ssh', 'host')}:{remote_path}"
+                else:
+                    file_size, sha256, _ = self._exec_download(
+                        self.EXEC_METHODS[method].format(path=shlex.quote(remote_path)), local_path,
+                        decompress=method == "gzip")
+                    source = f"{self.config.get('ssh', 'host')}:{remote_path} ({method})"
+                elapsed = time.monotonic() - started
+                
+                # The download is still `<local>.part`: a bad one never replaces the last good IPA
+                if remote_sha256 and sha256 != remote_sha256:
+                    discard_download(local_path)
+                    raise ValueError(f"SHA-256 mismatch (build host {remote_sha256[:12]}, received {sha256[:12]})")
+                write_artifact_manifest(local_path, sha256, remote_sha256, source, staged=True)
+                CONTENT_HASHES.seed(os.path.abspath(local_path), sha256)
+                
+                verified = "verified" if remote_sha256 else "unverified"
+                print(f"{Colors.GREEN}✅ Downloaded: {local_path} ({file_size / 1024 / 1024:.2f} MB "
+                      f"in {elapsed:.1f}s, sha256 {sha256[:12]} {verified}){Colors.ENDC}")
+                return os.path.abspath(local_path)
+                
+            except BuildCancelled:
+                discard_download(local_path)
+                raise
+            except Exception as e:
+                print(f"{Colors.RED}❌ Download failed: {e}{Colors.ENDC}")
+                if attempt == self.DOWNLOAD_ATTEMPTS:
+                    return None
+                print(f"{Colors.YELLOW}🔄 Reconnecting to resume (attempt {attempt + 1}/{self.DOWNLOAD_ATTEMPTS})...{Colors.ENDC}")
+                transport = self.client.get_transport() if self.client else None
+                if not (transport and transport.is_active()) and not self.connect():
+                    return None
+    
+    def _stream_archive(self, local_path: str) -> Tuple[int, str, Optional[str]]:
+        """Zip Payload/ from the xcarchive straight into an exec channel and write it to `<local_path>.part`.
+
+        The build host hashes the same stream (reported on stderr) and, with
+        transfer.keep_remote_package, tees it into packages/ as well. Returns the
+        size, the local SHA-256 and the build host's SHA-256.
+        """
+        target_dir = self.config.get("build", "target_dir")
+        project_name = self.config.get("build", "project_name")
+        apps_dir = f"{target_dir}/build/{project_name}.xcarchive/Products/Applications"
+        package = ""
+        if self.config.get("transfer", "keep_remote_package"):
+            package = f"{target_dir}/packages/{project_name}.ipa"
+        
+        # Payload/ links to the .app instead of copying it; zip follows the link.
+        # shasum reads a FIFO fed by tee, so the zip stream is only produced once.
+        script = f"""set -o pipefail
+            cd {apps_dir} && mkdir -p Payload {f"{target_dir}/packages" if package else ""} || exit 1
+            rm -rf Payload/{project_name}.app && ln -s ../{project_name}.app Payload/{project_name}.app || exit 1
+            fifo=$(mktemp -u) && mkfifo "$fifo" || exit 1
+            shasum -a 256 < "$fifo" >&2 &
+            zip -qr - Payload | tee "$fifo" {package}
+            status=$?
+            wait
+            rm -f "$fifo"
+            exit $status"""
+        
+        size, sha256, errors = self._exec_download(f"bash -c {shlex.quote(script)}", local_path)
+        return size, sha256, _parse_shasum(errors)
+    
+    def _exec_download(self, command: str, local_path: str, decompress: bool = False,
+                       client: "paramiko.SSHClient" = None) -> Tuple[int, str, str]:
+        """Run `command` on the Mac and write its stdout to `<local_path>.part`, gunzipping it if `decompress`.
+
+        Returns the size and SHA-256 of the written file and the command's stderr.
+        The caller moves the file into place once the digest has been checked.
+        """
+        client = client or self.client
+        channel = client.get_transport().open_session(window_size=self.SFTP_WINDOW_SIZE)
+        channel.exec_command(command)
+        inflater = zlib.decompressobj(wbits=31) if decompress else None
+        part_path = f"{local_path}.part"
+        digest = hashlib.sha256()
+        size = 0
+        started = printed = time.monotonic()
         try:
-            os.makedirs(local_dir, exist_ok=True)
-            sftp = self.client.open_sftp()
-            sftp.get(remote_path, local_path)
-            sftp.close()
-            
-            file_size = os.path.getsize(local_path)
-            print(f"{Colors.GREEN}✅ Downloaded: {local_path} ({file_size / 1024 / 1024:.2f} MB){Colors.ENDC}")
-            return os.path.abspath(local_path)
-            
-        except Exception as e:
-            print(f"{Colors.RED}❌ Download failed: {e}{Colors.ENDC}")
+            with open(part_path, "wb") as f:
+                while True:
+                    if self.cancelled.is_set():
+                        raise BuildCancelled()
+                    data = channel.recv(STREAM_CHUNK_SIZE)
+                    if not data:
+                        break
+                    if inflater:
+                        data = inflater.decompress(data)
+                    f.write(data)
+                    digest.update(data)
+                    size += len(data)
+                    now = time.monotonic()
+                    if now - printed >= 0.25:
+                        printed = now
+                        self.progress.set_transfer(size)
+                        print(f"\r   {Colors.CYAN}{size / 1024 / 1024:.1f} MB{Colors.ENDC}  "
+                              f"{Colors.GREEN}{size / max(now - started, 1e-6) / 1024 / 1024:.1f} MB/s{Colors.ENDC}   ",
+                              end="", flush=True)
+                if inflater:
+                    tail = inflater.flush()
+                    f.write(tail)
+                    digest.update(tail)
+                    size += len(tail)
+            print()
+            exit_code = channel.recv_exit_status()
+            errors = channel.makefile_stderr().read().decode(errors="replace")
+        finally:
+            channel.close()
+        
+        if exit_code != 0 or not size:
+            os.remove(part_path)
+            raise RuntimeError(f"Remote command failed ({exit_code}): {errors.strip()[-200:]}")
+        return size, digest.hexdigest(), errors
+    
+    def benchmark_transfers(self) -> Optional[dict]:
+        """Measure every transfer strategy with a synthetic payload and cache the fastest for this host.
+
+        Methods are compared on a default connection first; the winner is then
+        re-measured with SSH compression and with each supported cipher.
+        """
+        size_mb = int(self.config.get("transfer", "benchmark_mb") or 64)
+        payload = "/tmp/ethsign-transfer-benchmark.bin"
+        local_dir = self.config.get("output", "local_dir")
+        local_path = os.path.join(local_dir, ".transfer-benchmark.bin")
+        os.makedirs(local_dir, exist_ok=True)
+        
+        print(f"\n{Colors.HEADER}⏱️  TRANSFER BENCHMARK ({size_mb} MB){Colors.ENDC}")
+        # Mostly incompressible with a compressible tail, roughly like an IPA
+        random_kb = size_mb * 1024 * 3 // 4
+        exit_code, _ = self.execute(
+            f"(head -c {random_kb}k /dev/urandom; base64 < /dev/urandom | head -c {size_mb * 1024 - random_kb}k) > {payload}",
+            show_output=False)
+        if exit_code != 0:
+            print(f"{Colors.RED}❌ Could not create benchmark payload{Colors.ENDC}")
             return None
+        
+        results = []
+        
+        def measure(method: str, compress: bool = False, cipher: str = None) -> Optional[float]:
+            label = _describe_tuning({"method": method, "compress": compress, "cipher": cipher})
+            print(f"\n   {Colors.CYAN}{label}{Colors.ENDC}")
+            client = None
+            try:
+                client = self.client if not compress and not cipher else self._open_client(compress, cipher)
+                started = time.monotonic()
+                if method == "sftp":
+                    downloader = ChunkedDownloader(
+                        lambda: self._open_sftp(client),
+                        channels=int(self.config.get("transfer", "channels") or 1),
+                        chunk_size=int(float(self.config.get("transfer", "chunk_size_mb") or 8) * 1024 * 1024))
+                    size, _ = downloader.download(payload, local_path)
+                else:
+                    size, _, _ = self._exec_download(self.EXEC_METHODS[method].format(path=payload), local_path,
+                                                     decompress=method == "gzip", client=client)
+                rate = size / (time.monotonic() - started) / 1024 / 1024
+            except Exception as e:
+                print(f"   {Colors.YELLOW}⚠️  Skipped: {e}{Colors.ENDC}")
+                return None
+            finally:
+                if client is not None and client is not self.client:
+                    client.close()
+                for leftover in (local_path, f"{local_path}.part", f"{local_path}.part.json"):
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+            results.append(({"method": method, "compress": compress, "cipher": cipher}, rate))
+            print(f"   {Colors.GREEN}{rate:.1f} MB/s{Colors.ENDC}")
+            return rate
+        
+        try:
+            for method in ("sftp", *self.EXEC_METHODS):
+                measure(method)
+            if not results:
+                return None
+            best_method = max(results, key=lambda r: r[1])[0]["method"]
+            measure(best_method, compress=True)
+            for cipher in self.BENCHMARK_CIPHERS:
+                if cipher in paramiko.Transport._preferred_ciphers:
+                    measure(best_method, cipher=cipher)
+        finally:
+            self.execute(f"rm -f {payload}", show_output=False)
+        
+        winner, rate = max(results, key=lambda r: r[1])
+        winner = dict(winner, mbps=round(rate, 1), measured=datetime.now().isoformat())
+        tuning = dict(self.config.get("transfer", "tuning") or {})
+        tuning[self.config.get("ssh", "host")] = winner
+        self.config.set(tuning, "transfer", "tuning")
+        self.config.save()
+        
+        print(f"\n{Colors.GREEN}🏆 Fastest: {_describe_tuning(winner)} at {rate:.1f} MB/s{Colors.ENDC}")
+        if winner["compress"] or winner["cipher"]:
+            print(f"   {Colors.GRAY}Connection settings apply from the next connect.{Colors.ENDC}")
+        return winner
+    
+    def _open_sftp(self, client: "paramiko.SSHClient" = None) -> "paramiko.SFTPClient":
+        """Open an SFTP channel with a window large enough to keep a high-latency link busy"""
+        return paramiko.SFTPClient.from_transport(
+            (client or self.client).get_transport(), window_size=self.SFTP_WINDOW_SIZE, max_packet_size=32768)
+    
+    def begin_build_log(self, label: str = None) -> str:
+        """Spool this build's complete output to local_dir/logs"""
+        return self.last_log.start_spool(
+            os.path.join(self.config.get("output", "local_dir"), "logs"),
+            keep=int(self.config.get("output", "keep_build_logs") or 20), label=label)
+    
+    def end_build_log(self):
+        self.last_log.stop_spool()
     
     def disconnect(self):
         """Close SSH connection"""
@@ -329,59 +1460,1585 @@ class SSHBuildClient:
             print(f"\n{Colors.CYAN}🔌 Disconnected.{Colors.ENDC}")
 
 
+def build_cache_key(branch: str, xcode_version: str = "") -> str:
+    """Directory name of the DerivedData cache for a branch and Xcode version.
+
+    With an empty version this is the prefix shared by all Xcode versions of the branch.
+    """
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", f"{branch}-xcode{xcode_version}")
+
+
+def _parse_host(entry: str) -> Optional[dict]:
+    """Parse a user@host[:port] build farm entry"""
+    match = re.fullmatch(r"(?:([^@\s]+)@)?([^@:\s]+)(?::(\d+))?", entry.strip())
+    if not match:
+        return None
+    username, host, port = match.groups()
+    parsed = {"host": host}
+    if username:
+        parsed["username"] = username
+    if port:
+        parsed["port"] = int(port)
+    return parsed
+
+
+def _describe_host(host: dict) -> str:
+    described = f"{host['username']}@{host['host']}" if host.get("username") else host["host"]
+    return f"{described}:{host['port']}" if host.get("port") else described
+
+
+def _parse_shasum(output: str) -> Optional[str]:
+    """The digest from `shasum -a 256` output, if any"""
+    match = re.search(r"^([0-9a-f]{64})\s", output, re.MULTILINE)
+    return match.group(1) if match else None
+
+
+def _describe_tuning(tuning: dict) -> str:
+    """Human-readable form of a transfer benchmark result"""
+    parts = [tuning.get("method", "sftp")]
+    if tuning.get("compress"):
+        parts.append("ssh compression")
+    if tuning.get("cipher"):
+        parts.append(tuning["cipher"])
+    return " + ".join(parts)
+
+
+def _link_or_copy(source: str, destination: str):
+    """Hard-link `source` to `destination`, copying when linking isn't possible"""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
-# WEB SERVER
+# BUILD PIPELINE
 # ═══════════════════════════════════════════════════════════════════════════════
 
-class IPAHandler(http.server.SimpleHTTPRequestHandler):
-    """HTTP handler for serving IPA files"""
+class BuildStep:
+    """One node of the remote build graph.
+
+    `command` runs in the workspace. `inputs` is a shell snippet whose output
+    fingerprints everything the step reads; together with the command text it
+    forms the step's cache key. A step is skipped when the stamp from its last
+    successful run holds the same key and all of its `outputs` still exist.
+    Steps without `inputs` always run.
+    """
     
-    ipa_path = None
+    def __init__(self, name: str, command: str, needs: Tuple[str, ...] = (), inputs: str = None,
+                 outputs: Tuple[str, ...] = (), supervise: bool = False, allow_failure: bool = False):
+        self.name = name
+        self.command = command
+        self.needs = needs
+        self.inputs = inputs
+        self.outputs = outputs
+        self.supervise = supervise
+        self.allow_failure = allow_failure
     
-    def do_GET(self):
-        if self.path == "/download" or self.path.endswith(".ipa"):
-            self.serve_ipa()
-        elif self.path == "/status":
-            self.serve_status()
-        else:
-            self.serve_page()
+    @property
+    def slug(self) -> str:
+        return re.sub(r"[^a-z0-9]+", "-", self.name.lower()).strip("-")
+
+
+class StepPipeline:
+    """Runs a BuildStep graph, starting every step whose dependencies are done.
+
+    Independent steps run concurrently, each on its own SSH channel. Stamps are
+    kept in the workspace's .git directory, so `git clean` never removes them.
+    After a failure, no new steps start, and steps depending on the failed one
+    are reported as skipped.
+    """
     
-    def serve_ipa(self):
-        if not IPAHandler.ipa_path or not os.path.exists(IPAHandler.ipa_path):
-            self.send_error(404, "IPA not found")
-            return
+    def __init__(self, client: "SSHBuildClient", workdir: str, steps: List[BuildStep]):
+        self.client = client
+        self.workdir = workdir
+        self.steps = steps
+        self.stamp_dir = f"{workdir}/.git/ethsign-stamps"
+    
+    def run(self) -> bool:
+        done = set()
+        pending = list(self.steps)
+        running = {}
+        failed = None
+        position = 0
+        total = len(self.steps)
         
-        file_size = os.path.getsize(IPAHandler.ipa_path)
-        file_name = os.path.basename(IPAHandler.ipa_path)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, total)) as pool:
+            while pending or running:
+                ready = [] if failed else [step for step in pending if all(need in done for need in step.needs)]
+                if ready:
+                    keys = self._current_keys(ready)
+                    to_run = []
+                    for step in ready:
+                        pending.remove(step)
+                        position += 1
+                        key, up_to_date = keys[step.name]
+                        if up_to_date:
+                            done.add(step.name)
+                            self.client.progress.set_step(step.name, "skipped")
+                            print(f"{Colors.GRAY}⏭️  [{position}/{total}] {step.name}: inputs unchanged, skipped{Colors.ENDC}")
+                        else:
+                            to_run.append((position, step, key))
+                    # Interleaved output is unreadable, so concurrent steps only go to the log
+                    quiet = len(to_run) + len(running) > 1
+                    for step_position, step, key in to_run:
+                        print(f"\n{Colors.CYAN}▶️  [{step_position}/{total}] {step.name}...{Colors.ENDC}")
+                        running[pool.submit(self._run_step, step, key, not quiet)] = step
+                    if not to_run:
+                        continue
+                if not running:
+                    break
+                
+                finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    step = running.pop(future)
+                    if future.result():
+                        done.add(step.name)
+                    elif failed is None:
+                        failed = step
         
-        self.send_response(200)
-        self.send_header("Content-Type", "application/octet-stream")
-        self.send_header("Content-Disposition", f'attachment; filename="{file_name}"')
-        self.send_header("Content-Length", str(file_size))
-        self.end_headers()
+        for step in pending:
+            self.client.progress.set_step(step.name, "skipped")
+            print(f"{Colors.GRAY}⏭️  {step.name}: skipped after {failed.name} failed{Colors.ENDC}")
+        return failed is None
+    
+    def _current_keys(self, steps: List[BuildStep]) -> dict:
+        """Compute cache keys and compare them with the stamps, in one round trip"""
+        commands = []
+        for step in steps:
+            if step.inputs is None:
+                continue
+            commands.append(f"cd {self.workdir} && ( {step.inputs}\n) 2>&1 | shasum -a 256")
+            checks = [f"cat {self.stamp_dir}/{step.slug}"] + [f"test -e {self.workdir}/{output}" for output in step.outputs]
+            commands.append(" && ".join(checks))
+        results = iter(self.client.execute_batch(commands) if commands else [])
         
-        with open(IPAHandler.ipa_path, "rb") as f:
-            self.wfile.write(f.read())
+        keys = {}
+        for step in steps:
+            if step.inputs is None:
+                keys[step.name] = (None, False)
+                continue
+            (digest_code, digest), (stamp_code, stamp) = next(results), next(results)
+            fingerprint = _parse_shasum(digest) if digest_code == 0 else None
+            if not fingerprint:
+                keys[step.name] = (None, False)
+                continue
+            key = hashlib.sha256(f"{fingerprint}\0{step.command}".encode()).hexdigest()
+            keys[step.name] = (key, stamp_code == 0 and stamp.strip() == key)
+        return keys
+    
+    def _run_step(self, step: BuildStep, key: Optional[str], show_output: bool) -> bool:
+        supervisor = BuildSupervisor() if step.supervise else None
+        started = time.monotonic()
+        self.client.progress.set_step(step.name, "running")
+        exit_code, _ = self.client.execute(f"cd {self.workdir} && {step.command}", show_output=show_output,
+                                           capture=False, supervisor=supervisor)
+        if exit_code != 0 and not step.allow_failure:
+            self.client.progress.set_step(step.name, "failed")
+            self.client._build_failed(step.name, exit_code, supervisor)
+            return False
         
-        print(f"{Colors.GREEN}📤 IPA downloaded by {self.client_address[0]}{Colors.ENDC}")
+        if key:
+            self.client.execute_batch([f"mkdir -p {self.stamp_dir} && echo {key} > {self.stamp_dir}/{step.slug}"])
+        self.client.progress.set_step(step.name, "done")
+        print(f"{Colors.GREEN}✅ {step.name} ({time.monotonic() - started:.1f}s){Colors.ENDC}")
+        return True
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# BUILD FARM
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class HostStatus:
+    """Result of probing one build host"""
     
-    def serve_status(self):
-        status = {
-            "status": "ready" if IPAHandler.ipa_path else "no_build",
-            "ipa_available": os.path.exists(IPAHandler.ipa_path) if IPAHandler.ipa_path else False,
-            "timestamp": datetime.now().isoformat()
-        }
-        self.send_response(200)
-        self.send_header("Content-Type", "application/json")
-        self.end_headers()
-        self.wfile.write(json.dumps(status).encode())
+    def __init__(self, name: str, client: "SSHBuildClient" = None, error: str = None):
+        self.name = name
+        self.client = client
+        self.error = error
+        self.load = 0.0
+        self.cpus = 1
+        self.free_gb = 0.0
+        self.xcode = ""
+        self.busy = False
+        self.warm = False
     
-    def serve_page(self):
-        ipa_exists = IPAHandler.ipa_path and os.path.exists(IPAHandler.ipa_path)
-        ipa_name = os.path.basename(IPAHandler.ipa_path) if IPAHandler.ipa_path else "N/A"
-        ipa_size = f"{os.path.getsize(IPAHandler.ipa_path) / 1024 / 1024:.2f} MB" if ipa_exists else "N/A"
+    @property
+    def reachable(self) -> bool:
+        return self.client is not None and self.error is None
+    
+    @property
+    def load_per_cpu(self) -> float:
+        return self.load / max(self.cpus, 1)
+
+
+class HostPool:
+    """Build farm of the Macs in farm.hosts, or just the main SSH host if none are listed.
+
+    Probes run concurrently with one batched round trip per host. The scheduler
+    picks the least-loaded compatible host; a host that already has a DerivedData
+    cache for the branch gets a bonus, because a warm build is much faster.
+    """
+    
+    # A warm cache outweighs this much extra load per CPU
+    WARM_CACHE_BONUS = 0.5
+    # Hosts running a build started by this process, shared by all pools
+    _reserved = set()
+    _lock = threading.Lock()
+    
+    def __init__(self, config: ConfigManager):
+        self.config = config
+    
+    def hosts(self) -> List[dict]:
+        hosts = self.config.get("farm", "hosts") or []
+        return hosts or [{"host": self.config.get("ssh", "host")}]
+    
+    def probe_all(self) -> List[HostStatus]:
+        """Connect to every host in parallel and measure load, disk, Xcode and running builds.
+
+        The caller closes the probe connections with `close`.
+        """
+        hosts = self.hosts()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(hosts)) as pool:
+            futures = [pool.submit(self.probe, host) for host in hosts]
+        statuses, failure = [], None
+        for future in futures:
+            try:
+                statuses.append(future.result())
+            except Exception as e:
+                failure = failure or e
+        if failure:
+            self.close(statuses)
+            raise failure
+        return statuses
+    
+    def probe(self, host: dict) -> HostStatus:
+        host_config = self.config.for_host(host)
+        name = host_config.get("ssh", "host")
+        client = SSHBuildClient(host_config)
+        try:
+            tuning = client.transfer_tuning()
+            client.client = client._open_client(tuning.get("compress", False), tuning.get("cipher"))
+            client.connected = True
+        except Exception as e:
+            return HostStatus(name, error=str(e))
+        
+        target_dir = host_config.get("build", "target_dir")
+        cache_dir = host_config.get("build", "cache_dir") or "/nonexistent"
+        branch = host_config.get("build", "branch")
+        try:
+            results = client.execute_batch([
+                "sysctl -n vm.loadavg",
+                "sysctl -n hw.ncpu",
+                f"mkdir -p {target_dir} && df -k {target_dir} | awk 'NR == 2 {{print $4}}'",
+                "version=$(xcodebuild -version) && echo \"$version\" | head -1",
+                "pgrep -x xcodebuild >/dev/null && echo busy || echo idle",
+                f"ls -d {cache_dir.rstrip('/')}/{build_cache_key(branch)}* 2>/dev/null | head -1",
+            ])
+        except (paramiko.SSHException, EOFError, OSError, socket.timeout) as e:
+            # A host that drops the channel is just unavailable; the rest of the farm still builds
+            client.client.close()
+            return HostStatus(name, error=str(e) or type(e).__name__)
+        status = HostStatus(name, client)
+        (_, loadavg), (_, cpus), (_, free_kb), (xcode_code, xcode), (_, busy), (_, warm) = results
+        numbers = re.findall(r"\d+(?:\.\d+)?", loadavg)
+        status.load = float(numbers[0]) if numbers else 0.0
+        status.cpus = int(cpus.strip()) if cpus.strip().isdigit() else 1
+        status.free_gb = int(free_kb.strip()) / 1024 / 1024 if free_kb.strip().isdigit() else 0.0
+        status.xcode = xcode.strip() if xcode_code == 0 else ""
+        with self._lock:
+            status.busy = busy.strip() == "busy" or name in self._reserved
+        status.warm = bool(warm.strip())
+        return status
+    
+    def compatible(self, status: HostStatus) -> bool:
+        required = self.config.get("farm", "required_xcode")
+        min_free_gb = float(self.config.get("farm", "min_free_gb") or 0)
+        return (status.reachable and bool(status.xcode) and status.free_gb >= min_free_gb
+                and (not required or status.xcode.split()[-1].startswith(required)))
+    
+    def select(self, statuses: List[HostStatus]) -> Optional[HostStatus]:
+        """The best host for the next build: idle before busy, then load with the warm cache bonus"""
+        candidates = [status for status in statuses if self.compatible(status)]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda status: (
+            status.busy, status.load_per_cpu - (self.WARM_CACHE_BONUS if status.warm else 0)))
+    
+    def acquire(self, show: bool = True) -> Optional["SSHBuildClient"]:
+        """Probe the farm and reserve the chosen host; the other probe connections are closed"""
+        statuses = self.probe_all()
+        chosen = None
+        try:
+            with self._lock:
+                chosen = self.select(statuses)
+                if chosen:
+                    self._reserved.add(chosen.name)
+            if show:
+                self.print_statuses(statuses, chosen)
+        except BaseException:
+            if chosen:
+                self.release(chosen.client)
+                chosen = None
+            raise
+        finally:
+            self.close(statuses, keep=chosen)
+        return chosen.client if chosen else None
+    
+    def close(self, statuses: List[HostStatus], keep: HostStatus = None):
+        """Close the probe connections of `statuses`, except the one of `keep`"""
+        for status in statuses:
+            if status is not keep and status.client:
+                status.client.client.close()
+    
+    def release(self, client: "SSHBuildClient"):
+        with self._lock:
+            self._reserved.discard(client.config.get("ssh", "host"))
+    
+    def print_statuses(self, statuses: List[HostStatus], chosen: HostStatus = None):
+        print(f"\n{Colors.HEADER}🖥️  BUILD HOSTS{Colors.ENDC}")
+        for status in statuses:
+            marker = f"{Colors.GREEN}➜{Colors.ENDC}" if status is chosen else " "
+            if not status.reachable:
+                print(f"  {marker} {status.name:<20} {Colors.RED}unreachable: {status.error}{Colors.ENDC}")
+                continue
+            color = Colors.WHITE if self.compatible(status) else Colors.GRAY
+            flags = ", ".join(flag for flag, on in (("busy", status.busy), ("warm cache", status.warm)) if on)
+            print(f"  {marker} {color}{status.name:<20} load {status.load:.2f}/{status.cpus} cpu  "
+                  f"{status.free_gb:.0f} GB free  {status.xcode or 'no Xcode'}{f'  [{flags}]' if flags else ''}{Colors.ENDC}")
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# BUILD HISTORY
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class BuildHistory:
+    """SQLite record of every build: outcome, size, cache hits and the time of each phase.
+
+    build_and_serve.py writes the same schema, so its history can be reported too.
+    Each call opens its own connection, which keeps it safe across build threads.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS builds (
+            id INTEGER PRIMARY KEY,
+            started_at TEXT NOT NULL,
+            host TEXT NOT NULL,
+            branch TEXT NOT NULL,
+            project TEXT,
+            outcome TEXT NOT NULL,
+            duration REAL NOT NULL,
+            artifact_size INTEGER,
+            result_cache TEXT
+        );
+        CREATE INDEX IF NOT EXISTS builds_by_branch ON builds (branch, started_at);
+        CREATE INDEX IF NOT EXISTS builds_by_host ON builds (host, started_at);
+        CREATE INDEX IF NOT EXISTS builds_by_date ON builds (started_at);
+        CREATE TABLE IF NOT EXISTS phases (
+            build_id INTEGER NOT NULL REFERENCES builds (id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            duration REAL NOT NULL,
+            cached INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS phases_by_build ON phases (build_id);
+    """
+    
+    def __init__(self, path: str = None):
+        self.path = path
+    
+    def open(self, path: str):
+        self.path = path
+    
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.executescript(self.SCHEMA)
+        return connection
+    
+    def record(self, started_at: datetime, duration: float, outcome: str, host: str, branch: str,
+               project: str = None, artifact_size: int = None, result_cache: str = None,
+               phases: List[Tuple[str, str, float, bool]] = ()) -> Optional[int]:
+        """Add a build; a history that can't be written never fails the build"""
+        if not self.path:
+            return None
+        try:
+            with contextlib.closing(self._connect()) as connection, connection:
+                build_id = connection.execute(
+                    "INSERT INTO builds (started_at, host, branch, project, outcome, duration, artifact_size, result_cache) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (started_at.isoformat(), host, branch, project, outcome, duration, artifact_size, result_cache)
+                ).lastrowid
+                connection.executemany(
+                    "INSERT INTO phases (build_id, position, name, kind, duration, cached) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(build_id, position, name, kind, seconds, int(cached))
+                     for position, (name, kind, seconds, cached) in enumerate(phases)])
+            return build_id
+        except sqlite3.Error as e:
+            print(f"{Colors.YELLOW}⚠️  Could not record build history: {e}{Colors.ENDC}")
+            return None
+    
+    def builds(self, branch: str = None, host: str = None, since: datetime = None) -> List[dict]:
+        """Builds matching the filters, oldest first, each with its "phases" list"""
+        if not self.path or not os.path.exists(self.path):
+            return []
+        conditions, params = [], []
+        for column, value in (("branch", branch), ("host", host)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if since:
+            conditions.append("started_at >= ?")
+            params.append(since.isoformat())
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
         
-        html = f"""<!DOCTYPE html>
+        with contextlib.closing(self._connect()) as connection:
+            connection.row_factory = sqlite3.Row
+            builds = [dict(row) for row in connection.execute(f"SELECT * FROM builds {where} ORDER BY started_at", params)]
+            by_id = {build["id"]: build for build in builds}
+            for build in builds:
+                build["phases"] = []
+            for row in connection.execute(
+                    f"SELECT phases.* FROM phases JOIN builds ON builds.id = phases.build_id {where} "
+                    "ORDER BY phases.build_id, phases.position", params):
+                by_id[row["build_id"]]["phases"].append(dict(row))
+        return builds
+
+
+HISTORY = BuildHistory()
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Linearly interpolated percentile of `values` (fraction between 0 and 1)"""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+# The latest run of a phase is a regression when it is this much slower than the
+# median of the previous BASELINE_WINDOW runs, both relatively and in seconds
+BASELINE_WINDOW = 10
+REGRESSION_RATIO = 1.25
+REGRESSION_MIN_SECONDS = 5.0
+
+
+def history_report(history: BuildHistory, branch: str = None, host: str = None, days: int = None) -> bool:
+    """Print percentiles per branch, host and phase; returns True if any phase regressed"""
+    since = datetime.now(timezone.utc) - timedelta(days=days) if days else None
+    builds = history.builds(branch, host, since)
+    if not builds:
+        print(f"{Colors.YELLOW}No builds recorded in {history.path}{Colors.ENDC}")
+        return False
+    
+    groups = collections.OrderedDict()
+    for build in builds:
+        groups.setdefault((build["branch"], build["host"]), []).append(build)
+    
+    regressed = False
+    for (group_branch, group_host), group in groups.items():
+        succeeded = [build for build in group if build["outcome"] == "succeeded"]
+        hits = sum(1 for build in group if build["result_cache"])
+        print(f"\n{Colors.HEADER}📊 {group_branch} @ {group_host}{Colors.ENDC}  "
+              f"{Colors.GRAY}{len(group)} builds, {len(group) - len(succeeded)} not successful, "
+              f"{hits} from the result cache, last {group[-1]['started_at'][:16].replace('T', ' ')}{Colors.ENDC}")
+        
+        # Samples per phase from successful builds; cached (skipped) steps took no time
+        samples = collections.OrderedDict()
+        samples["Total"] = [build["duration"] for build in succeeded if not build["result_cache"]]
+        for build in succeeded:
+            for phase in build["phases"]:
+                if not phase["cached"]:
+                    samples.setdefault(phase["name"], []).append(phase["duration"])
+        kinds = {phase["name"]: phase["kind"] for build in group for phase in build["phases"]}
+        if not any(samples.values()):
+            continue
+        
+        print(f"  {Colors.GRAY}{'phase':<28} {'runs':>5} {'p50':>8} {'p90':>8} {'p95':>8} {'latest':>8} {'baseline':>9}{Colors.ENDC}")
+        for name, values in samples.items():
+            if not values:
+                continue
+            latest, previous = values[-1], values[:-1][-BASELINE_WINDOW:]
+            baseline = percentile(previous, 0.5) if previous else None
+            flag = ""
+            if baseline is not None and latest > baseline * REGRESSION_RATIO and latest - baseline >= REGRESSION_MIN_SECONDS:
+                flag = f"{Colors.RED}▲ regression (+{(latest / baseline - 1) * 100 if baseline else 0:.0f}%){Colors.ENDC}"
+                regressed = True
+            label = f"  {name}" if kinds.get(name) == "step" else name
+            baseline_text = f"{baseline:>8.1f}s" if baseline is not None else f"{'-':>9}"
+            print(f"  {label:<28} {len(values):>5} {percentile(values, 0.5):>7.1f}s {percentile(values, 0.9):>7.1f}s "
+                  f"{percentile(values, 0.95):>7.1f}s {latest:>7.1f}s {baseline_text} {flag}")
+        
+        sizes = [build["artifact_size"] for build in succeeded if build["artifact_size"]]
+        if len(sizes) >= 2:
+            print(f"  {Colors.GRAY}IPA size: {sizes[-1] / 1024 / 1024:.1f} MB "
+                  f"({(sizes[-1] - sizes[-2]) / 1024 / 1024:+.1f} MB since the previous build){Colors.ENDC}")
+    return regressed
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ARTIFACT TRANSFER
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class ChunkedDownloader:
+    """Fetches a remote file as parallel ranged chunks over several SFTP channels.
+
+    Chunks are written with pwrite() into a preallocated `<local>.part` file. The
+    completed chunk indices go to a `<local>.part.json` journal, so an interrupted
+    transfer resumes where it stopped, provided the remote size and mtime are unchanged.
+    The SHA-256 is computed in file order as chunks arrive; chunks that finish ahead
+    of the hash position stay in memory until it reaches them, so workers only take
+    chunks within AHEAD_PER_CHANNEL * channels of it. Setting `cancelled` stops the
+    workers after their current read and raises BuildCancelled.
+    """
+
+    # Reads issued per channel round trip; paramiko pipelines them in 32 KiB requests
+    READ_SIZE = 1024 * 1024
+    # How far (in chunks, per channel) downloads may run ahead of the hash position
+    AHEAD_PER_CHANNEL = 2
+
+    def __init__(self, open_sftp: Callable[[], "paramiko.SFTPClient"], channels: int = 4,
+                 chunk_size: int = 8 * 1024 * 1024, on_progress: Callable[[int, int], None] = None,
+                 cancelled: threading.Event = None):
+        self.open_sftp = open_sftp
+        self.channels = max(1, channels)
+        self.chunk_size = chunk_size
+        self.on_progress = on_progress
+        self.cancelled = cancelled or threading.Event()
+        self._lock = threading.Lock()
+
+    def download(self, remote_path: str, local_path: str) -> Tuple[int, str]:
+        """Download `remote_path` to `<local_path>.part`, resuming a previous attempt.
+
+        Returns the size and SHA-256 hex digest of the downloaded file. The caller
+        moves it into place once the digest has been checked.
+        """
+        part_path = f"{local_path}.part"
+        journal_path = f"{local_path}.part.json"
+
+        sftp = self.open_sftp()
+        try:
+            remote_stat = sftp.stat(remote_path)
+        finally:
+            sftp.close()
+        size = remote_stat.st_size
+        source = {"remote": remote_path, "size": size, "mtime": remote_stat.st_mtime, "chunk_size": self.chunk_size}
+
+        done = set()
+        try:
+            with open(journal_path) as f:
+                journal = json.load(f)
+            if {k: journal.get(k) for k in source} == source and os.path.getsize(part_path) == size:
+                done = set(journal["done"])
+        except (OSError, ValueError, KeyError):
+            pass
+
+        chunk_count = max(1, -(-size // self.chunk_size))
+        pending = collections.deque(i for i in range(chunk_count) if i not in done)
+        if done:
+            print(f"   {Colors.GRAY}Resuming: {len(done)}/{chunk_count} chunks already on disk{Colors.ENDC}")
+
+        fd = os.open(part_path, os.O_RDWR | os.O_CREAT)
+        try:
+            if not done:
+                os.ftruncate(fd, size)
+                if hasattr(os, "posix_fallocate") and size:
+                    try:
+                        os.posix_fallocate(fd, 0, size)
+                    except OSError:
+                        pass
+
+            resumed = sum(min(self.chunk_size, size - i * self.chunk_size) for i in done)
+            progress = {"bytes": resumed, "resumed": resumed, "start": time.monotonic(), "printed": 0.0}
+            errors = []
+
+            digest = hashlib.sha256()
+            hash_lock = threading.Lock()
+            # Signalled when the hash position moves or a worker fails
+            hash_moved = threading.Condition(hash_lock)
+            hash_position = 0
+            on_disk = set(done)
+            arrived = {}
+            window = self.channels * self.AHEAD_PER_CHANNEL
+
+            def advance_hash():
+                """Feed every contiguous chunk from the hash position on; call with hash_lock held"""
+                nonlocal hash_position
+                while hash_position < chunk_count:
+                    index = hash_position
+                    if index in arrived:
+                        for piece in arrived.pop(index):
+                            digest.update(piece)
+                    elif index in on_disk:
+                        # Resumed chunks were hashed by the interrupted attempt; read them back once
+                        offset = index * self.chunk_size
+                        end = min(offset + self.chunk_size, size)
+                        for pos in range(offset, end, self.READ_SIZE):
+                            digest.update(os.pread(fd, min(self.READ_SIZE, end - pos), pos))
+                    else:
+                        return
+                    hash_position += 1
+
+            def save_journal():
+                temp = f"{journal_path}.tmp"
+                with open(temp, "w") as f:
+                    json.dump(dict(source, done=sorted(done)), f)
+                os.replace(temp, journal_path)
+
+            def fail(error: Exception):
+                with hash_moved:
+                    errors.append(error)
+                    hash_moved.notify_all()
+
+            def worker():
+                try:
+                    channel = self.open_sftp()
+                except Exception as e:
+                    fail(e)
+                    return
+                try:
+                    with channel.open(remote_path, "rb") as remote:
+                        while True:
+                            # The chunk at the hash position is always in flight or first in
+                            # line, so waiting for the window to move cannot deadlock
+                            with hash_moved:
+                                hash_moved.wait_for(lambda: errors or not pending or pending[0] < hash_position + window)
+                                if errors or not pending:
+                                    return
+                                index = pending.popleft()
+                            offset = index * self.chunk_size
+                            length = min(self.chunk_size, size - offset)
+                            reads = [(pos, min(self.READ_SIZE, offset + length - pos))
+                                     for pos in range(offset, offset + length, self.READ_SIZE)]
+                            pieces = []
+                            for (pos, _), data in zip(reads, remote.readv(reads)):
+                                if self.cancelled.is_set():
+                                    raise BuildCancelled()
+                                os.pwrite(fd, data, pos)
+                                pieces.append(data)
+                                with self._lock:
+                                    progress["bytes"] += len(data)
+                                    self._report(progress, size)
+                            with hash_moved:
+                                arrived[index] = pieces
+                                advance_hash()
+                                hash_moved.notify_all()
+                            with self._lock:
+                                done.add(index)
+                                save_journal()
+                except Exception as e:
+                    fail(e)
+                finally:
+                    channel.close()
+
+            # Move past chunks resumed from disk before the window is first checked
+            with hash_lock:
+                advance_hash()
+            workers = [threading.Thread(target=worker, daemon=True)
+                       for _ in range(min(self.channels, len(pending)))]
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            print()
+
+            if errors:
+                raise errors[0]
+            with hash_lock:
+                advance_hash()
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        try:
+            os.remove(journal_path)
+        except OSError:
+            pass
+        return size, digest.hexdigest()
+
+    def _report(self, progress: dict, size: int):
+        now = time.monotonic()
+        if now - progress["printed"] < 0.25 and progress["bytes"] < size:
+            return
+        progress["printed"] = now
+        if self.on_progress:
+            self.on_progress(progress["bytes"], size)
+        elapsed = max(now - progress["start"], 1e-6)
+        rate = (progress["bytes"] - progress["resumed"]) / elapsed / 1024 / 1024
+        percent = progress["bytes"] * 100 / size if size else 100
+        print(f"\r   {Colors.CYAN}{percent:5.1f}%{Colors.ENDC}  "
+              f"{progress['bytes'] / 1024 / 1024:.1f}/{size / 1024 / 1024:.1f} MB  "
+              f"{Colors.GREEN}{rate:.1f} MB/s{Colors.ENDC}   ", end="", flush=True)
+
+
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+def write_artifact_manifest(path: str, sha256: str, remote_sha256: str = None, source: str = None,
+                            staged: bool = False) -> dict:
+    """Record the digests of a downloaded artifact in `<path>.manifest.json`.
+
+    With `staged`, the artifact is still `<path>.part`: the manifest is written for
+    it first, then both are renamed into place, so `path` never has a stale manifest.
+    """
+    stat = os.stat(f"{path}.part" if staged else path)
+    manifest = {
+        "name": os.path.basename(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": sha256,
+        "remote_sha256": remote_sha256,
+        "verified": remote_sha256 == sha256 if remote_sha256 else None,
+        "source": source,
+        "created": datetime.now().isoformat()
+    }
+    temp_path = f"{path}{MANIFEST_SUFFIX}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    # A rename keeps size and mtime, so the manifest matches the artifact once both are in place;
+    # read_artifact_manifest ignores it if a crash leaves only one of them renamed
+    if staged:
+        os.replace(f"{path}.part", path)
+    os.replace(temp_path, f"{path}{MANIFEST_SUFFIX}")
+    return manifest
+
+
+def discard_download(local_path: str):
+    """Remove the unfinished or rejected download of `local_path` and its resume journal"""
+    for leftover in (f"{local_path}.part", f"{local_path}.part.json"):
+        try:
+            os.remove(leftover)
+        except FileNotFoundError:
+            pass
+
+
+def discard_artifact(path: str):
+    """Remove an artifact that must not be served, with its manifest and any unfinished download"""
+    discard_download(path)
+    for leftover in (path, f"{path}{MANIFEST_SUFFIX}"):
+        try:
+            os.remove(leftover)
+        except FileNotFoundError:
+            pass
+
+
+def read_artifact_manifest(path: str, stat: os.stat_result = None) -> dict:
+    """The manifest of `path`, or {} if there is none or it describes an older file"""
+    try:
+        stat = stat or os.stat(path)
+        with open(f"{path}{MANIFEST_SUFFIX}") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("size") != stat.st_size or manifest.get("mtime_ns") != stat.st_mtime_ns:
+        return {}
+    return manifest
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# IPA METADATA
+# ═══════════════════════════════════════════════════════════════════════════════
+
+_INFO_PLIST_PATTERN = re.compile(r"Payload/[^/]+\.app/Info\.plist")
+
+
+def ipa_fingerprint(archive: zipfile.ZipFile) -> str:
+    """Content fingerprint of an archive from its central directory alone.
+
+    Hashes each entry's name, CRC-32 and size in order, so two archives with the
+    same contents match even if they were compressed differently (e.g. an IPA
+    rebuilt from a delta), and no entry data has to be read.
+    """
+    digest = hashlib.sha256()
+    for info in archive.infolist():
+        digest.update(f"{info.filename}\0{info.CRC:08x}\0{info.file_size}\n".encode("utf-8", "surrogateescape"))
+    return digest.hexdigest()
+
+
+def read_ipa_metadata(archive: zipfile.ZipFile) -> dict:
+    """Read app details from an IPA's Info.plist without extracting the archive.
+
+    zipfile only parses the central directory on open, and just the Info.plist
+    entry is decompressed, so this costs a few hundred KB of I/O per IPA.
+    """
+    info_name = next((n for n in archive.namelist() if _INFO_PLIST_PATTERN.fullmatch(n)), None)
+    if not info_name:
+        return {}
+    info = plistlib.loads(archive.read(info_name))
+    if not isinstance(info, dict):
+        return {}
+
+    return {
+        "name": info.get("CFBundleDisplayName") or info.get("CFBundleName"),
+        "bundle_id": info.get("CFBundleIdentifier"),
+        "version": info.get("CFBundleShortVersionString"),
+        "build": info.get("CFBundleVersion"),
+        "min_ios": info.get("MinimumOSVersion")
+    }
+
+
+class IPAIndex:
+    """On-disk cache of IPA metadata keyed by a content fingerprint.
+
+    The fingerprint (see ipa_fingerprint) comes from the central directory, which
+    records the CRC-32 and size of every entry, so identical archives share one
+    record without hashing hundreds of MB. Files are mapped to fingerprints by
+    (mtime, size), so a known file costs a single stat().
+    """
+
+    FORMAT = 2
+
+    def __init__(self, index_path: str = None):
+        self.index_path = index_path
+        self._digests = {}
+        self._files = {}
+        self._lock = threading.Lock()
+        if index_path:
+            self.open(index_path)
+
+    def open(self, index_path: str):
+        """Load (or start) the index stored at `index_path`"""
+        self.index_path = index_path
+        try:
+            with open(index_path, "r") as f:
+                data = json.load(f)
+            if data.get("format") != self.FORMAT:
+                raise ValueError("Outdated index format")
+            self._digests = data.get("digests", {})
+            self._files = data.get("files", {})
+        except (OSError, ValueError):
+            self._digests, self._files = {}, {}
+
+    def lookup(self, path: str, stat: os.stat_result = None) -> dict:
+        """Metadata for the IPA at `path`; an empty dict if it can't be read"""
+        path = os.path.abspath(path)
+        try:
+            stat = stat or os.stat(path)
+        except OSError:
+            return {}
+        key = [stat.st_mtime_ns, stat.st_size]
+
+        with self._lock:
+            known = self._files.get(path)
+            if known and known["key"] == key and known["digest"] in self._digests:
+                return self._digests[known["digest"]]
+
+        try:
+            with zipfile.ZipFile(path) as archive:
+                digest = ipa_fingerprint(archive)
+                with self._lock:
+                    metadata = self._digests.get(digest)
+                if metadata is None:
+                    metadata = read_ipa_metadata(archive)
+        except (OSError, zipfile.BadZipFile, plistlib.InvalidFileException, KeyError, ValueError):
+            return {}
+
+        with self._lock:
+            self._digests[digest] = metadata
+            self._files[path] = {"key": key, "digest": digest}
+            self._save()
+        return metadata
+
+    def fingerprint(self, path: str) -> Optional[str]:
+        """Content fingerprint of the IPA at `path`, or None if it isn't a readable zip"""
+        path = os.path.abspath(path)
+        self.lookup(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            known = self._files.get(path)
+        if known and known["key"] == [stat.st_mtime_ns, stat.st_size]:
+            return known["digest"]
+        return None
+
+    def find(self, digest: str) -> Optional[str]:
+        """A path that currently holds an IPA with fingerprint `digest`"""
+        with self._lock:
+            candidates = [(path, known["key"]) for path, known in self._files.items() if known["digest"] == digest]
+        for path, key in candidates:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if [stat.st_mtime_ns, stat.st_size] == key:
+                return path
+        return None
+
+    def _save(self):
+        if not self.index_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+            temp_path = f"{self.index_path}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump({"format": self.FORMAT, "digests": self._digests, "files": self._files}, f)
+            os.replace(temp_path, self.index_path)
+        except OSError:
+            pass
+
+
+IPA_INDEX = IPAIndex()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# IPA DELTAS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+DELTA_FORMAT = 1
+DELTA_MANIFEST = "delta.json"
+
+
+def _copy_entry(source, archive: zipfile.ZipFile, zinfo: zipfile.ZipInfo):
+    """Stream one decompressed entry into `archive` without holding it in memory"""
+    with source, archive.open(zinfo, "w", force_zip64=zinfo.file_size > 0x7FFFFFFF) as target:
+        shutil.copyfileobj(source, target, STREAM_CHUNK_SIZE)
+
+
+def create_ipa_delta(base_path: str, target_path: str, delta_path: str) -> dict:
+    """Write an entry-level delta that turns `base_path` into `target_path`.
+
+    Entries whose name, CRC-32 and size match the base are referenced, everything
+    else is stored in the delta. Only the central directories are compared, so
+    unchanged entries are never decompressed. Returns the delta manifest.
+    """
+    with zipfile.ZipFile(base_path) as base, zipfile.ZipFile(target_path) as target, \
+            zipfile.ZipFile(delta_path, "w", zipfile.ZIP_DEFLATED) as delta:
+        base_entries = {info.filename: (info.CRC, info.file_size) for info in base.infolist()}
+        target_names = set()
+        entries = []
+        changed_bytes = 0
+
+        for info in target.infolist():
+            target_names.add(info.filename)
+            unchanged = base_entries.get(info.filename) == (info.CRC, info.file_size)
+            if not unchanged:
+                stored = zipfile.ZipInfo(f"files/{info.filename}", info.date_time)
+                stored.compress_type = zipfile.ZIP_DEFLATED
+                stored.file_size = info.file_size
+                _copy_entry(target.open(info), delta, stored)
+                changed_bytes += info.file_size
+            entries.append({
+                "name": info.filename,
+                "source": "base" if unchanged else "delta",
+                "crc": info.CRC,
+                "size": info.file_size,
+                "date_time": list(info.date_time),
+                "compress_type": info.compress_type,
+                "create_system": info.create_system,
+                "external_attr": info.external_attr
+            })
+
+        manifest = {
+            "format": DELTA_FORMAT,
+            "base": ipa_fingerprint(base),
+            "target": ipa_fingerprint(target),
+            "entries": entries,
+            "removed": [name for name in base_entries if name not in target_names],
+            "changed_bytes": changed_bytes
+        }
+        delta.writestr(DELTA_MANIFEST, json.dumps(manifest))
+    return manifest
+
+
+def apply_ipa_delta(base_path: str, delta_path: str, output_path: str) -> dict:
+    """Rebuild the target IPA from `base_path` and a delta, verifying every entry's CRC.
+
+    The result has the same entries, contents and attributes as the target (and so
+    the same fingerprint), though not necessarily byte-identical compression.
+    """
+    temp_path = f"{output_path}.part"
+    try:
+        with zipfile.ZipFile(delta_path) as delta:
+            manifest = json.loads(delta.read(DELTA_MANIFEST))
+            if manifest.get("format") != DELTA_FORMAT:
+                raise ValueError(f"Unsupported delta format: {manifest.get('format')}")
+
+            with zipfile.ZipFile(base_path) as base:
+                if ipa_fingerprint(base) != manifest["base"]:
+                    raise ValueError("Delta was made against a different base build")
+
+                with zipfile.ZipFile(temp_path, "w") as output:
+                    for entry in manifest["entries"]:
+                        zinfo = zipfile.ZipInfo(entry["name"], tuple(entry["date_time"]))
+                        zinfo.compress_type = entry["compress_type"]
+                        zinfo.create_system = entry["create_system"]
+                        zinfo.external_attr = entry["external_attr"]
+                        zinfo.file_size = entry["size"]
+                        if entry["source"] == "base":
+                            source = base.open(entry["name"])
+                        else:
+                            source = delta.open(f"files/{entry['name']}")
+                        _copy_entry(source, output, zinfo)
+                        if zinfo.CRC != entry["crc"] or zinfo.file_size != entry["size"]:
+                            raise ValueError(f"CRC or size mismatch for {entry['name']}")
+
+        os.replace(temp_path, output_path)
+    except BaseException:
+        # A half-written or corrupt rebuild never lingers next to the output
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+    return manifest
+
+
+class DeltaStore:
+    """Caches deltas between builds and keeps superseded IPAs around as delta bases.
+
+    Deltas are written to `<directory>/<base>-<target>.delta` and computed at most
+    once per pair. A build that is about to be overwritten in place is linked to
+    `<directory>/base-<fingerprint>.ipa` so devices still running it can update.
+    """
+
+    KEEP_BASES = 5
+    KEEP_DELTAS = 20
+
+    def __init__(self, directory: str = None):
+        self.directory = directory
+        self.last_base: Optional[str] = None
+        self._lock = threading.Lock()
+        self._pair_locks = {}
+
+    def open(self, directory: str):
+        self.directory = directory
+
+    def retain(self, path: str):
+        """Keep an IPA that is about to be replaced in the store as a future delta base.
+
+        The IPA is hard-linked, not moved: it stays served until the new build is
+        renamed over it, and survives if that build never arrives.
+        """
+        if not self.directory or not os.path.isfile(path):
+            return
+        fingerprint = IPA_INDEX.fingerprint(path)
+        if not fingerprint:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        retained = os.path.join(self.directory, f"base-{fingerprint}.ipa")
+        if not os.path.isfile(retained):
+            _link_or_copy(path, retained)
+            IPA_INDEX.lookup(retained)
+        self.last_base = fingerprint
+        self._prune("base-*.ipa", self.KEEP_BASES)
+
+    def delta_for(self, base_fingerprint: str, target_path: str) -> Optional[str]:
+        """Path of the delta from `base_fingerprint` to `target_path`, computing it if needed.
+
+        Returns None when the base build is no longer available.
+        """
+        if not self.directory:
+            return None
+        target_fingerprint = IPA_INDEX.fingerprint(target_path)
+        if not target_fingerprint:
+            return None
+        delta_path = os.path.join(self.directory, f"{base_fingerprint[:16]}-{target_fingerprint[:16]}.delta")
+
+        with self._lock:
+            pair_lock = self._pair_locks.setdefault(delta_path, threading.Lock())
+        with pair_lock:
+            if os.path.isfile(delta_path):
+                return delta_path
+            base_path = IPA_INDEX.find(base_fingerprint)
+            if not base_path:
+                retained = os.path.join(self.directory, f"base-{base_fingerprint}.ipa")
+                if not os.path.isfile(retained) or IPA_INDEX.fingerprint(retained) != base_fingerprint:
+                    return None
+                base_path = retained
+
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = f"{delta_path}.tmp"
+            manifest = create_ipa_delta(base_path, target_path, temp_path)
+            os.replace(temp_path, delta_path)
+            print(f"{Colors.GREEN}🧩 Delta {base_fingerprint[:8]} → {target_fingerprint[:8]}: "
+                  f"{os.path.getsize(delta_path) / 1024 / 1024:.2f} MB "
+                  f"({manifest['changed_bytes'] / 1024 / 1024:.2f} MB of changed entries){Colors.ENDC}")
+        self._prune("*.delta", self.KEEP_DELTAS)
+        return delta_path
+
+    def prepare(self, target_path: Optional[str], previous_path: Optional[str] = None):
+        """Precompute deltas to a newly served build in the background"""
+        if not self.directory or not target_path:
+            return
+
+        def work():
+            bases = {self.last_base}
+            if previous_path and os.path.abspath(previous_path) != os.path.abspath(target_path):
+                bases.add(IPA_INDEX.fingerprint(previous_path))
+            target_fingerprint = IPA_INDEX.fingerprint(target_path)
+            for base in bases - {None, target_fingerprint}:
+                try:
+                    self.delta_for(base, target_path)
+                except (OSError, zipfile.BadZipFile, ValueError):
+                    pass
+
+        threading.Thread(target=work, daemon=True).start()
+
+    def _prune(self, pattern: str, keep: int):
+        paths = sorted(Path(self.directory).glob(pattern), key=lambda p: p.stat().st_mtime, reverse=True)
+        for stale in paths[keep:]:
+            try:
+                stale.unlink()
+            except OSError:
+                pass
+
+
+DELTAS = DeltaStore()
+
+
+def _download_verified(url: str, output_path: str):
+    """Download `url` to `output_path`, replacing it only if the body matches the SHA-256 ETag"""
+    temp_path = f"{output_path}.part"
+    try:
+        with urllib.request.urlopen(url) as response, open(temp_path, "wb") as f:
+            # The build server's IPA ETag is the file's SHA-256
+            expected = (response.headers.get("ETag") or "").strip('"')
+            if not re.fullmatch(r"[0-9a-f]{64}", expected):
+                raise ValueError("Server did not send a SHA-256 ETag for the IPA")
+            digest = hashlib.sha256()
+            for chunk in iter(lambda: response.read(STREAM_CHUNK_SIZE), b""):
+                digest.update(chunk)
+                f.write(chunk)
+        if digest.hexdigest() != expected:
+            raise ValueError("Downloaded IPA does not match the server's SHA-256")
+        os.replace(temp_path, output_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+
+
+def update_from_server(server_url: str, base_path: str, output_path: str) -> bool:
+    """Fetch the current build from a build server as a delta against `base_path`"""
+    with zipfile.ZipFile(base_path) as base:
+        fingerprint = ipa_fingerprint(base)
+    server_url = server_url.rstrip("/")
+    delta_path = f"{output_path}.delta"
+
+    try:
+        with urllib.request.urlopen(f"{server_url}/delta/{fingerprint}") as response, open(delta_path, "wb") as f:
+            shutil.copyfileobj(response, f, STREAM_CHUNK_SIZE)
+    except urllib.error.HTTPError as e:
+        if e.code != 404:
+            raise
+        print(f"{Colors.YELLOW}⚠️  Server has no delta for this base, downloading the full IPA...{Colors.ENDC}")
+        _download_verified(f"{server_url}/download", output_path)
+        return True
+
+    try:
+        manifest = apply_ipa_delta(base_path, delta_path, output_path)
+    finally:
+        os.remove(delta_path)
+    print(f"{Colors.GREEN}✅ Updated {os.path.basename(base_path)} → {output_path} "
+          f"({manifest['changed_bytes'] / 1024 / 1024:.2f} MB of changed entries){Colors.ENDC}")
+    return True
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# WEB SERVER
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Size of each sendfile() call / fallback read when streaming files
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+def _wait_writable(sock: socket.socket):
+    """Block until the socket can accept more data (honours the socket timeout)"""
+    _, writable, _ = select.select([], [sock], [], sock.gettimeout())
+    if not writable:
+        raise socket.timeout("timed out waiting to send")
+
+
+def send_file(sock: socket.socket, f, offset: int, count: int, on_chunk: Callable[[int], None] = None,
+              throttle: Callable[[int], int] = None) -> int:
+    """Stream `count` bytes of `f` starting at `offset` to `sock`.
+
+    Uses the kernel's zero-copy os.sendfile() where available and falls back to
+    fixed-size chunked copies, so memory use stays constant regardless of file size.
+    `on_chunk` is called with the size of every chunk sent; `throttle`, if given,
+    is asked how many bytes may go out whenever its previous grant has been sent,
+    and may block. Returns the number of bytes sent.
+    """
+    sent = 0
+    # Granted by `throttle` but not sent yet: sendfile() may send less than asked
+    allowance = 0
+
+    if hasattr(os, "sendfile"):
+        try:
+            in_fd = f.fileno()
+            out_fd = sock.fileno()
+            while sent < count:
+                size = min(STREAM_CHUNK_SIZE, count - sent)
+                if throttle:
+                    if not allowance:
+                        allowance = throttle(size)
+                    size = min(size, allowance)
+                try:
+                    n = os.sendfile(out_fd, in_fd, offset + sent, size)
+                except BlockingIOError:
+                    _wait_writable(sock)
+                    continue
+                if n == 0:
+                    break
+                sent += n
+                if throttle:
+                    allowance -= n
+                if on_chunk:
+                    on_chunk(n)
+            return sent
+        except (OSError, AttributeError, io.UnsupportedOperation) as e:
+            # Only fall back if nothing went out yet; a mid-stream failure is a real error
+            if sent or isinstance(e, (BrokenPipeError, ConnectionError, socket.timeout)):
+                raise
+
+    buffer = bytearray(min(STREAM_CHUNK_SIZE, max(count, 1)))
+    view = memoryview(buffer)
+    f.seek(offset)
+    while sent < count:
+        size = min(len(buffer), count - sent)
+        if throttle:
+            size = throttle(size)
+        n = f.readinto(view[:size])
+        if not n:
+            break
+        sock.sendall(view[:n])
+        sent += n
+        if on_chunk:
+            on_chunk(n)
+    return sent
+
+
+# Upper bound on ranges honoured in one request; anything beyond is served as a full 200
+MAX_RANGES = 32
+_DIGITS = re.compile(r"[0-9]+")
+
+
+def parse_range_header(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """Parse a `Range: bytes=...` header into inclusive (start, end) pairs.
+
+    Returns None when the header should be ignored (not a byte range, malformed or
+    too many ranges) and an empty list when none of the ranges is satisfiable.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+
+    specs = [s.strip() for s in spec.split(",") if s.strip()]
+    if not specs or len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for item in specs:
+        first, dash, last = item.partition("-")
+        if not dash:
+            return None
+        first, last = first.strip(), last.strip()
+        # str.isdigit() would also accept digits such as "²" that int() rejects
+        if first and not _DIGITS.fullmatch(first) or last and not _DIGITS.fullmatch(last):
+            return None
+
+        if not first:
+            # Suffix range: the last N bytes; nothing of an empty file is satisfiable
+            if not last:
+                return None
+            length = int(last)
+            if length == 0 or size == 0:
+                continue
+            ranges.append((max(size - length, 0), size - 1))
+        else:
+            start = int(first)
+            if last and int(last) < start:
+                return None
+            if start >= size:
+                continue
+            end = min(int(last), size - 1) if last else size - 1
+            ranges.append((start, end))
+
+    return ranges
+
+
+def build_multipart_ranges(ranges: List[Tuple[int, int]], size: int, content_type: str) -> Tuple[str, List[bytes], bytes, int]:
+    """Prepare a multipart/byteranges body for `ranges`.
+
+    Returns (boundary, per-part header blocks, closing delimiter, total body length)
+    so the caller can send an exact Content-Length before streaming the parts.
+    """
+    boundary = uuid.uuid4().hex
+    part_headers = [
+        (f"\r\n--{boundary}\r\n"
+         f"Content-Type: {content_type}\r\n"
+         f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n").encode("latin-1")
+        for start, end in ranges
+    ]
+    closing = f"\r\n--{boundary}--\r\n".encode("latin-1")
+    total = sum(len(h) for h in part_headers) + len(closing)
+    total += sum(end - start + 1 for start, end in ranges)
+    return boundary, part_headers, closing, total
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip; an explicit gzip entry overrides `*`"""
+    qualities = {}
+    for coding in accept_encoding.split(","):
+        name, *params = coding.split(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[name] = q
+    q = qualities.get("gzip", qualities.get("*", 0.0))
+    return q > 0
+
+
+def hash_file(path: str) -> str:
+    """SHA-256 hex digest of a file, read in fixed-size chunks"""
+    digest = hashlib.sha256()
+    buffer = bytearray(STREAM_CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(path, "rb") as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.hexdigest()
+
+
+class ContentHashCache:
+    """SHA-256 digests of files, cached until their mtime or size changes"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._path_locks = {}
+
+    def get(self, path: str, stat: os.stat_result = None) -> str:
+        """Return the digest of `path`, hashing it only if it changed since last time"""
+        stat = stat or os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry[0] == key:
+                return entry[1]
+            path_lock = self._path_locks.setdefault(path, threading.Lock())
+
+        # One thread hashes a given file; concurrent requests wait for its result
+        with path_lock:
+            with self._lock:
+                entry = self._entries.get(path)
+                if entry and entry[0] == key:
+                    return entry[1]
+            digest = hash_file(path)
+            with self._lock:
+                self._entries[path] = (key, digest)
+            return digest
+
+    def seed(self, path: str, digest: str, stat: os.stat_result = None):
+        """Record a digest computed elsewhere (e.g. while downloading the file)"""
+        stat = stat or os.stat(path)
+        with self._lock:
+            self._entries[path] = ((stat.st_mtime_ns, stat.st_size), digest)
+
+    def prime(self, path: Optional[str]):
+        """Hash `path` in the background so the first request doesn't wait for it"""
+        if path and os.path.isfile(path):
+            threading.Thread(target=self.get, args=(path,), daemon=True).start()
+
+
+CONTENT_HASHES = ContentHashCache()
+
+
+class Histogram:
+    """Fixed-bucket histogram in the Prometheus cumulative-bucket model"""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str = "") -> List[str]:
+        prefix = f"{labels}," if labels else ""
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum:.6f}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+class ServerMetrics:
+    """Counters and histograms for the build server, exported at /metrics.
+
+    Updates are plain integer/float arithmetic under one short-held lock, so the
+    per-chunk byte counter stays cheap next to the 1 MiB sends it accounts for.
+    """
+
+    LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+    THROUGHPUT_BUCKETS = tuple(float(mb * 1024 * 1024) for mb in (0.25, 0.5, 1, 2, 5, 10, 25, 50, 100, 250))
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.bytes_served = 0
+        self.requests = {}
+        self.latency = {}
+        self.download_duration = Histogram(self.LATENCY_BUCKETS)
+        self.download_throughput = Histogram(self.THROUGHPUT_BUCKETS)
+        self.downloads_completed = 0
+        self.downloads_aborted = 0
+        self.connections_rejected = 0
+
+    def add_bytes(self, n: int):
+        with self._lock:
+            self.bytes_served += n
+
+    def observe_request(self, route: str, code: int, seconds: float):
+        with self._lock:
+            key = (route, code)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            histogram = self.latency.get(route)
+            if histogram is None:
+                histogram = self.latency[route] = Histogram(self.LATENCY_BUCKETS)
+            histogram.observe(seconds)
+
+    def download_finished(self, size: int, seconds: float):
+        with self._lock:
+            self.downloads_completed += 1
+            self.download_duration.observe(seconds)
+            if seconds > 0:
+                self.download_throughput.observe(size / seconds)
+
+    def download_aborted(self):
+        with self._lock:
+            self.downloads_aborted += 1
+
+    def connection_rejected(self):
+        with self._lock:
+            self.connections_rejected += 1
+
+    def render(self, active_connections: int) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            lines = [
+                "# HELP ethsign_bytes_served_total Bytes of IPA data sent to clients.",
+                "# TYPE ethsign_bytes_served_total counter",
+                f"ethsign_bytes_served_total {self.bytes_served}",
+                "# HELP ethsign_active_connections Open client connections.",
+                "# TYPE ethsign_active_connections gauge",
+                f"ethsign_active_connections {active_connections}",
+                "# HELP ethsign_connections_rejected_total Connections refused at the connection limit.",
+                "# TYPE ethsign_connections_rejected_total counter",
+                f"ethsign_connections_rejected_total {self.connections_rejected}",
+                "# HELP ethsign_http_requests_total HTTP requests by route and status code.",
+                "# TYPE ethsign_http_requests_total counter",
+            ]
+            for (route, code), count in sorted(self.requests.items()):
+                lines.append(f'ethsign_http_requests_total{{route="{route}",code="{code}"}} {count}')
+            lines += [
+                "# HELP ethsign_http_request_duration_seconds Time to serve a request, by route.",
+                "# TYPE ethsign_http_request_duration_seconds histogram",
+            ]
+            for route, histogram in sorted(self.latency.items()):
+                lines += histogram.render("ethsign_http_request_duration_seconds", f'route="{route}"')
+            lines += [
+                "# HELP ethsign_downloads_completed_total IPA transfers that sent every byte.",
+                "# TYPE ethsign_downloads_completed_total counter",
+                f"ethsign_downloads_completed_total {self.downloads_completed}",
+                "# HELP ethsign_downloads_aborted_total IPA transfers cut short by the client or a timeout.",
+                "# TYPE ethsign_downloads_aborted_total counter",
+                f"ethsign_downloads_aborted_total {self.downloads_aborted}",
+                "# HELP ethsign_download_duration_seconds Duration of completed IPA transfers.",
+                "# TYPE ethsign_download_duration_seconds histogram",
+            ]
+            lines += self.download_duration.render("ethsign_download_duration_seconds")
+            lines += [
+                "# HELP ethsign_download_throughput_bytes_per_second Throughput of completed IPA transfers.",
+                "# TYPE ethsign_download_throughput_bytes_per_second histogram",
+            ]
+            lines += self.download_throughput.render("ethsign_download_throughput_bytes_per_second")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = ServerMetrics()
+
+
+class BandwidthScheduler:
+    """Global token bucket that shares a bandwidth cap fairly between downloads.
+
+    Senders ask for at most one `quantum` at a time and are served strictly in
+    arrival order, so every backlogged client gets an equal slice per round while
+    clients limited by their own link don't hold back the others.
+    """
+
+    def __init__(self, rate: float, quantum: int = 64 * 1024):
+        self.rate = float(rate)
+        self.quantum = quantum
+        self.burst = max(self.rate / 4, quantum)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, size: int) -> int:
+        """Block until up to `size` bytes may be sent; returns the granted amount"""
+        size = max(1, min(size, self.quantum))
+        ticket = object()
+        with self._cond:
+            self._queue.append(ticket)
+            try:
+                while True:
+                    if self._queue[0] is ticket:
+                        self._refill()
+                        if self._tokens >= size:
+                            self._tokens -= size
+                            return size
+                        self._cond.wait((size - self._tokens) / self.rate)
+                    else:
+                        self._cond.wait()
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against `etag`"""
+    if header.strip() == "*":
+        return True
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def render_landing_page(ipa_exists: bool, ipa_name: str, ipa_size: str, version: str = "N/A", bundle_id: str = "N/A") -> str:
+    """Render the download landing page"""
+    return f"""<!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
@@ -479,35 +3136,673 @@ class IPAHandler(http.server.SimpleHTTPRequestHandler):
             <span>{"Build Ready" if ipa_exists else "No Build"}</span>
         </div>
         <div class="info">
-            <div class="row"><span class="label">File</span><span class="value">{ipa_name}</span></div>
+            <div class="row"><span class="label">File</span><span class="value">{html.escape(ipa_name)}</span></div>
             <div class="row"><span class="label">Size</span><span class="value">{ipa_size}</span></div>
+            <div class="row"><span class="label">Version</span><span class="value">{html.escape(version)}</span></div>
+            <div class="row"><span class="label">Bundle ID</span><span class="value">{html.escape(bundle_id)}</span></div>
             <div class="row"><span class="label">Status</span><span class="value">{"✅ Ready" if ipa_exists else "⏳ Waiting"}</span></div>
         </div>
         <a href="/download" class="btn {"" if ipa_exists else "disabled"}">⬇️ Download IPA</a>
     </div>
 </body>
 </html>"""
+
+
+class RenderedBody:
+    """A response body rendered once, with its gzip variant and ETags"""
+
+    def __init__(self, body: bytes, content_type: str):
+        self.body = body
+        self.content_type = content_type
+        self.gzip_body = gzip.compress(body, compresslevel=9, mtime=0)
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gzip"'
+
+
+class ArtifactState:
+    """Metadata of the served IPA plus its pre-rendered landing page and status"""
+
+    def __init__(self, path: Optional[str], stat: Optional[os.stat_result]):
+        self.path = path
+        self.stat = stat
+        self.exists = stat is not None
+        self.name = os.path.basename(path) if path else None
+        self.size = stat.st_size if stat else None
+        self.mtime = int(stat.st_mtime) if stat else None
+        self.metadata = IPA_INDEX.lookup(path, stat) if stat else {}
+        self.fingerprint = IPA_INDEX.fingerprint(path) if self.metadata else None
+        self.manifest = read_artifact_manifest(path, stat) if stat else {}
+        if self.manifest.get("sha256"):
+            # ETags can use the digest recorded at download time instead of re-reading the file
+            CONTENT_HASHES.seed(path, self.manifest["sha256"], stat)
+        self.rendered_at = datetime.now().isoformat()
+
+        size_text = f"{self.size / 1024 / 1024:.2f} MB" if self.exists else "N/A"
+        version = self.metadata.get("version")
+        version_text = f"{version} ({self.metadata.get('build')})" if version else "N/A"
+        self.page = RenderedBody(
+            render_landing_page(self.exists, self.name or "N/A", size_text,
+                                version_text, self.metadata.get("bundle_id") or "N/A").encode(),
+            "text/html; charset=utf-8",
+        )
+        self.status = RenderedBody(json.dumps(self.status_dict()).encode(), "application/json")
+
+    def status_dict(self) -> dict:
+        return {
+            "status": "ready" if self.path else "no_build",
+            "ipa_available": self.exists,
+            "ipa_name": self.name,
+            "ipa_size": self.size,
+            "ipa_mtime": self.mtime,
+            "fingerprint": self.fingerprint,
+            "sha256": self.manifest.get("sha256"),
+            "remote_sha256": self.manifest.get("remote_sha256"),
+            "verified": self.manifest.get("verified"),
+            "app": self.metadata or None,
+            "timestamp": self.rendered_at
+        }
+
+
+class ArtifactCache:
+    """Serves ArtifactState snapshots, rebuilding them only when the IPA or its manifest changes"""
+
+    def __init__(self):
+        self._state: Optional[ArtifactState] = None
+        self._key = None
+        self._lock = threading.Lock()
+
+    def current(self) -> ArtifactState:
+        path = IPAHandler.ipa_path
+        try:
+            stat = os.stat(path) if path else None
+        except OSError:
+            stat = None
+        key = (path, stat.st_mtime_ns, stat.st_size, stat.st_ino, self._manifest_key(path)) if stat else (path,)
+
+        state = self._state
+        if state is not None and self._key == key:
+            return state
+        with self._lock:
+            if self._state is None or self._key != key:
+                self._state = ArtifactState(path, stat)
+                self._key = key
+            return self._state
+
+    @staticmethod
+    def _manifest_key(path: str):
+        """The manifest can be rewritten without touching the IPA; /status shows its digests"""
+        try:
+            stat = os.stat(f"{path}{MANIFEST_SUFFIX}")
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+ARTIFACTS = ArtifactCache()
+
+
+class CatalogEntry:
+    """One IPA in the catalog, with its AltStore version record"""
+
+    def __init__(self, build_id: str, path: str, stat: os.stat_result):
+        self.id = build_id
+        self.path = path
+        self.name = os.path.basename(path)
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        self.metadata = IPA_INDEX.lookup(path, stat)
+
+    def listing(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "size": self.size,
+            "date": datetime.fromtimestamp(self.mtime, timezone.utc).isoformat(),
+            "download": f"/builds/{urllib.parse.quote(self.id)}",
+            "app": self.metadata or None
+        }
+
+    def version(self, base_url: str) -> dict:
+        version = {
+            "downloadURL": f"{base_url}/builds/{urllib.parse.quote(self.id)}",
+            "size": self.size,
+            "version": self.metadata.get("version") or self.id,
+            "buildVersion": self.metadata.get("build") or str(int(self.mtime)),
+            "date": datetime.fromtimestamp(self.mtime, timezone.utc).isoformat(),
+            "localizedDescription": f"Build {self.name}"
+        }
+        if self.metadata.get("min_ios"):
+            version["minOSVersion"] = self.metadata["min_ios"]
+        return version
+
+
+class ArtifactCatalog:
+    """Index of every IPA in a directory, served as /builds/<id> and an AltStore source.
+
+    The directory is scanned once and then only re-scanned when its mtime changes
+    (files added, removed or renamed) or when `add()` reports an overwritten file.
+    The feed is re-serialised from the cached entries only after such a change.
+    """
+
+    SOURCE = {
+        "name": "EthSign Build Server",
+        "identifier": "com.ethsign.build-server",
+        "subtitle": "Local builds",
+        "description": "Builds served by the EthSign SSH Build Tool",
+        "tintColor": "3c94fc"
+    }
+
+    def __init__(self, directory: str, project_name: str = "Ksign", bundle_identifier: str = "nya.asami.ksign"):
+        self.directory = directory
+        self.project_name = project_name
+        self.bundle_identifier = bundle_identifier
+        self._entries = {}
+        self._dir_key = None
+        self._generation = 0
+        self._feeds = {}
+        self._listing: Optional[RenderedBody] = None
+        self._lock = threading.Lock()
+
+    def refresh(self, force: bool = False) -> bool:
+        """Re-index the directory if it changed; returns True when entries changed"""
+        try:
+            dir_stat = os.stat(self.directory)
+            dir_key = (dir_stat.st_mtime_ns, dir_stat.st_ino)
+        except OSError:
+            dir_key = None
+        if not force and dir_key == self._dir_key:
+            return False
+
+        with self._lock:
+            if not force and dir_key == self._dir_key:
+                return False
+            seen = {}
+            if dir_key is not None:
+                with os.scandir(self.directory) as it:
+                    for item in it:
+                        if item.name.endswith(".ipa") and item.is_file():
+                            seen[item.name[:-4]] = item
+
+            changed = False
+            for build_id in list(self._entries):
+                if build_id not in seen:
+                    del self._entries[build_id]
+                    changed = True
+            for build_id, item in seen.items():
+                stat = item.stat()
+                entry = self._entries.get(build_id)
+                if entry is None or entry.key != (stat.st_mtime_ns, stat.st_size, stat.st_ino):
+                    self._entries[build_id] = CatalogEntry(build_id, item.path, stat)
+                    changed = True
+
+            self._dir_key = dir_key
+            if changed:
+                self._generation += 1
+                self._feeds.clear()
+                self._listing = None
+            return changed
+
+    def add(self, path: str):
+        """Index a file written into the directory (covers in-place overwrites)"""
+        name = os.path.basename(path)
+        if not name.endswith(".ipa") or os.path.abspath(os.path.dirname(path)) != os.path.abspath(self.directory):
+            return
+        with self._lock:
+            self._entries[name[:-4]] = CatalogEntry(name[:-4], os.path.join(self.directory, name), os.stat(path))
+            self._generation += 1
+            self._feeds.clear()
+            self._listing = None
+
+    def entries(self) -> List[CatalogEntry]:
+        """Catalog entries, newest first"""
+        self.refresh()
+        return sorted(list(self._entries.values()), key=lambda e: e.mtime, reverse=True)
+
+    def get(self, build_id: str) -> Optional[CatalogEntry]:
+        return self._entries.get(build_id)
+
+    def listing(self) -> RenderedBody:
+        listing = self._listing
+        if listing is None:
+            body = json.dumps({"builds": [e.listing() for e in self.entries()]}, indent=2)
+            listing = self._listing = RenderedBody(body.encode(), "application/json")
+        return listing
+
+    def feed(self, base_url: str) -> RenderedBody:
+        """The AltStore source (same layout as the repo's repo.json) for `base_url`"""
+        feed = self._feeds.get(base_url)
+        if feed is None:
+            feed = RenderedBody(json.dumps(self._build_feed(base_url), indent=4).encode(), "application/json")
+            # Download URLs depend on the Host a client used, so keep one body per host
+            if len(self._feeds) >= 16:
+                self._feeds.clear()
+            self._feeds[base_url] = feed
+        return feed
+
+    def _build_feed(self, base_url: str) -> dict:
+        # One app per bundle identifier, versions newest first
+        apps = {}
+        for entry in self.entries():
+            bundle_id = entry.metadata.get("bundle_id") or self.bundle_identifier
+            app = apps.get(bundle_id)
+            if app is None:
+                name = entry.metadata.get("name") or self.project_name
+                app = apps[bundle_id] = {
+                    "name": name,
+                    "bundleIdentifier": bundle_id,
+                    "developerName": "EthSign",
+                    "localizedDescription": f"Development builds of {name}",
+                    "subtitle": "Local build server",
+                    "tintColor": self.SOURCE["tintColor"],
+                    "category": "utilities",
+                    "versions": [],
+                    "appPermissions": {}
+                }
+            app["versions"].append(entry.version(base_url))
+
+        for app in apps.values():
+            latest = app["versions"][0]
+            app.update({
+                "version": latest["version"],
+                "versionDate": latest["date"],
+                "size": latest["size"],
+                "downloadURL": latest["downloadURL"]
+            })
+        return {**self.SOURCE, "website": base_url, "apps": list(apps.values())}
+
+
+class IPAHandler(http.server.SimpleHTTPRequestHandler):
+    """HTTP handler for serving IPA files"""
+    
+    ipa_path = None
+    catalog: Optional["ArtifactCatalog"] = None
+
+    # Downloads are throttled by `scheduler` (if set) and limited to `download_slots`
+    # so that page and /status requests always have connections left
+    scheduler: Optional[BandwidthScheduler] = None
+    download_slots: Optional[threading.Semaphore] = None
+
+    # Keep-alive connections; `timeout` bounds the wait for the next request and
+    # `write_timeout` how long a request in progress may stall, both in seconds
+    protocol_version = "HTTP/1.1"
+    timeout = 15
+    write_timeout = 60
+    
+    def handle_one_request(self):
+        self.connection.settimeout(self.timeout)
+        super().handle_one_request()
+    
+    def parse_request(self) -> bool:
+        # The request line has arrived: a slow client now only has to keep data moving
+        self.connection.settimeout(self.write_timeout)
+        return super().parse_request()
+    
+    def do_GET(self):
+        started = time.monotonic()
+        self._status_code = 0
+        path = urllib.parse.urlsplit(self.path).path
+        route = "page"
+        try:
+            if path == "/metrics":
+                route = "metrics"
+                self.serve_metrics()
+            elif IPAHandler.catalog and (path == "/builds" or path.startswith("/builds/")):
+                route = "builds"
+                self.serve_catalog(path)
+            elif IPAHandler.catalog and path in ("/repo.json", "/source.json"):
+                route = "feed"
+                IPAHandler.catalog.refresh()
+                self._send_rendered(IPAHandler.catalog.feed(self._base_url()))
+            elif path.startswith("/delta/"):
+                route = "delta"
+                self.serve_delta(path[len("/delta/"):])
+            elif path == "/download" or path.endswith(".ipa"):
+                route = "download"
+                self.serve_ipa()
+            elif path == "/status":
+                route = "status"
+                self.serve_status()
+            else:
+                self.serve_page()
+        finally:
+            METRICS.observe_request(route, self._status_code, time.monotonic() - started)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def send_response(self, code, message=None):
+        self._status_code = code
+        super().send_response(code, message)
+
+    def _if_range_matches(self, etag: str, last_modified: str) -> bool:
+        """Check an If-Range validator; a mismatch means the full file must be sent"""
+        if_range = self.headers.get("If-Range")
+        if not if_range:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith("W/"):
+            # Weak validators never satisfy If-Range
+            return False
+        if if_range.startswith('"'):
+            return if_range == etag
+        return if_range == last_modified
+
+    def _is_not_modified(self, etag: str, mtime: float = None) -> bool:
+        """Evaluate If-None-Match / If-Modified-Since for a GET or HEAD"""
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match:
+            return etag_matches(if_none_match, etag)
+
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since and mtime is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError, IndexError, OverflowError):
+                return False
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+            return int(mtime) <= since.timestamp()
+        return False
+
+    def _send_not_modified(self, etag: str, last_modified: str = None, cache_control: str = None):
+        self.send_response(304)
+        self.send_header("ETag", etag)
+        if last_modified:
+            self.send_header("Last-Modified", last_modified)
+        if cache_control:
+            self.send_header("Cache-Control", cache_control)
+        self.end_headers()
+
+    def _accepts_gzip(self) -> bool:
+        return accepts_gzip(self.headers.get("Accept-Encoding", ""))
+
+    def _send_rendered(self, rendered: "RenderedBody", cache_control: str = "no-cache"):
+        """Send a pre-rendered body (gzipped when the client accepts it), honouring If-None-Match"""
+        use_gzip = self._accepts_gzip()
+        body = rendered.gzip_body if use_gzip else rendered.body
+        etag = rendered.gzip_etag if use_gzip else rendered.etag
+
+        if self._is_not_modified(etag):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", cache_control)
+            self.send_header("Vary", "Accept-Encoding")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", rendered.content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Vary", "Accept-Encoding")
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", cache_control)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _base_url(self) -> str:
+        host = self.headers.get("Host") or f"{socket.gethostname()}:{self.server.server_address[1]}"
+        return f"http://{host}"
+
+    def serve_catalog(self, path: str):
+        catalog = IPAHandler.catalog
+        catalog.refresh()
+        build_id = urllib.parse.unquote(path[len("/builds"):].strip("/"))
+        if not build_id:
+            self._send_rendered(catalog.listing())
+            return
+        entry = catalog.get(build_id)
+        if not entry:
+            self.send_error(404, "Build not found")
+            return
+        self.serve_file(entry.path)
+
+    def serve_ipa(self):
+        self.serve_file(IPAHandler.ipa_path)
+
+    def serve_delta(self, base_fingerprint: str):
+        if not re.fullmatch(r"[0-9a-f]{64}", base_fingerprint) or not IPAHandler.ipa_path:
+            self.send_error(404, "Unknown base build")
+            return
+        try:
+            delta_path = DELTAS.delta_for(base_fingerprint, IPAHandler.ipa_path)
+        except (OSError, zipfile.BadZipFile, ValueError) as e:
+            self.send_error(500, f"Delta failed: {e}")
+            return
+        if not delta_path:
+            self.send_error(404, "Base build not available")
+            return
+        self.serve_file(delta_path)
+
+    def serve_file(self, file_path: Optional[str]):
+        if not file_path or not os.path.exists(file_path):
+            self.send_error(404, "IPA not found")
+            return
+
+        slots = IPAHandler.download_slots
+        if slots and not slots.acquire(blocking=False):
+            self.send_response(503)
+            self.send_header("Retry-After", "5")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        try:
+            self._serve_file(file_path)
+        finally:
+            if slots:
+                slots.release()
+
+    def _serve_file(self, file_path: str):
+        with open(file_path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            file_size = stat.st_size
+            file_name = os.path.basename(file_path)
+            content_type = "application/octet-stream"
+            last_modified = self.date_time_string(stat.st_mtime)
+            etag = f'"{CONTENT_HASHES.get(file_path, stat)}"'
+
+            if self._is_not_modified(etag, stat.st_mtime):
+                self._send_not_modified(etag, last_modified)
+                return
+
+            ranges = None
+            range_header = self.headers.get("Range")
+            if range_header and self._if_range_matches(etag, last_modified):
+                ranges = parse_range_header(range_header, file_size)
+                if ranges == []:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{file_size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+            if not ranges:
+                self.send_response(200)
+                self.send_header("Content-Length", str(file_size))
+                segments = [(None, 0, file_size)]
+            elif len(ranges) == 1:
+                start, end = ranges[0]
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{file_size}")
+                self.send_header("Content-Length", str(end - start + 1))
+                segments = [(None, start, end - start + 1)]
+            else:
+                boundary, part_headers, closing, total = build_multipart_ranges(ranges, file_size, content_type)
+                content_type = f"multipart/byteranges; boundary={boundary}"
+                self.send_response(206)
+                self.send_header("Content-Length", str(total))
+                segments = [(h, start, end - start + 1) for h, (start, end) in zip(part_headers, ranges)]
+                segments.append((closing, 0, 0))
+
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Disposition", f'attachment; filename="{file_name}"')
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Last-Modified", last_modified)
+            self.send_header("ETag", etag)
+            self.end_headers()
+
+            if self.command == "HEAD":
+                return
+
+            self.wfile.flush()
+            expected = sum(count for _, _, count in segments)
+            sent = 0
+
+            def on_chunk(n: int):
+                nonlocal sent
+                sent += n
+                METRICS.add_bytes(n)
+
+            throttle = IPAHandler.scheduler.acquire if IPAHandler.scheduler else None
+            started = time.monotonic()
+            try:
+                for preamble, offset, count in segments:
+                    if preamble:
+                        self.connection.sendall(preamble)
+                    if send_file(self.connection, f, offset, count, on_chunk, throttle) < count:
+                        break
+            except (ConnectionError, socket.timeout):
+                pass
+            duration = time.monotonic() - started
+
+        if sent < expected:
+            METRICS.download_aborted()
+            print(f"{Colors.YELLOW}⚠️  Download by {self.client_address[0]} ended early ({sent}/{expected} bytes){Colors.ENDC}")
+            self.close_connection = True
+            return
+
+        METRICS.download_finished(sent, duration)
+
+        if ranges:
+            return
+        print(f"{Colors.GREEN}📤 {file_name} downloaded by {self.client_address[0]}{Colors.ENDC}")
+
+    def serve_metrics(self):
+        active = getattr(self.server, "active_connections", 1)
+        body = METRICS.render(active).encode()
         self.send_response(200)
-        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
         self.end_headers()
-        self.wfile.write(html.encode())
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def serve_status(self):
+        self._send_rendered(ARTIFACTS.current().status)
+    
+    def serve_page(self):
+        self._send_rendered(ARTIFACTS.current().page)
     
     def log_message(self, *args):
         pass
 
 
+class ThreadedHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """Thread-per-connection HTTP server with a cap on concurrent connections"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+    block_on_close = False
+
+    def __init__(self, server_address, handler_class, max_connections: int = 64):
+        self.max_connections = max_connections
+        self.active_connections = 0
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._count_lock = threading.Lock()
+        super().__init__(server_address, handler_class)
+
+    def process_request(self, request, client_address):
+        # Refuse instead of queueing so a full server answers immediately
+        if not self._slots.acquire(blocking=False):
+            self._reject(request)
+            return
+        with self._count_lock:
+            self.active_connections += 1
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            self._release_slot()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._release_slot()
+
+    def _release_slot(self):
+        with self._count_lock:
+            self.active_connections -= 1
+        self._slots.release()
+
+    def handle_error(self, request, client_address):
+        # Clients dropping mid-transfer are routine; keep them out of the console
+        if isinstance(sys.exc_info()[1], (ConnectionError, socket.timeout)):
+            return
+        super().handle_error(request, client_address)
+
+    def _reject(self, request):
+        METRICS.connection_rejected()
+        try:
+            request.sendall(
+                b"HTTP/1.1 503 Service Unavailable\r\n"
+                b"Retry-After: 5\r\n"
+                b"Content-Length: 0\r\n"
+                b"Connection: close\r\n\r\n"
+            )
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+
 class BuildServer:
     """HTTP server for serving IPA files"""
     
-    def __init__(self, port: int):
+    def __init__(self, port: int, max_connections: int = 64, idle_timeout: float = 15, catalog: "ArtifactCatalog" = None,
+                 bandwidth_limit_mbps: float = 0, priority_reserve: int = 4, write_timeout: float = 60):
         self.port = port
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.write_timeout = write_timeout
+        self.catalog = catalog
+        self.bandwidth_limit_mbps = bandwidth_limit_mbps
+        self.priority_reserve = priority_reserve
         self.server = None
         self.thread = None
         self.running = False
+
+    @classmethod
+    def from_config(cls, config: ConfigManager, catalog: "ArtifactCatalog" = None) -> "BuildServer":
+        """Create a server using the [server] section of the configuration"""
+        return cls(
+            config.get("server", "port"),
+            max_connections=config.get("server", "max_connections") or 64,
+            idle_timeout=config.get("server", "idle_timeout") or 15,
+            catalog=catalog,
+            bandwidth_limit_mbps=config.get("server", "bandwidth_limit_mbps") or 0,
+            priority_reserve=config.get("server", "priority_reserve") or 0,
+            write_timeout=config.get("server", "write_timeout") or 60,
+        )
     
-    def start(self, ipa_path: str = None):
+    def set_ipa(self, ipa_path: Optional[str]):
+        """Switch the served IPA; ETag hashing and delta building start in the background"""
+        previous_path = IPAHandler.ipa_path
         IPAHandler.ipa_path = ipa_path
-        self.server = socketserver.TCPServer(("", self.port), IPAHandler)
+        CONTENT_HASHES.prime(ipa_path)
+        DELTAS.prepare(ipa_path, previous_path)
+
+    def start(self, ipa_path: str = None):
+        self.set_ipa(ipa_path)
+        IPAHandler.timeout = self.idle_timeout
+        IPAHandler.write_timeout = self.write_timeout
+        IPAHandler.catalog = self.catalog
+        IPAHandler.scheduler = BandwidthScheduler(self.bandwidth_limit_mbps * 1_000_000 / 8) if self.bandwidth_limit_mbps > 0 else None
+        IPAHandler.download_slots = threading.Semaphore(max(1, self.max_connections - self.priority_reserve))
+        self.server = ThreadedHTTPServer(("", self.port), IPAHandler, self.max_connections)
         self.thread = threading.Thread(target=self.server.serve_forever)
         self.thread.daemon = True
         self.thread.start()
@@ -516,30 +3811,608 @@ class BuildServer:
     def stop(self):
         if self.server:
             self.server.shutdown()
+            self.server.server_close()
             self.running = False
 
 
+# ═══════════════════════════════════════════════════════════════════════════════
+# BUILD QUEUE
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Branch names and repository URLs end up in remote shell commands
+_BRANCH_PATTERN = re.compile(r"[A-Za-z0-9._][A-Za-z0-9._/-]*")
+_REPO_URL_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9@:/._~+-]*")
+
+
+class BuildJob:
+    """One queued build: what to build, where it ran and what came out of it"""
+    
+    STATES = ("queued", "running", "succeeded", "failed", "cancelled")
+    
+    def __init__(self, branch: str, repo_url: str = None, job_id: str = None):
+        self.id = job_id or uuid.uuid4().hex[:12]
+        self.branch = branch
+        self.repo_url = repo_url
+        self.state = "queued"
+        self.created = datetime.now(timezone.utc).isoformat()
+        self.started: Optional[str] = None
+        self.finished: Optional[str] = None
+        self.host: Optional[str] = None
+        self.log_path: Optional[str] = None
+        self.artifact: Optional[str] = None
+        self.errors: List[str] = []
+    
+    @property
+    def done(self) -> bool:
+        return self.state in ("succeeded", "failed", "cancelled")
+    
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+    
+    @classmethod
+    def from_dict(cls, data: dict) -> "BuildJob":
+        job = cls(data["branch"], data.get("repo_url"), data["id"])
+        for key, value in data.items():
+            if hasattr(job, key):
+                setattr(job, key, value)
+        return job
+
+
+class JobQueue:
+    """Build jobs in submission order, saved to a JSON file after every change.
+
+    Jobs that were running when the daemon stopped are queued again on load.
+    Two jobs for the same repository and branch never run at once, because
+    they would share the branch's DerivedData cache on the build host.
+    """
+    
+    def __init__(self, path: str, keep: int = 200):
+        self.path = path
+        self.keep = keep
+        self.jobs: "collections.OrderedDict[str, BuildJob]" = collections.OrderedDict()
+        self._changed = threading.Condition()
+        self._load()
+    
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        for record in data.get("jobs", []):
+            job = BuildJob.from_dict(record)
+            if job.state == "running":
+                job.state = "queued"
+            self.jobs[job.id] = job
+    
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump({"jobs": [job.to_dict() for job in self.jobs.values()]}, f, indent=2)
+            os.replace(temp_path, self.path)
+        except OSError:
+            pass
+    
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.done]
+        for job_id in finished[:max(0, len(self.jobs) - self.keep)]:
+            del self.jobs[job_id]
+    
+    def submit(self, job: BuildJob) -> BuildJob:
+        with self._changed:
+            self.jobs[job.id] = job
+            self._prune()
+            self._save()
+            self._changed.notify_all()
+        return job
+    
+    def get(self, job_id: str) -> Optional[BuildJob]:
+        return self.jobs.get(job_id)
+    
+    def list(self) -> List[BuildJob]:
+        with self._changed:
+            return list(reversed(self.jobs.values()))
+    
+    def claim(self, stop: threading.Event, timeout: float = 1.0) -> Optional[BuildJob]:
+        """Wait for the oldest queued job that can run now and mark it running"""
+        with self._changed:
+            while not stop.is_set():
+                busy = {(job.repo_url, job.branch) for job in self.jobs.values() if job.state == "running"}
+                for job in self.jobs.values():
+                    if job.state == "queued" and (job.repo_url, job.branch) not in busy:
+                        job.state = "running"
+                        job.started = datetime.now(timezone.utc).isoformat()
+                        self._save()
+                        return job
+                self._changed.wait(timeout)
+        return None
+    
+    def wake(self):
+        """Wake the workers waiting in `claim`, so they notice a stop request"""
+        with self._changed:
+            self._changed.notify_all()
+    
+    def cancel_queued(self, job: BuildJob) -> bool:
+        """Cancel `job` if no worker has claimed it yet"""
+        with self._changed:
+            if job.state != "queued":
+                return False
+            self.update(job, state="cancelled")
+            return True
+    
+    def update(self, job: BuildJob, **changes):
+        """Change a job's fields; entering a final state also stamps `finished`"""
+        with self._changed:
+            for key, value in changes.items():
+                setattr(job, key, value)
+            if job.done and not job.finished:
+                job.finished = datetime.now(timezone.utc).isoformat()
+            self._save()
+            self._changed.notify_all()
+
+
+class BuildDaemon:
+    """Headless build service: a persistent job queue, worker slots and a JSON API.
+
+    Each worker slot has its own workspace on the build host (target_dir for the
+    first slot, target_dir-2, target_dir-3, ... for the others), so concurrent
+    builds never share a checkout. With farm.hosts set, every job goes to the
+    least-loaded host. Results are written as <project>-<job id>.ipa and served
+    by the BuildServer, both under /builds/<project>-<job id> and as /download.
+    """
+    
+    def __init__(self, config: ConfigManager):
+        self.config = config
+        local_dir = config.get("output", "local_dir")
+        IPA_INDEX.open(os.path.join(local_dir, ".ipa_index.json"))
+        DELTAS.open(os.path.join(local_dir, ".deltas"))
+        HISTORY.open(os.path.join(local_dir, "history.sqlite3"))
+        self.catalog = ArtifactCatalog(local_dir, config.get("build", "project_name"))
+        self.server = BuildServer.from_config(config, self.catalog)
+        self.queue = JobQueue(os.path.join(local_dir, ".jobs.json"), int(config.get("daemon", "keep_jobs") or 200))
+        # Running jobs' clients and cancel requests; the lock also orders a cancel
+        # against the end of the job it targets
+        self.clients = {}
+        self._cancelling = set()
+        self._lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.workers: List[threading.Thread] = []
+        self.api: Optional[ThreadedHTTPServer] = None
+    
+    def start(self):
+        self.server.start(self._latest_artifact())
+        for slot in range(max(1, int(self.config.get("daemon", "concurrency") or 1))):
+            worker = threading.Thread(target=self._work, args=(slot,), name=f"build-worker-{slot + 1}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+        
+        JobAPIHandler.daemon = self
+        JobAPIHandler.token = self.config.get("daemon", "api_token") or ""
+        address = (self.config.get("daemon", "api_bind") or "127.0.0.1", int(self.config.get("daemon", "api_port")))
+        self.api = ThreadedHTTPServer(address, JobAPIHandler, max_connections=16)
+        threading.Thread(target=self.api.serve_forever, daemon=True).start()
+    
+    def stop(self):
+        """Stop the workers; interrupted jobs are queued again for the next start"""
+        self.stopping.set()
+        self.queue.wake()
+        with self._lock:
+            clients = list(self.clients.values())
+        for client in clients:
+            client.cancel()
+        for worker in self.workers:
+            worker.join()
+        if self.api:
+            self.api.shutdown()
+            self.api.server_close()
+        self.server.stop()
+    
+    def serve_forever(self):
+        self.start()
+        print(f"{Colors.GREEN}✅ Job API on http://{self.api.server_address[0]}:{self.api.server_address[1]}/jobs, "
+              f"builds on http://localhost:{self.config.get('server', 'port')}/builds "
+              f"({len(self.workers)} worker slot{'s' if len(self.workers) != 1 else ''}){Colors.ENDC}")
+        try:
+            while True:
+                time.sleep(3600)
+        finally:
+            print(f"\n{Colors.YELLOW}Stopping build daemon...{Colors.ENDC}")
+            self.stop()
+    
+    def submit(self, branch: str = None, repo_url: str = None) -> BuildJob:
+        branch = branch or self.config.get("build", "branch")
+        if not isinstance(branch, str) or not _BRANCH_PATTERN.fullmatch(branch) or ".." in branch:
+            raise ValueError(f"Invalid branch: {branch!r}")
+        if repo_url and (not isinstance(repo_url, str) or not _REPO_URL_PATTERN.fullmatch(repo_url)):
+            raise ValueError(f"Invalid repository URL: {repo_url!r}")
+        return self.queue.submit(BuildJob(branch, repo_url))
+    
+    def cancel(self, job: BuildJob) -> bool:
+        """Cancel a queued or running job; returns False if it already finished.
+
+        A running job is flagged first, so a cancel that arrives before its client
+        exists, or after the build while the IPA downloads, still takes effect.
+        """
+        if self.queue.cancel_queued(job):
+            return True
+        with self._lock:
+            if job.state != "running":
+                return False
+            self._cancelling.add(job.id)
+            client = self.clients.get(job.id)
+        if client:
+            threading.Thread(target=client.cancel, daemon=True).start()
+        return True
+    
+    def client_for(self, job: BuildJob) -> Optional["SSHBuildClient"]:
+        with self._lock:
+            return self.clients.get(job.id)
+    
+    def log_tail(self, job: BuildJob, count: int = 200) -> List[str]:
+        client = self.client_for(job)
+        if client:
+            return client.last_log.tail(count)
+        if not job.log_path or not os.path.exists(job.log_path):
+            return []
+        lines = collections.deque(maxlen=count)
+        try:
+            with gzip.open(job.log_path, "rt", errors="replace") as f:
+                for line in f:
+                    lines.append(line.rstrip("\n"))
+        except (OSError, EOFError):
+            pass
+        return list(lines)
+    
+    def _latest_artifact(self) -> Optional[str]:
+        for job in self.queue.list():
+            if job.state == "succeeded" and job.artifact and os.path.exists(job.artifact):
+                return job.artifact
+        return None
+    
+    def _work(self, slot: int):
+        while not self.stopping.is_set():
+            job = self.queue.claim(self.stopping)
+            if job:
+                self._run(job, slot)
+    
+    def _run(self, job: BuildJob, slot: int):
+        with self._lock:
+            if job.id in self._cancelling:
+                self._finish(job, "cancelled")
+                return
+        target_dir = self.config.get("build", "target_dir")
+        build = {"branch": job.branch, "target_dir": target_dir if slot == 0 else f"{target_dir}-{slot + 1}"}
+        if job.repo_url:
+            build["repo_url"] = job.repo_url
+        config = self.config.overlay(
+            build=build, output={"ipa_name": f"{self.config.get('build', 'project_name')}-{job.id}.ipa"})
+        
+        farm = HostPool(config) if config.get("farm", "hosts") else None
+        client = farm.acquire(show=False) if farm else SSHBuildClient(config)
+        with self._lock:
+            # A cancel may have arrived while the farm was probed
+            cancelled = job.id in self._cancelling
+            if client and not cancelled:
+                self.clients[job.id] = client
+        if not client or cancelled:
+            if client and farm:
+                farm.release(client)
+            if client and client.client:
+                client.client.close()
+            errors = [] if cancelled else ["No compatible build host available"]
+            with self._lock:
+                self._finish(job, "cancelled" if cancelled else "failed", errors=errors)
+            return
+        
+        print(f"{Colors.CYAN}▶️  Job {job.id}: {job.branch} on {client.config.get('ssh', 'host')} "
+              f"(slot {slot + 1}){Colors.ENDC}")
+        self.queue.update(job, host=client.config.get("ssh", "host"), log_path=client.begin_build_log(job.id))
+        state, ipa_path = "failed", None
+        try:
+            ipa_path = client.build_artifact()
+            state = "succeeded" if ipa_path else "failed"
+        except BuildCancelled:
+            state = "queued" if self.stopping.is_set() else "cancelled"
+        except Exception as e:
+            client.last_errors.append(str(e))
+        finally:
+            client.end_build_log()
+            if farm:
+                farm.release(client)
+            if client.connected:
+                client.disconnect()
+        
+        with self._lock:
+            del self.clients[job.id]
+            # Cancelled after the build finished (e.g. during the download) or while the
+            # daemon was stopping: nothing is published and the job is not queued again
+            if job.id in self._cancelling and state in ("succeeded", "queued"):
+                state = "cancelled"
+            if state != "succeeded":
+                ipa_path = None
+            if state == "cancelled":
+                discard_artifact(client.local_ipa_path())
+            self._finish(job, state, artifact=ipa_path, errors=client.last_errors[:BuildSupervisor.MAX_ERRORS],
+                         started=job.started if state != "queued" else None)
+        if ipa_path:
+            self.catalog.add(ipa_path)
+            self.server.set_ipa(ipa_path)
+        color = Colors.GREEN if state == "succeeded" else Colors.YELLOW if state in ("queued", "cancelled") else Colors.RED
+        print(f"{color}■  Job {job.id}: {state}{Colors.ENDC}")
+    
+    def _finish(self, job: BuildJob, state: str, **changes):
+        """Record the job's final state and drop its cancel request; call with _lock held"""
+        self.queue.update(job, state=state, **changes)
+        self._cancelling.discard(job.id)
+
+
+class JobAPIHandler(http.server.BaseHTTPRequestHandler):
+    """JSON API of the build daemon.
+
+        GET  /jobs                   all jobs, newest first
+        POST /jobs                   submit {"branch": ..., "repo_url": ...}, both optional
+        GET  /jobs/<id>              one job
+        GET  /jobs/<id>/log          the last lines of the job's build output
+        GET  /jobs/<id>/artifacts    the IPA built by the job, with its download URL
+        POST /jobs/<id>/cancel       cancel a queued or running job (DELETE /jobs/<id> works too)
+    """
+    
+    daemon: Optional[BuildDaemon] = None
+    # When set, requests need "Authorization: Bearer <token>"
+    token = ""
+    protocol_version = "HTTP/1.1"
+    timeout = 15
+    
+    def do_GET(self):
+        self._dispatch("GET")
+    
+    def do_POST(self):
+        self._dispatch("POST")
+    
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+    
+    def _dispatch(self, method: str):
+        if JobAPIHandler.token and not hmac.compare_digest(
+                self.headers.get("Authorization", ""), f"Bearer {JobAPIHandler.token}"):
+            self._send_json(401, {"error": "unauthorized"})
+            return
+        parts = urllib.parse.urlsplit(self.path).path.strip("/").split("/")
+        if parts[0] != "jobs" or len(parts) > 3:
+            self._send_json(404, {"error": "not found"})
+            return
+        
+        daemon = JobAPIHandler.daemon
+        if len(parts) == 1:
+            if method == "GET":
+                self._send_json(200, {"jobs": [job.to_dict() for job in daemon.queue.list()]})
+            elif method == "POST":
+                try:
+                    request = self._read_json()
+                    job = daemon.submit(request.get("branch"), request.get("repo_url"))
+                except ValueError as e:
+                    self._send_json(400, {"error": str(e)})
+                    return
+                self._send_json(202, job.to_dict())
+            else:
+                self._send_json(405, {"error": "method not allowed"})
+            return
+        
+        job = daemon.queue.get(parts[1])
+        action = parts[2] if len(parts) == 3 else ""
+        if not job:
+            self._send_json(404, {"error": "no such job"})
+        elif (method, action) in (("POST", "cancel"), ("DELETE", "")):
+            if daemon.cancel(job):
+                self._send_json(202, job.to_dict())
+            else:
+                self._send_json(409, {"error": f"job already {job.state}"})
+        elif method != "GET":
+            self._send_json(405, {"error": "method not allowed"})
+        elif action == "":
+            client = daemon.client_for(job)
+            self._send_json(200, dict(job.to_dict(), progress=client.progress.snapshot() if client else None))
+        elif action == "log":
+            self._send_json(200, {"id": job.id, "state": job.state, "lines": daemon.log_tail(job)})
+        elif action == "artifacts":
+            self._send_json(200, {"id": job.id, "state": job.state, "artifacts": self._artifacts(job)})
+        else:
+            self._send_json(404, {"error": "not found"})
+    
+    def _artifacts(self, job: BuildJob) -> List[dict]:
+        if not job.artifact or not os.path.exists(job.artifact):
+            return []
+        host = (self.headers.get("Host") or "localhost").rsplit(":", 1)[0]
+        build_id = os.path.basename(job.artifact)[:-len(".ipa")]
+        manifest = read_artifact_manifest(job.artifact)
+        return [{
+            "name": os.path.basename(job.artifact),
+            "size": os.path.getsize(job.artifact),
+            "sha256": manifest.get("sha256"),
+            "download": f"http://{host}:{JobAPIHandler.daemon.server.port}/builds/{urllib.parse.quote(build_id)}"
+        }]
+    
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            request = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise ValueError("Request body is not valid JSON")
+        if not isinstance(request, dict):
+            raise ValueError("Request body must be a JSON object")
+        return request
+    
+    def _send_json(self, code: int, data: dict):
+        body = json.dumps(data, indent=2).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, *args):
+        pass
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # MAIN APPLICATION
 # ═══════════════════════════════════════════════════════════════════════════════
 
+class BuildTask:
+    """One build started from the menu, running on its own thread.
+
+    Slot 0 builds in target_dir; a build started while another one runs takes the
+    next free slot, with its own workspace. Each build writes <project>-<id>.ipa.
+    """
+    
+    def __init__(self, number: int, slot: int, config: ConfigManager):
+        self.number = number
+        self.slot = slot
+        self.config = config
+        self.branch = config.get("build", "branch")
+        # Created (or picked from the build farm) on the build thread; never the menu's
+        # connection, which the SSH menu keeps using while the build runs
+        self.client: Optional["SSHBuildClient"] = None
+        self.progress = BuildProgress()
+        self.ipa_path: Optional[str] = None
+        self.error: Optional[str] = None
+        self.log_path: Optional[str] = None
+        self.thread: Optional[threading.Thread] = None
+    
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+    
+    @property
+    def host(self) -> str:
+        return (self.client or self).config.get("ssh", "host")
+    
+    def start(self, on_finished: Callable[["BuildTask"], None]):
+        self.thread = threading.Thread(target=self._run, args=(on_finished,), name=f"build-{self.number}", daemon=True)
+        self.thread.start()
+    
+    def cancel(self):
+        if self.running and self.client:
+            self.client.cancel()
+    
+    def _run(self, on_finished: Callable[["BuildTask"], None]):
+        farm = None
+        try:
+            if self.config.get("farm", "hosts"):
+                self.progress.set_phase("Choosing build host")
+                farm = HostPool(self.config)
+                self.client = farm.acquire()
+                if not self.client:
+                    self.error = "no compatible build host available"
+                    print(f"{Colors.RED}❌ Build #{self.number}: {self.error}{Colors.ENDC}")
+                    return
+            else:
+                self.client = SSHBuildClient(self.config)
+            self.client.progress = self.progress
+            self.log_path = self.client.begin_build_log(f"slot{self.slot + 1}" if self.slot else None)
+            print(f"{Colors.GRAY}Build #{self.number} log: {self.log_path}{Colors.ENDC}")
+            try:
+                self.ipa_path = self.client.build_artifact()
+            finally:
+                self.client.end_build_log()
+        except BuildCancelled:
+            print(f"{Colors.YELLOW}⏹  Build #{self.number} cancelled{Colors.ENDC}")
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+            print(f"{Colors.RED}❌ Build #{self.number} failed: {self.error}{Colors.ENDC}")
+        finally:
+            if farm and self.client:
+                farm.release(self.client)
+            if self.client:
+                self.client.disconnect()
+            if not self.ipa_path and not self.error:
+                self.error = f"stopped during {self.progress.phase.lower()}"
+            self.progress.finish(bool(self.ipa_path))
+            on_finished(self)
+
+
 class Application:
     """Main application class"""
     
+    # Rows of the dashboard's build and activity panels
+    BUILD_ROWS = 3
+    ACTIVITY_ROWS = 4
+    
     def __init__(self):
         self.config = ConfigManager()
         self.ssh_client = SSHBuildClient(self.config)
-        self.server = BuildServer(self.config.get("server", "port"))
+        IPA_INDEX.open(os.path.join(self.config.get("output", "local_dir"), ".ipa_index.json"))
+        DELTAS.open(os.path.join(self.config.get("output", "local_dir"), ".deltas"))
+        HISTORY.open(os.path.join(self.config.get("output", "local_dir"), "history.sqlite3"))
+        self.catalog = ArtifactCatalog(self.config.get("output", "local_dir"), self.config.get("build", "project_name"))
+        self.server = BuildServer.from_config(self.config, self.catalog)
         self.ipa_path: Optional[str] = None
+        self.tasks: List[BuildTask] = []
+        self.dashboard = Dashboard()
+        self.console: Optional[ConsoleRouter] = None
+        self._served = (time.monotonic(), 0, 0.0)
+        # Builds that ended, for the main thread to publish or report
+        self.finished: collections.deque = collections.deque()
     
     def run(self):
         """Main application loop"""
+        if self.dashboard.live:
+            # Background builds and the server print into the dashboard's activity panel
+            self.console = ConsoleRouter(sys.stdout)
+            sys.stdout = self.console
         while True:
+            self.handle_finished()
             self.show_main_menu()
     
-    def show_main_menu(self):
-        """Display the main menu"""
-        print_header()
+    def running_tasks(self) -> List[BuildTask]:
+        return [task for task in self.tasks if task.running]
+    
+    def cancel_builds(self):
+        for task in self.running_tasks():
+            task.cancel()
+    
+    def _task_line(self, task: BuildTask) -> str:
+        progress = task.progress
+        minutes, seconds = divmod(int(progress.elapsed), 60)
+        if task.running:
+            icon, color = "●", Colors.CYAN
+            detail = progress.phase
+            running_steps = [name for name, state in progress.steps.items() if state == "running"]
+            if progress.phase == "Building" and running_steps:
+                done = sum(state in ("done", "skipped") for state in progress.steps.values())
+                detail = f"{', '.join(running_steps)} ({done} steps done)"
+            elif progress.phase == "Downloading" and progress.transferred:
+                total = f"/{progress.transfer_total / 1024 / 1024:.1f}" if progress.transfer_total else ""
+                detail = (f"Downloading {progress.transferred / 1024 / 1024:.1f}{total} MB "
+                          f"at {progress.rate / 1024 / 1024:.1f} MB/s")
+        elif progress.succeeded:
+            icon, color, detail = "✔", Colors.GREEN, os.path.basename(task.ipa_path)
+        else:
+            icon, color, detail = "✖", Colors.RED, progress.phase
+        return (f"  {color}{icon} #{task.number}{Colors.ENDC} {task.branch} @ {task.host}  "
+                f"{color}{detail}{Colors.ENDC}  {Colors.GRAY}{minutes:02d}:{seconds:02d}{Colors.ENDC}")
+    
+    def _server_activity(self) -> str:
+        if not self.server.running:
+            return f"  {Colors.GRAY}Server stopped{Colors.ENDC}"
+        now = time.monotonic()
+        sampled_at, sampled_bytes, rate = self._served
+        served = METRICS.bytes_served
+        if now - sampled_at >= 1:
+            rate = (served - sampled_bytes) / (now - sampled_at)
+            self._served = (now, served, rate)
+        connections = self.server.server.active_connections if self.server.server else 0
+        return (f"  Server: {connections} connection{'s' if connections != 1 else ''} · "
+                f"{METRICS.downloads_completed} downloads · {served / 1024 / 1024:.1f} MB sent · "
+                f"{Colors.GREEN}{rate / 1024 / 1024:.1f} MB/s{Colors.ENDC}")
+    
+    def render_main_menu(self) -> List[str]:
+        width = shutil.get_terminal_size().columns - 1
         
         # Status info
         ssh_status = f"{Colors.GREEN}● Connected{Colors.ENDC}" if self.ssh_client.connected else f"{Colors.RED}● Disconnected{Colors.ENDC}"
@@ -550,7 +4423,20 @@ class Application:
         mac_addr = self.config.get('ssh', 'host')
         mac_display = f"{Colors.GREEN}{mac_addr}{Colors.ENDC}" if mac_addr else f"{Colors.YELLOW}Not Set{Colors.ENDC}"
         
-        print(f"""
+        tasks = sorted(self.tasks, key=lambda task: (not task.running, -task.number))[:self.BUILD_ROWS]
+        builds = [fit_line(self._task_line(task), width) for task in tasks]
+        if not builds:
+            builds.append(f"  {Colors.GRAY}No builds yet. Start one with [1]; it runs in the background.{Colors.ENDC}")
+        builds += [""] * (self.BUILD_ROWS - len(builds))
+        recent = self.console.recent(self.ACTIVITY_ROWS) if self.console else []
+        activity = [fit_line(f"  {Colors.GRAY}{line}{Colors.ENDC}", width) for line in recent]
+        activity += [""] * (self.ACTIVITY_ROWS - len(activity))
+        
+        panels = "\n".join(
+            [f"  {Colors.GRAY}── BUILDS ──{Colors.ENDC}"] + builds +
+            [fit_line(self._server_activity(), width), f"  {Colors.GRAY}── ACTIVITY ──{Colors.ENDC}"] + activity)
+        
+        return (HEADER + f"""
   {Colors.GRAY}┌─ STATUS ─────────────────────────────────────────────────────┐{Colors.ENDC}
   {Colors.GRAY}│{Colors.ENDC}  Mac Address: {mac_display:<43} {Colors.GRAY}│{Colors.ENDC}
   {Colors.GRAY}│{Colors.ENDC}  SSH: {ssh_status:<35} {Colors.GRAY}│{Colors.ENDC}
@@ -558,6 +4444,8 @@ class Application:
   {Colors.GRAY}│{Colors.ENDC}  IPA: {ipa_status:<35} {Colors.GRAY}│{Colors.ENDC}
   {Colors.GRAY}└───────────────────────────────────────────────────────────────┘{Colors.ENDC}
 
+{panels}
+
   {Colors.WHITE}{Colors.BOLD}MAIN MENU{Colors.ENDC}
   
   {Colors.GREEN}[Q]{Colors.ENDC} ⚡ Quick Setup (Enter Mac Address)
@@ -571,11 +4459,17 @@ class Application:
   {Colors.CYAN}[7]{Colors.ENDC} 🔍 Find Mac on Network
   {Colors.CYAN}[8]{Colors.ENDC} 📖 Mac Setup Guide
   {Colors.CYAN}[9]{Colors.ENDC} ❓ Help
+  {Colors.CYAN}[C]{Colors.ENDC} ⏹  Cancel Running Builds
   
-  {Colors.RED}[0]{Colors.ENDC} Exit
-        """)
-        
-        choice = input(f"\n  {Colors.YELLOW}Enter choice:{Colors.ENDC} ").strip().lower()
+  {Colors.RED}[0]{Colors.ENDC} Exit""").split("\n")
+    
+    def show_main_menu(self):
+        """Display the main menu as a live dashboard"""
+        choice = self.dashboard.read_choice(
+            self.render_main_menu, f"  {Colors.YELLOW}Enter choice:{Colors.ENDC} ", interrupt=lambda: bool(self.finished))
+        if choice is None:
+            return
+        choice = choice.lower()
         
         if choice == "q":
             self.quick_setup()
@@ -597,6 +4491,8 @@ class Application:
             self.show_mac_setup_guide()
         elif choice == "9":
             self.show_help()
+        elif choice == "c":
+            self.cancel_builds()
         elif choice == "0":
             self.exit_app()
     
@@ -647,7 +4543,7 @@ class Application:
         input(f"\n  {Colors.GRAY}Press Enter to continue...{Colors.ENDC}")
     
     def start_build_process(self):
-        """Start the full build process"""
+        """Start the full build process on a background thread"""
         print_header()
         print(f"\n  {Colors.WHITE}{Colors.BOLD}🚀 STARTING FULL BUILD PROCESS{Colors.ENDC}\n")
         
@@ -657,59 +4553,81 @@ class Application:
             input(f"\n  {Colors.GRAY}Press Enter to continue...{Colors.ENDC}")
             return
         
+        # Builds of one branch would share its DerivedData cache
+        running = self.running_tasks()
+        branch = self.config.get("build", "branch")
+        for task in running:
+            if task.branch == branch:
+                print(f"  {Colors.YELLOW}Build #{task.number} of {branch} is still running.{Colors.ENDC}")
+                input(f"\n  {Colors.GRAY}Press Enter to continue...{Colors.ENDC}")
+                return
+        
         print(f"  {Colors.GRAY}This will:{Colors.ENDC}")
-        print(f"  1. Connect to {self.config.get('ssh', 'host')} via SSH")
+        if self.config.get("farm", "hosts"):
+            print(f"  1. Pick the least-loaded of {len(self.config.get('farm', 'hosts'))} build hosts")
+        else:
+            print(f"  1. Connect to {self.config.get('ssh', 'host')} via SSH")
         print(f"  2. Clone {self.config.get('build', 'repo_url')}")
         print(f"  3. Build with Xcode")
         print(f"  4. Download the IPA")
         print(f"  5. Start web server on port {self.config.get('server', 'port')}")
+        print(f"  {Colors.GRAY}The build runs in the background; the menu stays usable.{Colors.ENDC}")
         
         confirm = input(f"\n  {Colors.YELLOW}Proceed? (y/n):{Colors.ENDC} ").strip().lower()
         if confirm != 'y':
             return
         
-        print()
-        
-        # Step 1: Connect
-        if not self.ssh_client.connected:
-            if not self.ssh_client.connect():
-                input(f"\n  {Colors.GRAY}Press Enter to continue...{Colors.ENDC}")
-                return
-        
-        # Step 2: Clone
-        if not self.ssh_client.clone_repo():
-            input(f"\n  {Colors.GRAY}Press Enter to continue...{Colors.ENDC}")
-            return
-        
-        # Step 3: Build
-        if not self.ssh_client.build():
-            input(f"\n  {Colors.GRAY}Press Enter to continue...{Colors.ENDC}")
-            return
-        
-        # Step 4: Download
-        self.ipa_path = self.ssh_client.download_ipa()
-        if not self.ipa_path:
+        slot = min(set(range(len(running) + 1)) - {task.slot for task in running})
+        # Every build gets its own IPA name, like the daemon's jobs, so /builds and the
+        # AltStore source list each one; later slots also get a workspace of their own
+        target_dir = self.config.get("build", "target_dir")
+        config = self.config.overlay(
+            build={"target_dir": target_dir if slot == 0 else f"{target_dir}-{slot + 1}"},
+            output={"ipa_name": f"{self.config.get('build', 'project_name')}-{uuid.uuid4().hex[:12]}.ipa"})
+        task = BuildTask(len(self.tasks) + 1, slot, config)
+        self.tasks.append(task)
+        task.start(self.finished.append)
+        print(f"\n  {Colors.GREEN}✅ Build #{task.number} started in the background. "
+              f"Follow it on the main menu or in View Build Logs.{Colors.ENDC}")
+        time.sleep(1)
+    
+    def handle_finished(self):
+        """Step 5 for builds that ended: serve the new IPA, or show why the build failed"""
+        while self.finished:
+            task = self.finished.popleft()
+            if task.ipa_path:
+                self._publish(task)
+            elif not (task.client and task.client.cancelled.is_set()):
+                self._report_failure(task)
+    
+    def _publish(self, task: BuildTask):
+        self.ipa_path = task.ipa_path
+        self.catalog.add(task.ipa_path)
+        try:
+            if not self.server.running:
+                self.server = BuildServer.from_config(self.config, self.catalog)
+                self.server.start(task.ipa_path)
+            else:
+                self.server.set_ipa(task.ipa_path)
+        except OSError as e:
+            print(f"{Colors.RED}❌ Build #{task.number}: could not start the web server: {e}{Colors.ENDC}")
             input(f"\n  {Colors.GRAY}Press Enter to continue...{Colors.ENDC}")
-            return
-        
-        # Step 5: Start server
-        if not self.server.running:
-            self.server = BuildServer(self.config.get("server", "port"))
-            self.server.start(self.ipa_path)
-        else:
-            IPAHandler.ipa_path = self.ipa_path
-        
-        print(f"""
-{Colors.GREEN}{'═' * 60}
-  ✅ BUILD COMPLETE!
-{'═' * 60}{Colors.ENDC}
-
-  📍 Web Server: {Colors.CYAN}http://localhost:{self.config.get('server', 'port')}{Colors.ENDC}
-  📥 Download:   {Colors.CYAN}http://localhost:{self.config.get('server', 'port')}/download{Colors.ENDC}
-  📁 Local File: {Colors.CYAN}{self.ipa_path}{Colors.ENDC}
-        """)
-        
-        input(f"\n  {Colors.GRAY}Press Enter to return to menu...{Colors.ENDC}")
+    
+    def _report_failure(self, task: BuildTask):
+        """The build thread's own output only reached the activity panel"""
+        print_header()
+        print(f"\n  {Colors.RED}{Colors.BOLD}❌ BUILD #{task.number} FAILED{Colors.ENDC}  {task.branch} @ {task.host}\n")
+        print(f"  {Colors.RED}{task.error}{Colors.ENDC}")
+        client = task.client
+        for error in (client.last_errors if client else [])[:5]:
+            print(f"  {Colors.RED}• {error}{Colors.ENDC}")
+        if client and client.last_log:
+            print(f"\n  {Colors.GRAY}── Last output ──{Colors.ENDC}")
+            for line in client.last_log.tail(10):
+                print(f"  {Colors.GRAY}{line}{Colors.ENDC}")
+        if task.log_path:
+            print(f"\n  {Colors.CYAN}Full log:{Colors.ENDC} {task.log_path}")
+        input(f"\n  {Colors.GRAY}Press Enter to continue...{Colors.ENDC}")
     
     def show_config_menu(self):
         """Show configuration menu"""
@@ -730,9 +4648,25 @@ class Application:
   {Colors.CYAN}[7]{Colors.ENDC} Branch:     {Colors.WHITE}{self.config.get('build', 'branch')}{Colors.ENDC}
   {Colors.CYAN}[8]{Colors.ENDC} Target Dir: {Colors.WHITE}{self.config.get('build', 'target_dir')}{Colors.ENDC}
   {Colors.CYAN}[9]{Colors.ENDC} Project:    {Colors.WHITE}{self.config.get('build', 'project_name')}{Colors.ENDC}
+  {Colors.CYAN}[14]{Colors.ENDC} Workspace: {Colors.WHITE}{self.config.get('build', 'workspace_mode')}{Colors.ENDC}
+  {Colors.CYAN}[15]{Colors.ENDC} Build Cache: {Colors.WHITE}{f"{self.config.get('build', 'cache_dir')} ({self.config.get('build', 'cache_limit_gb')} GB)" if self.config.get('build', 'cache_dir') else 'disabled'}{Colors.ENDC}
   
   {Colors.GRAY}── Server Settings ──{Colors.ENDC}
   {Colors.CYAN}[10]{Colors.ENDC} Server Port: {Colors.WHITE}{self.config.get('server', 'port')}{Colors.ENDC}
+  {Colors.CYAN}[11]{Colors.ENDC} Max Connections: {Colors.WHITE}{self.config.get('server', 'max_connections')}{Colors.ENDC}
+  {Colors.CYAN}[12]{Colors.ENDC} Timeouts:        {Colors.WHITE}{self.config.get('server', 'idle_timeout')}s idle, {self.config.get('server', 'write_timeout')}s stalled transfer{Colors.ENDC}
+  {Colors.CYAN}[13]{Colors.ENDC} Bandwidth Cap:   {Colors.WHITE}{f"{self.config.get('server', 'bandwidth_limit_mbps')} Mbps" if self.config.get('server', 'bandwidth_limit_mbps') else 'unlimited'}{Colors.ENDC}
+  
+  {Colors.GRAY}── Transfer Settings ──{Colors.ENDC}
+  {Colors.CYAN}[16]{Colors.ENDC} Download Channels: {Colors.WHITE}{self.config.get('transfer', 'channels')} × {self.config.get('transfer', 'chunk_size_mb')} MB chunks{Colors.ENDC}
+  {Colors.CYAN}[17]{Colors.ENDC} Packaging:         {Colors.WHITE}{self.config.get('transfer', 'packaging')}{' (keep remote copy)' if self.config.get('transfer', 'packaging') == 'stream' and self.config.get('transfer', 'keep_remote_package') else ''}{Colors.ENDC}
+  
+  {Colors.GRAY}── Build Farm ──{Colors.ENDC}
+  {Colors.CYAN}[18]{Colors.ENDC} Build Hosts:    {Colors.WHITE}{', '.join(_describe_host(host) for host in self.config.get('farm', 'hosts') or []) or '(SSH host only)'}{Colors.ENDC}
+  {Colors.CYAN}[19]{Colors.ENDC} Host Filter:    {Colors.WHITE}Xcode {self.config.get('farm', 'required_xcode') or 'any'}, ≥ {self.config.get('farm', 'min_free_gb')} GB free{Colors.ENDC}
+  
+  {Colors.GRAY}── Build Daemon (--daemon) ──{Colors.ENDC}
+  {Colors.CYAN}[20]{Colors.ENDC} Job API:        {Colors.WHITE}{self.config.get('daemon', 'api_bind')}:{self.config.get('daemon', 'api_port')}{' (token)' if self.config.get('daemon', 'api_token') else ''}, {self.config.get('daemon', 'concurrency')} concurrent build(s){Colors.ENDC}
   
   {Colors.GREEN}[S]{Colors.ENDC} Save Configuration
   {Colors.RED}[0]{Colors.ENDC} Back to Main Menu
@@ -770,6 +4704,55 @@ class Application:
             elif choice == "10":
                 val = input(f"  Enter Server Port: ").strip()
                 if val.isdigit(): self.config.set(int(val), "server", "port")
+            elif choice == "11":
+                val = input(f"  Enter Max Connections: ").strip()
+                if val.isdigit() and int(val) > 0: self.config.set(int(val), "server", "max_connections")
+            elif choice == "12":
+                val = input(f"  Enter Idle Timeout between requests (seconds): ").strip()
+                if val.isdigit() and int(val) > 0: self.config.set(int(val), "server", "idle_timeout")
+                val = input(f"  Enter Write Timeout for a stalled transfer (seconds): ").strip()
+                if val.isdigit() and int(val) > 0: self.config.set(int(val), "server", "write_timeout")
+            elif choice == "13":
+                val = input(f"  Enter Bandwidth Cap in Mbps (0 = unlimited): ").strip()
+                if val.isdigit(): self.config.set(int(val), "server", "bandwidth_limit_mbps")
+            elif choice == "14":
+                val = input(f"  Enter Workspace Mode (incremental/fresh): ").strip().lower()
+                if val in ("incremental", "fresh"): self.config.set(val, "build", "workspace_mode")
+            elif choice == "15":
+                val = input(f"  Enter Build Cache Dir (- to disable): ").strip()
+                if val: self.config.set("" if val == "-" else val, "build", "cache_dir")
+                val = input(f"  Enter Build Cache Limit in GB: ").strip()
+                if val.isdigit() and int(val) > 0: self.config.set(int(val), "build", "cache_limit_gb")
+            elif choice == "16":
+                val = input(f"  Enter Download Channels: ").strip()
+                if val.isdigit() and int(val) > 0: self.config.set(int(val), "transfer", "channels")
+                val = input(f"  Enter Chunk Size in MB: ").strip()
+                if val.isdigit() and int(val) > 0: self.config.set(int(val), "transfer", "chunk_size_mb")
+            elif choice == "17":
+                val = input(f"  Enter Packaging (remote/stream): ").strip().lower()
+                if val in ("remote", "stream"): self.config.set(val, "transfer", "packaging")
+                if val == "stream":
+                    val = input(f"  Keep a copy in packages/ on the Mac? (y/n): ").strip().lower()
+                    if val in ("y", "n"): self.config.set(val == "y", "transfer", "keep_remote_package")
+            elif choice == "18":
+                val = input(f"  Enter Build Hosts as user@host[:port], comma separated (- to clear): ").strip()
+                if val == "-":
+                    self.config.set([], "farm", "hosts")
+                elif val:
+                    hosts = [_parse_host(entry) for entry in val.split(",") if entry.strip()]
+                    self.config.set([host for host in hosts if host], "farm", "hosts")
+            elif choice == "19":
+                val = input(f"  Enter Required Xcode Version (- for any): ").strip()
+                if val: self.config.set("" if val == "-" else val, "farm", "required_xcode")
+                val = input(f"  Enter Minimum Free Disk in GB: ").strip()
+                if val.isdigit(): self.config.set(int(val), "farm", "min_free_gb")
+            elif choice == "20":
+                val = input(f"  Enter Job API Port: ").strip()
+                if val.isdigit(): self.config.set(int(val), "daemon", "api_port")
+                val = input(f"  Enter Concurrent Builds: ").strip()
+                if val.isdigit() and int(val) > 0: self.config.set(int(val), "daemon", "concurrency")
+                val = input(f"  Enter API Token (- for none): ").strip()
+                if val: self.config.set("" if val == "-" else val, "daemon", "api_token")
             elif choice == "s":
                 self.config.save()
                 time.sleep(1)
@@ -780,7 +4763,7 @@ class Application:
         """Show SSH connection menu"""
         while True:
             print_header()
-            status = f"{Colors.GREEN}● Connected to {self.config.get('ssh', 'host')}{Colors.ENDC}" if self.ssh_client.connected else f"{Colors.RED}● Disconnected{Colors.ENDC}"
+            status = f"{Colors.GREEN}● Connected to {self.ssh_client.config.get('ssh', 'host')}{Colors.ENDC}" if self.ssh_client.connected else f"{Colors.RED}● Disconnected{Colors.ENDC}"
             
             print(f"""
   {Colors.WHITE}{Colors.BOLD}🔗 SSH CONNECTION{Colors.ENDC}
@@ -791,6 +4774,8 @@ class Application:
   {Colors.CYAN}[2]{Colors.ENDC} Disconnect
   {Colors.CYAN}[3]{Colors.ENDC} Test Connection
   {Colors.CYAN}[4]{Colors.ENDC} Run Custom Command
+  {Colors.CYAN}[5]{Colors.ENDC} Benchmark Transfer ({_describe_tuning(self.ssh_client.transfer_tuning()) if self.ssh_client.transfer_tuning() else 'not tuned'})
+  {Colors.CYAN}[6]{Colors.ENDC} Probe Build Hosts
   
   {Colors.RED}[0]{Colors.ENDC} Back
             """)
@@ -806,8 +4791,13 @@ class Application:
             elif choice == "3":
                 if self.ssh_client.connected:
                     print("\n  Testing connection...")
-                    exit_code, output = self.ssh_client.execute("echo 'Connection OK' && uname -a", show_output=False)
-                    print(f"  {Colors.GREEN}✅ {output}{Colors.ENDC}")
+                    started = time.monotonic()
+                    results = self.ssh_client.execute_batch(["echo 'Connection OK'", "uname -a", "version=$(xcodebuild -version) && echo \"$version\" | head -1"])
+                    elapsed = (time.monotonic() - started) * 1000
+                    for exit_code, output in results:
+                        color = Colors.GREEN if exit_code == 0 else Colors.RED
+                        print(f"  {color}{'✅' if exit_code == 0 else '❌'} {output.strip()}{Colors.ENDC}")
+                    print(f"  {Colors.GRAY}Round trip: {elapsed:.0f} ms{Colors.ENDC}")
                 else:
                     print(f"  {Colors.RED}Not connected!{Colors.ENDC}")
                 input(f"\n  {Colors.GRAY}Press Enter...{Colors.ENDC}")
@@ -820,6 +4810,21 @@ class Application:
                 else:
                     print(f"  {Colors.RED}Not connected!{Colors.ENDC}")
                 input(f"\n  {Colors.GRAY}Press Enter...{Colors.ENDC}")
+            elif choice == "5":
+                if self.ssh_client.connected:
+                    self.ssh_client.benchmark_transfers()
+                else:
+                    print(f"  {Colors.RED}Not connected!{Colors.ENDC}")
+                input(f"\n  {Colors.GRAY}Press Enter...{Colors.ENDC}")
+            elif choice == "6":
+                print("\n  Probing build hosts...")
+                farm = HostPool(self.config)
+                statuses = farm.probe_all()
+                try:
+                    farm.print_statuses(statuses, farm.select(statuses))
+                finally:
+                    farm.close(statuses)
+                input(f"\n  {Colors.GRAY}Press Enter...{Colors.ENDC}")
             elif choice == "0":
                 return
     
@@ -849,7 +4854,7 @@ class Application:
                 if self.server.running:
                     print(f"  {Colors.YELLOW}Server already running!{Colors.ENDC}")
                 else:
-                    self.server = BuildServer(self.config.get("server", "port"))
+                    self.server = BuildServer.from_config(self.config, self.catalog)
                     self.server.start(self.ipa_path)
                     print(f"  {Colors.GREEN}✅ Server started on http://localhost:{self.config.get('server', 'port')}{Colors.ENDC}")
                 input(f"\n  {Colors.GRAY}Press Enter...{Colors.ENDC}")
@@ -881,15 +4886,15 @@ class Application:
         print_header()
         print(f"\n  {Colors.WHITE}{Colors.BOLD}📁 SELECT IPA FILE{Colors.ENDC}\n")
         
-        # List IPAs in build_output
+        # List IPAs in build_output (indexed by the catalog, newest first)
         output_dir = self.config.get("output", "local_dir")
-        if os.path.exists(output_dir):
-            ipas = [f for f in os.listdir(output_dir) if f.endswith('.ipa')]
-            if ipas:
-                print(f"  {Colors.GRAY}Found in {output_dir}:{Colors.ENDC}")
-                for i, ipa in enumerate(ipas, 1):
-                    size = os.path.getsize(os.path.join(output_dir, ipa)) / 1024 / 1024
-                    print(f"  {Colors.CYAN}[{i}]{Colors.ENDC} {ipa} ({size:.2f} MB)")
+        ipas = self.catalog.entries()
+        if ipas:
+            print(f"  {Colors.GRAY}Found in {output_dir}:{Colors.ENDC}")
+            for i, entry in enumerate(ipas, 1):
+                version = entry.metadata.get("version")
+                details = f" {Colors.GRAY}v{version} ({entry.metadata.get('build')}) · {entry.metadata.get('bundle_id')}{Colors.ENDC}" if version else ""
+                print(f"  {Colors.CYAN}[{i}]{Colors.ENDC} {entry.name} ({entry.size / 1024 / 1024:.2f} MB){details}")
         
         print(f"\n  {Colors.CYAN}[C]{Colors.ENDC} Enter custom path")
         print(f"  {Colors.RED}[0]{Colors.ENDC} Cancel")
@@ -906,27 +4911,31 @@ class Application:
         elif choice.isdigit() and int(choice) > 0:
             idx = int(choice) - 1
             if idx < len(ipas):
-                self.ipa_path = os.path.abspath(os.path.join(output_dir, ipas[idx]))
+                self.ipa_path = os.path.abspath(ipas[idx].path)
                 print(f"  {Colors.GREEN}✅ Selected: {self.ipa_path}{Colors.ENDC}")
                 
                 # Update server if running
                 if self.server.running:
-                    IPAHandler.ipa_path = self.ipa_path
+                    self.server.set_ipa(self.ipa_path)
         
         input(f"\n  {Colors.GRAY}Press Enter...{Colors.ENDC}")
     
     def view_logs(self):
-        """View build logs"""
-        print_header()
-        print(f"\n  {Colors.WHITE}{Colors.BOLD}📋 BUILD LOGS{Colors.ENDC}\n")
+        """View the latest build's log, following it while the build runs"""
+        client = self.tasks[-1].client if self.tasks and self.tasks[-1].client else self.ssh_client
         
-        if self.ssh_client.last_log:
-            for line in self.ssh_client.last_log[-50:]:  # Last 50 lines
-                print(f"  {Colors.GRAY}{line}{Colors.ENDC}")
-        else:
-            print(f"  {Colors.GRAY}No logs available yet.{Colors.ENDC}")
+        def render() -> List[str]:
+            width = shutil.get_terminal_size().columns - 1
+            lines = HEADER.split("\n") + [f"  {Colors.WHITE}{Colors.BOLD}📋 BUILD LOGS{Colors.ENDC}", ""]
+            if client.last_log:
+                lines += [fit_line(f"  {Colors.GRAY}{line}{Colors.ENDC}", width) for line in client.last_log.tail(50)]
+                if client.last_log.spool_path:
+                    lines += ["", fit_line(f"  {Colors.CYAN}Full log:{Colors.ENDC} {client.last_log.spool_path}", width)]
+            else:
+                lines.append(f"  {Colors.GRAY}No logs available yet.{Colors.ENDC}")
+            return lines
         
-        input(f"\n  {Colors.GRAY}Press Enter...{Colors.ENDC}")
+        self.dashboard.read_choice(render, f"  {Colors.GRAY}Press Enter...{Colors.ENDC}")
     
     def scan_network(self):
         """Scan the network for Mac/SSH devices"""
@@ -1109,6 +5118,12 @@ class Application:
     
     def exit_app(self):
         """Exit the application"""
+        running = self.running_tasks()
+        if running:
+            confirm = input(f"\n  {Colors.YELLOW}{len(running)} build(s) still running. Cancel them and exit? (y/n):{Colors.ENDC} ").strip().lower()
+            if confirm != "y":
+                return
+            self.cancel_builds()
         if self.ssh_client.connected:
             self.ssh_client.disconnect()
         if self.server.running:
@@ -1122,9 +5137,68 @@ class Application:
 # ═══════════════════════════════════════════════════════════════════════════════
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EthSign SSH Build Tool & IPA Server")
+    parser.add_argument("--apply-delta", nargs=3, metavar=("BASE_IPA", "DELTA", "OUTPUT_IPA"),
+                        help="rebuild an IPA from a base build and a delta downloaded from /delta/<fingerprint>")
+    parser.add_argument("--update-from", nargs=3, metavar=("SERVER_URL", "BASE_IPA", "OUTPUT_IPA"),
+                        help="fetch the current build from a build server as a delta against BASE_IPA")
+    parser.add_argument("--daemon", action="store_true",
+                        help="run headless: queue builds through the JSON job API and serve the results")
+    parser.add_argument("--report", action="store_true",
+                        help="show build phase percentiles from the build history and flag regressions")
+    parser.add_argument("--history", metavar="DB",
+                        help="history database for --report (default: <output dir>/history.sqlite3; "
+                             "build_and_serve.py writes .build/build_history.sqlite3 in its project)")
+    parser.add_argument("--branch", help="with --report: only this branch")
+    parser.add_argument("--host", help="with --report: only this build host")
+    parser.add_argument("--days", type=int, help="with --report: only the last DAYS days")
+    args = parser.parse_args()
+
+    if os.name == 'nt':
+        # Running any command through cmd.exe turns on VT escape processing for this
+        # console, which the colors, clear_screen and the dashboard rely on
+        os.system('')
+
+    if args.report:
+        history = BuildHistory(args.history or os.path.join(ConfigManager().get("output", "local_dir"), "history.sqlite3"))
+        try:
+            regressed = history_report(history, args.branch, args.host, args.days)
+        except sqlite3.Error as e:
+            print(f"{Colors.RED}❌ {history.path}: {e}{Colors.ENDC}")
+            sys.exit(1)
+        # A non-zero status lets CI jobs fail on a regression
+        sys.exit(2 if regressed else 0)
+
+    if args.daemon:
+        try:
+            BuildDaemon(ConfigManager()).serve_forever()
+        except KeyboardInterrupt:
+            pass
+        except OSError as e:
+            print(f"{Colors.RED}❌ {e}{Colors.ENDC}")
+            sys.exit(1)
+        sys.exit(0)
+
+    if args.apply_delta or args.update_from:
+        try:
+            if args.apply_delta:
+                base_ipa, delta, output_ipa = args.apply_delta
+                manifest = apply_ipa_delta(base_ipa, delta, output_ipa)
+                print(f"{Colors.GREEN}✅ Wrote {output_ipa} ({len(manifest['entries'])} entries verified){Colors.ENDC}")
+            else:
+                update_from_server(*args.update_from)
+        except (OSError, ValueError, zipfile.BadZipFile, urllib.error.URLError) as e:
+            print(f"{Colors.RED}❌ {e}{Colors.ENDC}")
+            sys.exit(1)
+        sys.exit(0)
+
+    app = None
     try:
         app = Application()
         app.run()
     except KeyboardInterrupt:
         print(f"\n\n  {Colors.YELLOW}Interrupted. Exiting...{Colors.ENDC}\n")
+        if app:
+            # Don't leave builds running on the Mac
+            app.cancel_builds()
         sys.exit(0)
@@ -0,0 +1,197 @@
+import copy
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, os.path.join(ROOT, "ssh_build_tool"))
+sys.path.insert(0, ROOT)
+
+import build_server  # noqa: E402
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    """A ConfigManager that reads and saves under tmp_path, with output going to tmp_path/out"""
+    monkeypatch.setattr(build_server.ConfigManager, "CONFIG_FILE", str(tmp_path / "config.json"))
+    manager = build_server.ConfigManager()
+    manager.config = copy.deepcopy(manager.config)
+    manager.set(str(tmp_path / "out"), "output", "local_dir")
+    return manager
+
+
+class LocalSFTP:
+    """Stands in for paramiko's SFTPClient, serving files from the local disk"""
+
+    def __init__(self, fail_after: int = None):
+        self.fail_after = fail_after
+        self.reads = []
+
+    def __call__(self):
+        return self
+
+    def stat(self, path):
+        return os.stat(path)
+
+    def open(self, path, mode):
+        return LocalRemoteFile(self, path)
+
+    def close(self):
+        pass
+
+
+class LocalRemoteFile:
+    def __init__(self, sftp: LocalSFTP, path: str):
+        self.sftp = sftp
+        self.file = open(path, "rb")
+
+    def readv(self, chunks):
+        data = []
+        for offset, length in chunks:
+            if self.sftp.fail_after is not None and len(self.sftp.reads) >= self.sftp.fail_after:
+                raise EOFError("channel dropped")
+            self.sftp.reads.append(offset)
+            self.file.seek(offset)
+            data.append(self.file.read(length))
+        return data
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.file.close()
+
+
+class LocalChannel:
+    """Stands in for a paramiko exec channel, running the command with the local bash"""
+
+    def __init__(self, exec_client: "LocalExec"):
+        self.exec_client = exec_client
+        self.process = None
+        self.combine_stderr = False
+        self.closed = False
+
+    def set_combine_stderr(self, combine):
+        self.combine_stderr = combine
+
+    def exec_command(self, command):
+        self.exec_client.commands.append(command)
+        # Like a shell started by sshd, the command leads its own process group
+        self.process = subprocess.Popen(
+            ["bash", "-c", command], stdout=subprocess.PIPE, start_new_session=True,
+            stderr=subprocess.STDOUT if self.combine_stderr else subprocess.PIPE)
+
+    def recv(self, size):
+        return self.process.stdout.read1(size)
+
+    def recv_exit_status(self):
+        return self.process.wait()
+
+    def makefile_stderr(self):
+        return self.process.stderr
+
+    def read(self):
+        return self.process.stdout.read()
+
+    @property
+    def channel(self):
+        return self
+
+    def close(self):
+        self.closed = True
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        for stream in (self.process.stdout, self.process.stderr):
+            if stream:
+                stream.close()
+
+
+class LocalExec:
+    """Stands in for paramiko's SSHClient: exec channels run locally, the SFTP subsystem is LocalSFTP"""
+
+    def __init__(self):
+        self.commands = []
+        self.closed = False
+
+    def get_transport(self):
+        return self
+
+    def is_active(self):
+        return not self.closed
+
+    def open_session(self, window_size=None):
+        return LocalChannel(self)
+
+    def exec_command(self, command):
+        """(stdin, stdout, stderr) like SSHClient.exec_command; stdout is the channel itself"""
+        channel = self.open_session()
+        channel.exec_command(command)
+        return None, channel, channel.process.stderr
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """A running BuildServer on a free port; IPAHandler's class settings are restored afterwards"""
+    for name in ("ipa_path", "catalog", "scheduler", "download_slots", "timeout", "write_timeout"):
+        monkeypatch.setattr(build_server.IPAHandler, name, getattr(build_server.IPAHandler, name))
+    server = build_server.BuildServer(0)
+    server.start()
+    yield server
+    server.stop()
+
+
+class FakeShell:
+    """Answers remote commands from (substring, exit code, output) rules and records them"""
+
+    def __init__(self, rules=()):
+        self.rules = list(rules)
+        self.commands = []
+        self.batches = []
+
+    def execute(self, command, show_output=True, capture=True, supervisor=None):
+        self.commands.append(command)
+        for needle, exit_code, output in self.rules:
+            if needle in command:
+                return exit_code, output
+        return 0, ""
+
+    def execute_batch(self, commands):
+        self.batches.append(commands)
+        return [(0, "") for _ in commands]
+
+
+@pytest.fixture
+def remote_client(config):
+    """An SSHBuildClient whose remote commands are answered by a FakeShell (`client.shell`)"""
+    client = build_server.SSHBuildClient(config)
+    client.shell = FakeShell()
+    client.execute = client.shell.execute
+    client.execute_batch = client.shell.execute_batch
+    return client
+
+
+@pytest.fixture
+def local_sftp():
+    return LocalSFTP
+
+
+@pytest.fixture
+def local_exec():
+    return LocalExec
+
+
+@pytest.fixture(autouse=True)
+def fresh_singletons(monkeypatch):
+    """Each test gets its own IPA index, delta store, history, metrics and content hashes"""
+    monkeypatch.setattr(build_server, "IPA_INDEX", build_server.IPAIndex())
+    monkeypatch.setattr(build_server, "DELTAS", build_server.DeltaStore())
+    monkeypatch.setattr(build_server, "HISTORY", build_server.BuildHistory())
+    monkeypatch.setattr(build_server, "METRICS", build_server.ServerMetrics())
+    monkeypatch.setattr(build_server, "CONTENT_HASHES", build_server.ContentHashCache())
+    monkeypatch.setattr(build_server, "ARTIFACTS", build_server.ArtifactCache())
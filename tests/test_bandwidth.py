@@ -0,0 +1,99 @@
+import http.client
+import os
+import socket
+import threading
+import time
+
+import build_server as bs
+
+
+def test_grants_at_most_one_quantum():
+    scheduler = bs.BandwidthScheduler(rate=10_000_000, quantum=1000)
+    assert scheduler.acquire(5000) == 1000
+    assert scheduler.acquire(10) == 10
+    assert scheduler.acquire(0) == 1
+
+
+def test_rate_is_enforced_after_the_burst():
+    rate = 2 * 1024 * 1024
+    scheduler = bs.BandwidthScheduler(rate=rate, quantum=64 * 1024)
+    started = time.monotonic()
+    granted = 0
+    while granted < scheduler.burst + rate / 4:
+        granted += scheduler.acquire(64 * 1024)
+    # The first burst is free; the rest arrives at `rate`
+    assert time.monotonic() - started >= 0.2
+
+
+def test_backlogged_clients_share_equally():
+    scheduler = bs.BandwidthScheduler(rate=4 * 1024 * 1024, quantum=16 * 1024)
+    # Use up the initial burst, so that every grant below waits its turn in the queue
+    drained = 0
+    while drained < scheduler.burst:
+        drained += scheduler.acquire(scheduler.quantum)
+    totals = [0, 0, 0]
+    stop = threading.Event()
+
+    def client(index):
+        while not stop.is_set():
+            totals[index] += scheduler.acquire(16 * 1024)
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.6)
+    stop.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert min(totals) > 0
+    assert max(totals) - min(totals) <= 2 * scheduler.quantum
+    assert sum(totals) <= scheduler.rate * 0.7
+
+
+def test_send_file_charges_only_bytes_sent(tmp_path, monkeypatch):
+    """A short sendfile() keeps the rest of its grant instead of asking for a new one"""
+    path = tmp_path / "Ksign.ipa"
+    data = os.urandom(200_000)
+    path.write_bytes(data)
+    real_sendfile = os.sendfile
+    monkeypatch.setattr(bs.os, "sendfile", lambda out_fd, in_fd, offset, count: real_sendfile(out_fd, in_fd, offset, min(count, 3000)))
+
+    grants = []
+
+    def throttle(wanted):
+        grants.append(min(wanted, 10_000))
+        return grants[-1]
+
+    sender, receiver = socket.socketpair()
+    received = bytearray()
+    reader = threading.Thread(target=lambda: [received.extend(chunk) for chunk in iter(lambda: receiver.recv(65536), b"")])
+    reader.start()
+    with open(path, "rb") as f:
+        assert bs.send_file(sender, f, 0, len(data), throttle=throttle) == len(data)
+    sender.close()
+    reader.join(5)
+    receiver.close()
+
+    assert bytes(received) == data
+    assert sum(grants) == len(data)
+    assert len(grants) == 20
+
+
+def test_capped_server_download(server, tmp_path):
+    path = tmp_path / "Ksign.ipa"
+    data = os.urandom(1024 * 1024)
+    path.write_bytes(data)
+    server.set_ipa(str(path))
+    bs.IPAHandler.scheduler = bs.BandwidthScheduler(2 * 1024 * 1024)
+
+    started = time.monotonic()
+    connection = http.client.HTTPConnection("127.0.0.1", server.server.server_address[1], timeout=5)
+    try:
+        connection.request("GET", "/download")
+        body = connection.getresponse().read()
+    finally:
+        connection.close()
+    assert body == data
+    # 512 KiB of burst, the rest at 2 MiB/s
+    assert time.monotonic() - started >= 0.2
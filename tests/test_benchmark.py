@@ -0,0 +1,96 @@
+import os
+import subprocess
+import time
+
+import pytest
+
+import build_server as bs
+
+
+@pytest.fixture
+def bench_client(config, local_exec, local_sftp, monkeypatch, tmp_path):
+    """A client whose commands, exec channels, SFTP and extra connections all run locally.
+
+    `client.opened` records the (compress, cipher) of each extra connection and
+    `client.slow` the transfer methods that are made to take 0.2s longer.
+    """
+    config.set("mac.local", "ssh", "host")
+    config.set(1, "transfer", "benchmark_mb")
+    client = bs.SSHBuildClient(config)
+    client.client = local_exec()
+    client.opened = []
+    client.slow = set()
+
+    def execute(command, show_output=True, capture=True, supervisor=None):
+        result = subprocess.run(["bash", "-c", command], capture_output=True, text=True)
+        return result.returncode, result.stdout
+
+    def open_client(compress=False, cipher=None):
+        client.opened.append((compress, cipher))
+        return local_exec()
+
+    def open_sftp(ssh_client=None):
+        if "sftp" in client.slow:
+            time.sleep(0.2)
+        return local_sftp()()
+
+    exec_download = client._exec_download
+
+    def slow_exec_download(command, *args, **kwargs):
+        if command.split()[0] in client.slow:
+            time.sleep(0.2)
+        return exec_download(command, *args, **kwargs)
+
+    monkeypatch.setattr(client, "execute", execute)
+    monkeypatch.setattr(client, "_open_client", open_client)
+    monkeypatch.setattr(client, "_open_sftp", open_sftp)
+    monkeypatch.setattr(client, "_exec_download", slow_exec_download)
+    monkeypatch.setattr(bs.paramiko.Transport, "_preferred_ciphers", ("aes128-ctr", "chacha20-poly1305@openssh.com"))
+    return client
+
+
+def test_fastest_method_is_saved_for_the_host(bench_client):
+    bench_client.slow = {"sftp", "cat"}
+    winner = bench_client.benchmark_transfers()
+
+    assert winner["method"] == "gzip"
+    assert winner["mbps"] > 0 and "measured" in winner
+    assert bench_client.transfer_tuning() == winner
+    # Only the winning method is re-measured, with compression and each cipher paramiko supports
+    assert bench_client.opened == [(True, None), (False, "aes128-ctr")]
+    assert not os.path.exists("/tmp/ethsign-transfer-benchmark.bin")
+
+    # The saved winner survives a reload of the config
+    reloaded = bs.ConfigManager()
+    assert reloaded.get("transfer", "tuning")["mac.local"]["method"] == "gzip"
+
+
+def test_winner_is_used_by_download_ipa(bench_client, tmp_path):
+    bench_client.config.set({"mac.local": {"method": "cat"}}, "transfer", "tuning")
+    remote = tmp_path / "remote.ipa"
+    remote.write_bytes(os.urandom(64 * 1024))
+
+    local = bench_client.download_ipa(str(remote))
+    with open(local, "rb") as f:
+        assert f.read() == remote.read_bytes()
+    assert bench_client.client.commands == [f"cat {remote}"]
+    assert bs.read_artifact_manifest(local)["source"].endswith("(cat)")
+
+
+def test_failing_strategies_are_skipped(bench_client, monkeypatch, capsys):
+    def refused(compress=False, cipher=None):
+        raise OSError("connection refused")
+
+    monkeypatch.setattr(bench_client, "_open_client", refused)
+    bench_client.slow = {"cat", "gzip"}
+    winner = bench_client.benchmark_transfers()
+
+    assert winner["method"] == "sftp"
+    assert not winner["compress"] and not winner["cipher"]
+    assert "connection refused" in capsys.readouterr().out
+
+
+def test_failed_payload_leaves_tuning_untouched(bench_client, monkeypatch):
+    monkeypatch.setattr(bench_client, "execute", lambda command, **kwargs: (1, ""))
+    assert bench_client.benchmark_transfers() is None
+    assert bench_client.transfer_tuning() == {}
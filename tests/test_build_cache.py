@@ -0,0 +1,67 @@
+import pytest
+
+import build_server as bs
+from build_server import SSHBuildClient
+
+
+@pytest.fixture
+def client(remote_client):
+    remote_client.config.set("/Users/ci/cache", "build", "cache_dir")
+    remote_client.config.set("feature/login", "build", "branch")
+    return remote_client
+
+
+def test_cache_key_is_a_safe_directory_name():
+    assert bs.build_cache_key("feature/login", "15.2-15C500c") == "feature_login-xcode15.2-15C500c"
+    assert bs.build_cache_key("feature/login") == "feature_login-xcode"
+    assert bs.build_cache_key("main", "16.0-16A242d") != bs.build_cache_key("main", "15.4-15F31d")
+
+
+def test_prepare_uses_branch_and_xcode_version(client):
+    client.shell.rules.append(("xcodebuild -version", 0, "Xcode 15.2\nBuild version 15C500c\n"))
+    key_dir = client.prepare_build_cache()
+    assert key_dir == "/Users/ci/cache/feature_login-xcode15.2-15C500c"
+    assert any(command.startswith(f"mkdir -p {key_dir}/DerivedData {key_dir}/SourcePackages && touch {key_dir}")
+               for command in client.shell.commands)
+
+
+@pytest.mark.parametrize("rules", [
+    [("xcodebuild -version", 1, "xcode-select: error: tool 'xcodebuild' requires Xcode")],
+    [("xcodebuild -version", 0, "Xcode 15.2\nBuild version 15C500c\n"), ("mkdir", 1, "Permission denied")],
+])
+def test_prepare_without_a_usable_cache(client, rules):
+    client.shell.rules.extend(rules)
+    assert client.prepare_build_cache() is None
+
+
+def test_prepare_when_disabled(client):
+    client.config.set("", "build", "cache_dir")
+    assert client.prepare_build_cache() is None
+    assert not client.shell.commands
+
+
+def test_archive_uses_the_cache_directories(client):
+    flags = "-derivedDataPath /c/DerivedData -clonedSourcePackagesDirPath /c/SourcePackages "
+    archive = next(step for step in client.build_steps(flags) if step.name == "Build iOS Archive")
+    assert flags + SSHBuildClient.ARCHIVE_FLAGS in archive.command
+
+
+def test_eviction_removes_least_recently_used(client):
+    client.config.set(1, "build", "cache_limit_gb")
+    gb = 1024 * 1024
+    client.shell.rules.append(("du -sk", 0, "\n".join([
+        f"100 {gb // 2} main-xcode15.2",
+        f"300 {gb // 2} feature_login-xcode15.2",
+        f"200 {gb // 2} release-xcode15.2",
+        f"50 {gb // 4} old-xcode14.3",
+        "garbage line",
+    ])))
+    client.evict_build_caches("/Users/ci/cache/old-xcode14.3/")
+    # 1.75 GB over a 1 GB limit: the oldest caches go first, but never the one in use
+    assert client.shell.batches == [["rm -rf /Users/ci/cache/main-xcode15.2", "rm -rf /Users/ci/cache/release-xcode15.2"]]
+
+
+def test_no_eviction_under_the_limit(client):
+    client.shell.rules.append(("du -sk", 0, "100 1024 main-xcode15.2\n"))
+    client.evict_build_caches("/Users/ci/cache/main-xcode15.2")
+    assert client.shell.batches == []
@@ -0,0 +1,81 @@
+import gzip
+import os
+import threading
+
+from build_server import BuildLog
+
+
+def test_tail_keeps_the_newest_complete_lines():
+    log = BuildLog(max_lines=3)
+    log.write(b"one\ntwo\nthr")
+    assert log.tail() == ["one", "two"]
+    log.write(b"ee\nfour\nfive\n")
+    assert log.tail() == ["three", "four", "five"]
+    assert log.tail(2) == ["four", "five"]
+    assert len(log) == 3
+
+
+def test_lines_are_decoded_when_read():
+    log = BuildLog()
+    log.write("héllo\r\n".encode()[:2])
+    log.write("héllo\r\n".encode()[2:] + b"bad \xff byte\n")
+    assert log.tail() == ["héllo", "bad � byte"]
+
+
+def test_command_ends_an_unfinished_line():
+    log = BuildLog()
+    log.write(b"50% done")
+    log.command("xcodebuild archive")
+    log.command("zip -qr")
+    assert log.tail() == ["50% done", "$ xcodebuild archive", "$ zip -qr"]
+
+
+def test_spool_has_the_complete_output(tmp_path):
+    log = BuildLog(max_lines=2)
+    log.write(b"before the build\n")
+    path = log.start_spool(str(tmp_path / "logs"), label="3")
+    assert os.path.basename(path).startswith("build-") and path.endswith("-3.log.gz")
+    assert log.spool_path == path
+
+    log.command("make")
+    log.write(b"".join(b"line %d\n" % n for n in range(100)) + b"no newline")
+    log.stop_spool()
+    log.write(b"after the build\n")
+
+    with gzip.open(path, "rb") as f:
+        spooled = f.read()
+    assert spooled == b"$ make\n" + b"".join(b"line %d\n" % n for n in range(100)) + b"no newline"
+    # Stopping the spool flushes the unfinished line into the tail
+    assert log.tail() == ["no newline", "after the build"]
+
+
+def test_old_spools_are_removed(tmp_path):
+    for stamp in ("20260101-000000", "20260102-000000", "20260103-000000"):
+        (tmp_path / f"build-{stamp}.log.gz").write_bytes(b"")
+    (tmp_path / "notes.txt").write_text("kept")
+
+    log = BuildLog()
+    path = log.start_spool(str(tmp_path), keep=2)
+    log.stop_spool()
+    assert sorted(os.listdir(tmp_path)) == sorted([os.path.basename(path), "build-20260103-000000.log.gz", "notes.txt"])
+
+
+def test_concurrent_writers_keep_whole_lines(tmp_path):
+    log = BuildLog(max_lines=10_000)
+    log.start_spool(str(tmp_path))
+
+    def writer(name):
+        for n in range(500):
+            log.write(b"%s %d\n" % (name, n))
+
+    threads = [threading.Thread(target=writer, args=(name,)) for name in (b"a", b"b", b"c")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    log.stop_spool()
+
+    assert len(log) == 1500
+    assert all(line.split()[0] in ("a", "b", "c") and line.split()[1].isdigit() for line in log.tail(1500))
+    with gzip.open(log.spool_path, "rb") as f:
+        assert f.read().count(b"\n") == 1500
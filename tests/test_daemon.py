@@ -0,0 +1,209 @@
+import http.client
+import json
+import os
+import threading
+import zipfile
+
+import pytest
+
+import build_server as bs
+
+
+class TestJobQueue:
+    def test_jobs_survive_a_restart_and_running_jobs_are_queued_again(self, tmp_path):
+        path = str(tmp_path / "jobs.json")
+        queue = bs.JobQueue(path)
+        first = queue.submit(bs.BuildJob("main"))
+        second = queue.submit(bs.BuildJob("feature/x", "https://example.com/repo.git"))
+        assert queue.claim(threading.Event()) is first
+        queue.update(second, state="failed", errors=["boom"])
+
+        reloaded = bs.JobQueue(path)
+
+        assert [job.id for job in reloaded.list()] == [second.id, first.id]
+        assert reloaded.get(first.id).state == "queued"
+        assert reloaded.get(second.id).errors == ["boom"]
+        assert reloaded.get(second.id).finished
+        assert reloaded.get(second.id).repo_url == "https://example.com/repo.git"
+
+    def test_claim_skips_branches_that_are_already_building(self, tmp_path):
+        queue = bs.JobQueue(str(tmp_path / "jobs.json"))
+        main = queue.submit(bs.BuildJob("main"))
+        main_again = queue.submit(bs.BuildJob("main"))
+        other = queue.submit(bs.BuildJob("release"))
+        stop = threading.Event()
+
+        assert queue.claim(stop) is main
+        assert queue.claim(stop) is other
+        stop.set()
+        assert queue.claim(stop, timeout=0.01) is None
+        queue.update(main, state="succeeded")
+        assert queue.claim(threading.Event()) is main_again
+
+    def test_finished_jobs_beyond_keep_are_pruned(self, tmp_path):
+        queue = bs.JobQueue(str(tmp_path / "jobs.json"), keep=2)
+        jobs = [queue.submit(bs.BuildJob("main")) for _ in range(3)]
+        for job in jobs:
+            queue.update(job, state="succeeded")
+        queue.submit(bs.BuildJob("main"))
+        assert jobs[0].id not in queue.jobs and jobs[1].id not in queue.jobs
+
+    def test_only_unclaimed_jobs_can_be_cancelled_as_queued(self, tmp_path):
+        queue = bs.JobQueue(str(tmp_path / "jobs.json"))
+        job = queue.submit(bs.BuildJob("main"))
+        queue.claim(threading.Event())
+        assert not queue.cancel_queued(job)
+        assert job.state == "running"
+
+
+def write_ipa(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("Payload/Ksign.app/Ksign", b"binary")
+    bs.write_artifact_manifest(path, bs.hash_file(path))
+    return os.path.abspath(path)
+
+
+@pytest.fixture
+def daemon(config, monkeypatch):
+    """A BuildDaemon on free ports whose builds run `daemon.build(client)` instead of a remote build"""
+    config.set(0, "server", "port")
+    config.set(0, "daemon", "api_port")
+    for name in ("ipa_path", "catalog", "scheduler", "download_slots", "timeout"):
+        monkeypatch.setattr(bs.IPAHandler, name, getattr(bs.IPAHandler, name))
+    monkeypatch.setattr(bs.JobAPIHandler, "daemon", None)
+    monkeypatch.setattr(bs.JobAPIHandler, "token", "")
+    monkeypatch.setattr(bs.SSHBuildClient, "build_artifact", lambda client: daemon.build(client))
+    daemon = bs.BuildDaemon(config)
+    daemon.build = lambda client: write_ipa(client.local_ipa_path())
+    daemon.start()
+    yield daemon
+    daemon.stop()
+
+
+def api(daemon, method, path, body=None):
+    connection = http.client.HTTPConnection("127.0.0.1", daemon.api.server_address[1], timeout=5)
+    try:
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode() if body is not None else None
+        connection.request(method, path, body=payload, headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def wait_until_done(daemon, job_id, timeout=5):
+    job = daemon.queue.get(job_id)
+    with daemon.queue._changed:
+        assert daemon.queue._changed.wait_for(lambda: job.done, timeout)
+    return job
+
+
+class TestBuildDaemon:
+    def test_successful_job_is_published(self, daemon):
+        status, job = api(daemon, "POST", "/jobs", {"branch": "main"})
+        assert status == 202
+
+        job = wait_until_done(daemon, job["id"])
+
+        assert job.state == "succeeded"
+        assert os.path.basename(job.artifact) == f"Ksign-{job.id}.ipa"
+        assert f"Ksign-{job.id}" in [entry.id for entry in daemon.catalog.entries()]
+        status, artifacts = api(daemon, "GET", f"/jobs/{job.id}/artifacts")
+        assert artifacts["artifacts"][0]["sha256"] == bs.hash_file(job.artifact)
+
+    @pytest.mark.parametrize("body", [
+        {"branch": "main; rm -rf ~"}, {"branch": "../etc"}, {"branch": 5}, {"branch": ["main"]},
+        {"repo_url": {"url": "x"}}, {"repo_url": "https://example.com/$(id)"}, [1, 2], b"{not json",
+    ])
+    def test_invalid_submissions_are_rejected(self, daemon, body):
+        status, response = api(daemon, "POST", "/jobs", body)
+        assert status == 400
+        assert response["error"]
+        assert daemon.queue.list() == []
+
+    def test_cancel_while_the_build_host_is_chosen(self, daemon, config, monkeypatch):
+        config.set([{"host": "mac-1"}], "farm", "hosts")
+        probing, chosen = threading.Event(), threading.Event()
+        built = []
+        daemon.build = lambda client: built.append(client)
+
+        def acquire(pool, show=True):
+            probing.set()
+            chosen.wait(5)
+            return bs.SSHBuildClient(pool.config)
+        monkeypatch.setattr(bs.HostPool, "acquire", acquire)
+
+        job_id = api(daemon, "POST", "/jobs", {"branch": "main"})[1]["id"]
+        assert probing.wait(5)
+        assert api(daemon, "POST", f"/jobs/{job_id}/cancel")[0] == 202
+        chosen.set()
+
+        assert wait_until_done(daemon, job_id).state == "cancelled"
+        assert built == []
+
+    def test_cancel_during_the_download_publishes_nothing(self, daemon):
+        downloaded, resume = threading.Event(), threading.Event()
+
+        def build(client):
+            path = write_ipa(client.local_ipa_path())
+            downloaded.set()
+            resume.wait(5)
+            return path
+        daemon.build = build
+
+        job_id = api(daemon, "POST", "/jobs", {"branch": "main"})[1]["id"]
+        assert downloaded.wait(5)
+        assert api(daemon, "DELETE", f"/jobs/{job_id}")[0] == 202
+        resume.set()
+
+        job = wait_until_done(daemon, job_id)
+        assert job.state == "cancelled"
+        assert job.artifact is None
+        assert not os.path.exists(os.path.join(daemon.config.get("output", "local_dir"), f"Ksign-{job_id}.ipa"))
+        assert bs.IPAHandler.ipa_path is None
+        assert api(daemon, "POST", f"/jobs/{job_id}/cancel")[0] == 409
+
+    def test_cancel_stops_a_running_build(self, daemon):
+        started = threading.Event()
+
+        def build(client):
+            started.set()
+            client.cancelled.wait(5)
+            raise bs.BuildCancelled()
+        daemon.build = build
+
+        job_id = api(daemon, "POST", "/jobs", {"branch": "main"})[1]["id"]
+        assert started.wait(5)
+        assert api(daemon, "GET", f"/jobs/{job_id}")[1]["progress"] is not None
+        assert api(daemon, "POST", f"/jobs/{job_id}/cancel")[0] == 202
+        assert wait_until_done(daemon, job_id).state == "cancelled"
+
+    def test_unknown_job_and_token(self, daemon, monkeypatch):
+        assert api(daemon, "GET", "/jobs/nope")[0] == 404
+        monkeypatch.setattr(bs.JobAPIHandler, "token", "secret")
+        assert api(daemon, "GET", "/jobs")[0] == 401
+
+
+def test_chunked_download_stops_on_cancel(tmp_path, local_sftp):
+    remote = tmp_path / "remote.ipa"
+    remote.write_bytes(os.urandom(4 * 1024 * 1024))
+    cancelled = threading.Event()
+
+    class CancelAfterFirstRead(local_sftp):
+        def open(self, path, mode):
+            remote_file = super().open(path, mode)
+            readv = remote_file.readv
+
+            def cancelling_readv(chunks):
+                data = readv(chunks)
+                cancelled.set()
+                return data
+            remote_file.readv = cancelling_readv
+            return remote_file
+
+    sftp = CancelAfterFirstRead()
+    downloader = bs.ChunkedDownloader(sftp, channels=1, chunk_size=1024 * 1024, cancelled=cancelled)
+    with pytest.raises(bs.BuildCancelled):
+        downloader.download(str(remote), str(tmp_path / "Ksign.ipa"))
+    assert len(sftp.reads) == 1
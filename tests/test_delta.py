@@ -0,0 +1,121 @@
+import os
+import plistlib
+import zipfile
+
+import pytest
+
+import build_server as bs
+
+
+def write_ipa(path, files):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return str(path)
+
+
+BASE = {
+    "Payload/App.app/Info.plist": plistlib.dumps({"CFBundleIdentifier": "xyz.ethsign.app"}),
+    "Payload/App.app/App": b"\x00binary v1" * 1000,
+    "Payload/App.app/Assets.car": b"assets" * 5000,
+    "Payload/App.app/old.png": b"png",
+}
+TARGET = dict(BASE, **{"Payload/App.app/App": b"\x00binary v2" * 1000, "Payload/App.app/new.png": b"new"})
+del TARGET["Payload/App.app/old.png"]
+
+
+@pytest.fixture
+def builds(tmp_path):
+    return write_ipa(tmp_path / "base.ipa", BASE), write_ipa(tmp_path / "target.ipa", TARGET)
+
+
+def fingerprint(path):
+    with zipfile.ZipFile(path) as archive:
+        return bs.ipa_fingerprint(archive)
+
+
+def test_round_trip(builds, tmp_path):
+    base, target = builds
+    delta = str(tmp_path / "update.delta")
+    manifest = bs.create_ipa_delta(base, target, delta)
+
+    assert manifest["removed"] == ["Payload/App.app/old.png"]
+    assert manifest["changed_bytes"] == len(TARGET["Payload/App.app/App"]) + len(b"new")
+    assert {entry["name"] for entry in manifest["entries"] if entry["source"] == "base"} == {
+        "Payload/App.app/Info.plist", "Payload/App.app/Assets.car"}
+
+    output = str(tmp_path / "rebuilt.ipa")
+    bs.apply_ipa_delta(base, delta, output)
+    assert fingerprint(output) == fingerprint(target)
+    with zipfile.ZipFile(output) as archive:
+        assert {name: archive.read(name) for name in archive.namelist()} == TARGET
+    assert not os.path.exists(f"{output}.part")
+
+
+def test_corrupt_entry_leaves_no_part_file(builds, tmp_path):
+    base, target = builds
+    delta = str(tmp_path / "update.delta")
+    bs.create_ipa_delta(base, target, delta)
+
+    # Same manifest, but a stored entry no longer matches its recorded CRC
+    corrupt = str(tmp_path / "corrupt.delta")
+    with zipfile.ZipFile(delta) as source, zipfile.ZipFile(corrupt, "w") as archive:
+        for info in source.infolist():
+            data = source.read(info)
+            archive.writestr(info.filename, data.replace(b"v2", b"v3") if info.filename.startswith("files/") else data)
+
+    output = tmp_path / "rebuilt.ipa"
+    output.write_bytes(b"previous")
+    with pytest.raises(ValueError, match="mismatch"):
+        bs.apply_ipa_delta(base, corrupt, str(output))
+    assert output.read_bytes() == b"previous"
+    assert not os.path.exists(f"{output}.part")
+
+
+def test_wrong_base_is_rejected(builds, tmp_path):
+    base, target = builds
+    delta = str(tmp_path / "update.delta")
+    bs.create_ipa_delta(base, target, delta)
+    with pytest.raises(ValueError, match="different base"):
+        bs.apply_ipa_delta(target, delta, str(tmp_path / "rebuilt.ipa"))
+    assert not os.path.exists(tmp_path / "rebuilt.ipa.part")
+
+
+def server_url(server):
+    return f"http://127.0.0.1:{server.server.server_address[1]}"
+
+
+def test_update_uses_delta(builds, tmp_path, server):
+    base, target = builds
+    bs.DELTAS.open(str(tmp_path / "deltas"))
+    bs.IPA_INDEX.fingerprint(base)
+    server.set_ipa(target)
+
+    output = str(tmp_path / "updated.ipa")
+    assert bs.update_from_server(server_url(server), base, output)
+    assert fingerprint(output) == fingerprint(target)
+    assert not os.path.exists(f"{output}.delta")
+
+
+def test_update_falls_back_to_verified_download(builds, tmp_path, server):
+    base, target = builds
+    server.set_ipa(target)
+
+    output = str(tmp_path / "updated.ipa")
+    assert bs.update_from_server(server_url(server), base, output)
+    with open(output, "rb") as f, open(target, "rb") as expected:
+        assert f.read() == expected.read()
+    assert not os.path.exists(f"{output}.part")
+
+
+def test_full_download_with_wrong_digest_is_discarded(builds, tmp_path, server, monkeypatch):
+    base, target = builds
+    server.set_ipa(target)
+    monkeypatch.setattr(bs.CONTENT_HASHES, "get", lambda path, stat=None: "0" * 64)
+
+    output = tmp_path / "updated.ipa"
+    output.write_bytes(b"previous")
+    with pytest.raises(ValueError, match="SHA-256"):
+        bs.update_from_server(server_url(server), base, str(output))
+    assert output.read_bytes() == b"previous"
+    assert not os.path.exists(f"{output}.part")
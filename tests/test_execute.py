@@ -0,0 +1,102 @@
+import time
+
+import pytest
+
+import build_server as bs
+
+
+@pytest.fixture
+def client(config, local_exec):
+    """A connected client whose remote commands run in the local bash"""
+    client = bs.SSHBuildClient(config)
+    client.client = local_exec()
+    return client
+
+
+class TestExecuteBatch:
+    def test_one_result_per_command(self, client):
+        results = client.execute_batch([
+            "echo one; echo two",
+            "echo to stderr >&2; exit 3",
+            "printf 'no newline'",
+            "true",
+        ])
+        assert results == [(0, "one\ntwo\n"), (3, "to stderr\n"), (0, "no newline"), (0, "")]
+        assert len(client.client.commands) == 1
+
+    def test_output_that_looks_like_a_sentinel_is_kept(self, client):
+        [(code, output)] = client.execute_batch(["printf '\\n__ethsign_deadbeef__ 0\\n'"])
+        assert (code, output) == (0, "\n__ethsign_deadbeef__ 0\n")
+
+    def test_commands_do_not_read_the_script(self, client):
+        # A command reading stdin must not swallow the commands after it
+        assert client.execute_batch(["cat", "echo after"]) == [(0, ""), (0, "after\n")]
+
+    def test_commands_after_a_lost_connection_fail(self, client):
+        results = client.execute_batch(["echo before", "kill -9 $$", "echo never"])
+        assert results[0] == (0, "before\n")
+        assert results[1:] == [(-1, ""), (-1, "")]
+
+    def test_commands_and_output_are_logged(self, client):
+        client.execute_batch(["echo logged"])
+        assert any("echo logged" in line for line in client.last_log.tail())
+        assert "logged" in client.last_log.tail()
+
+
+class TestExecute:
+    def test_returns_exit_code_and_merged_output(self, client):
+        exit_code, output = client.execute("echo out; echo err >&2; exit 4", show_output=False)
+        assert (exit_code, output) == (4, "out\nerr\n")
+        assert not client._process_groups
+
+    def test_supervisor_stops_the_command_on_a_fatal_error(self, client):
+        supervisor = bs.BuildSupervisor()
+        started = time.monotonic()
+        exit_code, output = client.execute(
+            "echo 'App.swift:1:1: error: boom'; sleep 30; echo finished", show_output=False, supervisor=supervisor)
+        assert time.monotonic() - started < 10
+        assert exit_code != 0
+        assert "finished" not in output
+        assert supervisor.errors == ["App.swift:1:1: error: boom"]
+
+
+class TestPreflight:
+    def run(self, client, monkeypatch, results):
+        batches = []
+
+        def execute_batch(commands):
+            batches.append(commands)
+            return results[:len(commands)]
+
+        monkeypatch.setattr(client, "execute_batch", execute_batch)
+        return client.preflight(), batches
+
+    PASSING = [(0, "git version 2.45.0\n"), (0, "Xcode 16.0\n"), (0, "available\n"),
+               (0, f"{100 * 1024 * 1024}\n"), (0, "0123456789ab\n")]
+
+    def test_all_checks_in_one_round_trip(self, client, monkeypatch, capsys):
+        ok, batches = self.run(client, monkeypatch, self.PASSING)
+        assert ok
+        assert len(batches) == 1 and len(batches[0]) == 5
+        out = capsys.readouterr().out
+        assert "Xcode 16.0" in out and "100.0 GB" in out and "0123456789ab" in out
+
+    def test_low_disk_space_only_warns(self, client, monkeypatch, capsys):
+        results = list(self.PASSING)
+        results[3] = (0, f"{5 * 1024 * 1024}\n")
+        ok, _ = self.run(client, monkeypatch, results)
+        assert ok
+        assert "5.0 GB" in capsys.readouterr().out
+
+    def test_missing_branch_fails(self, client, monkeypatch, capsys):
+        results = list(self.PASSING)
+        results[4] = (2, "")
+        ok, _ = self.run(client, monkeypatch, results)
+        assert not ok
+        assert "Branch: failed (2)" in capsys.readouterr().out
+
+    def test_commit_sha_skips_the_branch_check(self, client, monkeypatch):
+        client.config.set("0123456789abcdef", "build", "branch")
+        ok, batches = self.run(client, monkeypatch, self.PASSING)
+        assert ok
+        assert len(batches[0]) == 4
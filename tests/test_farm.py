@@ -0,0 +1,107 @@
+import re
+
+import paramiko
+import pytest
+
+import build_server as bs
+
+
+class FakeStdout:
+    def __init__(self, text: str):
+        self.text = text
+        self.channel = self
+
+    def read(self):
+        return self.text.encode()
+
+    def recv_exit_status(self):
+        return 0
+
+
+class FakeSSH:
+    """A paramiko.SSHClient that answers HostPool's probe batch with canned output"""
+
+    def __init__(self, load="1.00", cpus="8", free_gb=100, xcode="Xcode 15.2", busy="idle", warm="", error=None):
+        self.outputs = [f"{{ {load} 0.90 0.80 }}", cpus, str(free_gb * 1024 * 1024), xcode, busy, warm]
+        self.error = error
+        self.closed = False
+
+    def exec_command(self, script):
+        if self.error:
+            raise self.error
+        sentinel = re.search(r"__ethsign_[0-9a-f]+__", script).group(0)
+        return None, FakeStdout("".join(f"{output}\n{sentinel} 0\n" for output in self.outputs)), None
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def farm(config, monkeypatch):
+    """A HostPool over the hosts passed as {name: FakeSSH}"""
+    monkeypatch.setattr(bs.HostPool, "_reserved", set())
+
+    def make(hosts: dict):
+        config.set([{"host": name} for name in hosts], "farm", "hosts")
+        monkeypatch.setattr(bs.SSHBuildClient, "_open_client",
+                            lambda client, *args: hosts[client.config.get("ssh", "host")])
+        return bs.HostPool(config)
+    return make
+
+
+def test_least_loaded_host_is_chosen_and_the_others_are_closed(farm):
+    hosts = {"busy-mac": FakeSSH(load="7.5"), "idle-mac": FakeSSH(load="0.5"), "old-mac": FakeSSH(load="0.1", xcode="")}
+    pool = farm(hosts)
+
+    client = pool.acquire(show=False)
+
+    assert client.config.get("ssh", "host") == "idle-mac"
+    assert not hosts["idle-mac"].closed
+    assert hosts["busy-mac"].closed and hosts["old-mac"].closed
+    assert pool._reserved == {"idle-mac"}
+    pool.release(client)
+    assert pool._reserved == set()
+
+
+def test_warm_cache_outweighs_a_little_load(farm):
+    pool = farm({"cold": FakeSSH(load="2.0"), "warm": FakeSSH(load="4.0", warm="/cache/main-15.2")})
+    assert pool.acquire(show=False).config.get("ssh", "host") == "warm"
+
+
+def test_required_xcode_and_free_disk(farm, config):
+    config.set("16", "farm", "required_xcode")
+    pool = farm({"xcode15": FakeSSH(xcode="Xcode 15.4"), "full": FakeSSH(xcode="Xcode 16.1", free_gb=5),
+                 "ok": FakeSSH(load="6.0", xcode="Xcode 16.0")})
+    assert pool.acquire(show=False).config.get("ssh", "host") == "ok"
+
+
+def test_reserved_host_counts_as_busy(farm):
+    pool = farm({"a": FakeSSH(load="0.5"), "b": FakeSSH(load="3.0")})
+    first = pool.acquire(show=False)
+    second = pool.acquire(show=False)
+    assert {first.config.get("ssh", "host"), second.config.get("ssh", "host")} == {"a", "b"}
+
+
+@pytest.mark.parametrize("error", [paramiko.SSHException("channel closed"), EOFError(), TimeoutError("timed out")])
+def test_a_host_that_fails_the_probe_is_unavailable(farm, error):
+    hosts = {"broken": FakeSSH(load="0.1", error=error), "fine": FakeSSH(load="3.0")}
+    pool = farm(hosts)
+
+    statuses = {status.name: status for status in pool.probe_all()}
+    assert not statuses["broken"].reachable
+    assert hosts["broken"].closed
+    pool.close(statuses.values())
+
+    assert pool.acquire(show=False).config.get("ssh", "host") == "fine"
+
+
+def test_probe_connections_are_closed_when_acquire_fails(farm, monkeypatch):
+    hosts = {"a": FakeSSH(), "b": FakeSSH(load="2.0")}
+    pool = farm(hosts)
+    monkeypatch.setattr(pool, "print_statuses", lambda *args: 1 / 0)
+
+    with pytest.raises(ZeroDivisionError):
+        pool.acquire()
+
+    assert all(fake.closed for fake in hosts.values())
+    assert pool._reserved == set()
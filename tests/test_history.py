@@ -0,0 +1,142 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import build_server as bs
+from build_server import BuildHistory, history_report, percentile
+
+NOW = datetime.now(timezone.utc)
+
+
+@pytest.fixture
+def history(tmp_path):
+    return BuildHistory(str(tmp_path / "history" / "builds.sqlite3"))
+
+
+def add_builds(history, archive_seconds, branch="main", host="mac1", start=NOW - timedelta(days=1), **kwargs):
+    """One successful build per Archive duration, a minute apart, with a cached Install deps step"""
+    for n, seconds in enumerate(archive_seconds):
+        history.record(start + timedelta(minutes=n), 60.0 + seconds, "succeeded", host, branch,
+                       project="Ksign", artifact_size=50 * 1024 * 1024 + n,
+                       phases=[("Building", "phase", 10.0 + seconds, False),
+                               ("Install deps", "step", 0.0, True),
+                               ("Archive", "step", seconds, False)], **kwargs)
+
+
+@pytest.mark.parametrize("fraction, expected", [(0, 1), (0.5, 2.5), (0.9, 3.7), (0.95, 3.85), (1, 4)])
+def test_percentile_interpolates(fraction, expected):
+    assert percentile([4, 1, 3, 2], fraction) == pytest.approx(expected)
+
+
+def test_percentile_of_one_value():
+    assert percentile([7.5], 0.9) == 7.5
+
+
+class TestBuildHistory:
+    def test_round_trip_with_phases(self, history):
+        build_id = history.record(NOW, 123.4, "succeeded", "mac1", "main", project="Ksign", artifact_size=42,
+                                  result_cache="abc123", phases=[("Building", "phase", 100.0, False),
+                                                                 ("Archive", "step", 90.0, False)])
+        [build] = history.builds()
+        assert build["id"] == build_id
+        assert (build["outcome"], build["duration"], build["artifact_size"], build["result_cache"]) == (
+            "succeeded", 123.4, 42, "abc123")
+        assert [(phase["name"], phase["kind"], phase["duration"], phase["cached"]) for phase in build["phases"]] == [
+            ("Building", "phase", 100.0, 0), ("Archive", "step", 90.0, 0)]
+
+    def test_filters(self, history):
+        history.record(NOW - timedelta(days=10), 1, "succeeded", "mac1", "main", phases=[("Old", "phase", 1, False)])
+        history.record(NOW - timedelta(days=1), 2, "failed", "mac2", "main", phases=[("Host", "phase", 1, False)])
+        history.record(NOW, 3, "succeeded", "mac1", "release", phases=[("Branch", "phase", 1, False)])
+
+        assert [b["duration"] for b in history.builds()] == [1, 2, 3]
+        assert [b["duration"] for b in history.builds(branch="main")] == [1, 2]
+        assert [b["duration"] for b in history.builds(host="mac1")] == [1, 3]
+        recent = history.builds(branch="main", since=NOW - timedelta(days=3))
+        assert [(b["duration"], [p["name"] for p in b["phases"]]) for b in recent] == [(2, ["Host"])]
+
+    def test_without_a_path_nothing_is_recorded(self):
+        assert BuildHistory().record(NOW, 1, "failed", "mac1", "main") is None
+        assert BuildHistory().builds() == []
+
+    def test_unwritable_history_does_not_fail_the_build(self, history, monkeypatch, capsys):
+        def broken(self):
+            raise sqlite3.OperationalError("database is locked")
+
+        monkeypatch.setattr(BuildHistory, "_connect", broken)
+        assert history.record(NOW, 1, "failed", "mac1", "main") is None
+        assert "database is locked" in capsys.readouterr().out
+
+    def test_build_artifact_records_its_phases(self, config, monkeypatch):
+        bs.HISTORY.open(config.get("output", "local_dir") + "/history.sqlite3")
+        client = bs.SSHBuildClient(config)
+
+        def cancelled(progress):
+            progress.set_phase("Building")
+            progress.set_step("Archive", "running")
+            progress.set_step("Archive", "done")
+            raise bs.BuildCancelled()
+
+        monkeypatch.setattr(client, "_build_artifact", cancelled)
+        with pytest.raises(bs.BuildCancelled):
+            client.build_artifact()
+        [build] = bs.HISTORY.builds()
+        assert build["outcome"] == "cancelled"
+        assert build["branch"] == config.get("build", "branch")
+        assert [(phase["name"], phase["kind"]) for phase in build["phases"]] == [("Archive", "step"), ("Building", "phase")]
+
+
+class TestReport:
+    def test_empty_history(self, history, capsys):
+        assert not history_report(history)
+        assert "No builds recorded" in capsys.readouterr().out
+
+    def test_stable_timings_are_not_a_regression(self, history, capsys):
+        add_builds(history, [100, 104, 98, 102, 101])
+        assert not history_report(history)
+        out = capsys.readouterr().out
+        assert "main @ mac1" in out and "5 builds" in out
+        assert "regression" not in out
+        # Cached steps took no time and are left out of the percentiles
+        assert "Install deps" not in out
+
+    def test_slow_latest_run_is_a_regression(self, history, capsys):
+        add_builds(history, [100, 104, 98, 102, 140])
+        assert history_report(history)
+        archive = next(line for line in capsys.readouterr().out.splitlines() if "Archive" in line)
+        assert "regression (+39%)" in archive
+
+    def test_small_absolute_slowdowns_are_ignored(self, history):
+        # +50%, but only 2s
+        add_builds(history, [4, 4, 4, 6])
+        assert not history_report(history)
+
+    def test_baseline_is_the_recent_window(self, history):
+        # Old builds were slow; the latest run is slow only compared to the last BASELINE_WINDOW
+        add_builds(history, [300] * 5 + [100] * bs.BASELINE_WINDOW + [140])
+        assert history_report(history)
+
+    def test_groups_by_branch_and_host(self, history, capsys):
+        add_builds(history, [100, 140], host="mac1")
+        add_builds(history, [100, 100], host="mac2")
+        assert not history_report(history, host="mac2")
+        out = capsys.readouterr().out
+        assert "main @ mac2" in out and "main @ mac1" not in out
+        assert history_report(history, branch="main")
+
+    def test_failed_and_cached_builds_are_not_timed(self, history, capsys):
+        add_builds(history, [100, 100, 100])
+        history.record(NOW, 500.0, "failed", "mac1", "main", phases=[("Archive", "step", 400.0, False)])
+        history.record(NOW, 5.0, "succeeded", "mac1", "main", result_cache="abc123")
+        assert not history_report(history)
+        out = capsys.readouterr().out
+        assert "5 builds, 1 not successful, 1 from the result cache" in out
+        total = next(line for line in out.splitlines() if line.strip().startswith("Total"))
+        assert total.split()[1] == "3"
+
+    def test_days_limits_the_report(self, history, capsys):
+        add_builds(history, [100, 100], start=NOW - timedelta(days=30))
+        add_builds(history, [140], start=NOW - timedelta(hours=1))
+        assert history_report(history)
+        assert not history_report(history, days=7)
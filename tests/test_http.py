@@ -0,0 +1,331 @@
+import hashlib
+import http.client
+import json
+import os
+import plistlib
+import socket
+import time
+import zipfile
+
+import pytest
+
+import build_and_serve
+import build_server as bs
+
+
+def request(server, path, headers=None, method="GET"):
+    connection = http.client.HTTPConnection("127.0.0.1", server.server.server_address[1], timeout=5)
+    try:
+        connection.request(method, path, headers=headers or {})
+        response = connection.getresponse()
+        return response, response.read()
+    finally:
+        connection.close()
+
+
+class TestParseRangeHeader:
+    @pytest.mark.parametrize("header, expected", [
+        ("bytes=0-9", [(0, 9)]),
+        ("bytes=90-", [(90, 99)]),
+        ("bytes=-10", [(90, 99)]),
+        ("bytes=-1000", [(0, 99)]),
+        ("bytes=95-1000", [(95, 99)]),
+        ("bytes=0-0, 10-19", [(0, 0), (10, 19)]),
+        ("BYTES = 0-9", [(0, 9)]),
+    ])
+    def test_satisfiable(self, header, expected):
+        assert bs.parse_range_header(header, 100) == expected
+
+    @pytest.mark.parametrize("header", ["bytes=100-", "bytes=-0", "bytes=200-300, -0"])
+    def test_unsatisfiable(self, header):
+        assert bs.parse_range_header(header, 100) == []
+
+    @pytest.mark.parametrize("header", ["bytes=-5", "bytes=0-", "bytes=0-0"])
+    def test_nothing_of_an_empty_file_is_satisfiable(self, header):
+        assert bs.parse_range_header(header, 0) == []
+
+    @pytest.mark.parametrize("header", [
+        "items=0-9", "bytes=", "bytes=5", "bytes=9-0", "bytes=-", "bytes=a-b",
+        "bytes=²-", "bytes=0-²", "bytes=-٣", "bytes=+1-2",
+        "bytes=" + ",".join(["0-0"] * (bs.MAX_RANGES + 1)),
+    ])
+    def test_ignored(self, header):
+        assert bs.parse_range_header(header, 100) is None
+
+    def test_build_and_serve_uses_the_same_parser(self):
+        assert build_and_serve.parse_range_header is bs.parse_range_header
+
+
+class TestRangeRequests:
+    @pytest.fixture
+    def ipa(self, tmp_path, server):
+        path = tmp_path / "Ksign.ipa"
+        path.write_bytes(bytes(range(256)) * 40)
+        server.set_ipa(str(path))
+        return path
+
+    def test_single_range(self, server, ipa):
+        response, body = request(server, "/download", {"Range": "bytes=10-19"})
+        assert response.status == 206
+        assert response.getheader("Content-Range") == f"bytes 10-19/{ipa.stat().st_size}"
+        assert body == ipa.read_bytes()[10:20]
+
+    def test_multiple_ranges(self, server, ipa):
+        response, body = request(server, "/download", {"Range": "bytes=0-1, -2"})
+        assert response.status == 206
+        assert response.getheader("Content-Type").startswith("multipart/byteranges; boundary=")
+        assert int(response.getheader("Content-Length")) == len(body)
+        assert b"Content-Range: bytes 0-1/" in body and b"Content-Range: bytes 10238-10239/" in body
+
+    def test_non_ascii_digits_are_ignored(self, server, ipa):
+        response, body = request(server, "/download", {"Range": "bytes=²-"})
+        assert response.status == 200
+        assert body == ipa.read_bytes()
+
+    def test_empty_file_is_not_satisfiable(self, server, ipa):
+        ipa.write_bytes(b"")
+        response, body = request(server, "/download", {"Range": "bytes=-5"})
+        assert response.status == 416
+        assert response.getheader("Content-Range") == "bytes */0"
+
+    def test_stale_if_range_sends_the_whole_file(self, server, ipa):
+        response, body = request(server, "/download", {"Range": "bytes=0-9", "If-Range": '"stale"'})
+        assert response.status == 200
+        assert len(body) == ipa.stat().st_size
+
+
+class TestConditionalRequests:
+    @pytest.fixture
+    def ipa(self, tmp_path, server):
+        path = tmp_path / "Ksign.ipa"
+        path.write_bytes(b"ipa" * 1000)
+        server.set_ipa(str(path))
+        return path
+
+    def test_download_etag_is_the_sha256(self, server, ipa):
+        response, _ = request(server, "/download")
+        etag = response.getheader("ETag")
+        assert etag == f'"{hashlib.sha256(ipa.read_bytes()).hexdigest()}"'
+        response, body = request(server, "/download", {"If-None-Match": f"W/{etag}"})
+        assert response.status == 304 and body == b""
+
+    def test_if_modified_since(self, server, ipa):
+        response, _ = request(server, "/download")
+        last_modified = response.getheader("Last-Modified")
+        assert request(server, "/download", {"If-Modified-Since": last_modified})[0].status == 304
+        assert request(server, "/download", {"If-Modified-Since": "Thu, 01 Jan 2015 00:00:00 GMT"})[0].status == 200
+        assert request(server, "/download", {"If-Modified-Since": "yesterday"})[0].status == 200
+
+    def test_if_none_match_takes_precedence(self, server, ipa):
+        response, _ = request(server, "/download")
+        headers = {"If-None-Match": '"other"', "If-Modified-Since": response.getheader("Last-Modified")}
+        assert request(server, "/download", headers)[0].status == 200
+        assert request(server, "/download", {"If-None-Match": f'"other", {response.getheader("ETag")}'})[0].status == 304
+        assert request(server, "/download", {"If-None-Match": "*"})[0].status == 304
+
+    def test_head_matches_get_without_a_body(self, server, ipa):
+        get, _ = request(server, "/download")
+        head, body = request(server, "/download", method="HEAD")
+        assert body == b""
+        assert head.getheader("ETag") == get.getheader("ETag")
+        assert head.getheader("Content-Length") == str(ipa.stat().st_size)
+
+    def test_page_etag_per_encoding(self, server, ipa):
+        plain, _ = request(server, "/")
+        gzipped, _ = request(server, "/", {"Accept-Encoding": "gzip"})
+        assert plain.getheader("ETag") != gzipped.getheader("ETag")
+        response, body = request(server, "/", {"Accept-Encoding": "gzip", "If-None-Match": gzipped.getheader("ETag")})
+        assert response.status == 304 and body == b""
+        assert request(server, "/", {"If-None-Match": gzipped.getheader("ETag")})[0].status == 200
+
+    def test_status_etag_follows_the_manifest(self, server, ipa):
+        response, body = request(server, "/status")
+        etag = response.getheader("ETag")
+        assert etag == f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        assert json.loads(body)["sha256"] is None
+        assert request(server, "/status", {"If-None-Match": etag})[0].status == 304
+
+        # Recording the digests doesn't touch the IPA itself
+        digest = hashlib.sha256(ipa.read_bytes()).hexdigest()
+        bs.write_artifact_manifest(str(ipa), digest, digest)
+        response, body = request(server, "/status", {"If-None-Match": etag})
+        assert response.status == 200
+        assert response.getheader("ETag") != etag
+        assert json.loads(body)["verified"] is True
+
+
+class TestCatalogRoutes:
+    @pytest.fixture
+    def catalog(self, tmp_path, server):
+        directory = tmp_path / "builds"
+        directory.mkdir()
+        (directory / "Ksign-1a2b.ipa").write_bytes(b"first")
+        (directory / "Ksign-3c4d.ipa").write_bytes(b"second")
+        bs.IPAHandler.catalog = bs.ArtifactCatalog(str(directory))
+        return bs.IPAHandler.catalog
+
+    def test_listing(self, server, catalog):
+        response, body = request(server, "/builds")
+        assert response.status == 200
+        assert b"Ksign-1a2b" in body and b"Ksign-3c4d" in body
+
+    def test_build_download(self, server, catalog):
+        response, body = request(server, "/builds/Ksign-3c4d")
+        assert response.status == 200 and body == b"second"
+        assert request(server, "/builds/missing")[0].status == 404
+
+    def test_prefix_is_not_a_catalog_route(self, server, catalog):
+        response, body = request(server, "/buildsX")
+        assert response.status == 200
+        assert response.getheader("Content-Type").startswith("text/html")
+        assert b"Ksign-1a2b" not in body
+
+
+class TestAcceptEncoding:
+    @pytest.mark.parametrize("header, expected", [
+        ("", False),
+        ("gzip", True),
+        ("gzip, deflate, br", True),
+        ("GZIP;Q=0.5", True),
+        ("br;q=1.0, gzip;q=0.8", True),
+        ("*", True),
+        ("gzip;q=0", False),
+        ("*;q=1, gzip;q=0", False),
+        ("gzip;q=0, *", False),
+        ("gzip;q=0.5, *;q=0", True),
+        ("identity, *;q=0", False),
+        ("gzip;q=bogus", False),
+        ("deflate", False),
+    ])
+    def test_accepts_gzip(self, header, expected):
+        assert bs.accepts_gzip(header) is expected
+
+    def test_refused_gzip_gets_identity(self, server):
+        response, body = request(server, "/status", {"Accept-Encoding": "*;q=1, gzip;q=0"})
+        assert response.getheader("Content-Encoding") is None
+        assert json.loads(body)["status"] == "no_build"
+
+        response, body = request(server, "/status", {"Accept-Encoding": "gzip"})
+        assert response.getheader("Content-Encoding") == "gzip"
+        assert response.getheader("Vary") == "Accept-Encoding"
+
+
+class TestTimeouts:
+    @pytest.fixture
+    def big_ipa(self, tmp_path, server):
+        path = tmp_path / "Ksign.ipa"
+        path.write_bytes(os.urandom(8 * 1024 * 1024))
+        server.set_ipa(str(path))
+        bs.IPAHandler.timeout = 0.3
+        bs.IPAHandler.write_timeout = 5
+        return path
+
+    def connect(self, server):
+        sock = socket.create_connection(("127.0.0.1", server.server.server_address[1]), timeout=5)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 64 * 1024)
+        return sock
+
+    def test_idle_connection_is_closed(self, server, big_ipa):
+        with self.connect(server) as sock:
+            time.sleep(0.8)
+            assert sock.recv(1) == b""
+
+    def test_slow_reader_gets_the_whole_download(self, server, big_ipa):
+        with self.connect(server) as sock:
+            sock.sendall(b"GET /download HTTP/1.1\r\nHost: test\r\n\r\n")
+            # Stall for longer than the idle timeout while the server's send buffer is full
+            time.sleep(1)
+            received = b""
+            while True:
+                data = sock.recv(1024 * 1024)
+                if not data:
+                    break
+                received += data
+                head, _, body = received.partition(b"\r\n\r\n")
+                if body and len(body) >= big_ipa.stat().st_size:
+                    break
+            assert head.startswith(b"HTTP/1.1 200")
+            assert body == big_ipa.read_bytes()
+
+
+class TestConnectionLimits:
+    @pytest.fixture
+    def limited(self, server, tmp_path):
+        # `server` restores IPAHandler's settings afterwards
+        path = tmp_path / "Ksign.ipa"
+        path.write_bytes(b"ipa")
+        limited = bs.BuildServer(0, max_connections=2, priority_reserve=1)
+        limited.start(str(path))
+        yield limited
+        limited.stop()
+
+    def test_connections_beyond_the_limit_are_refused(self, limited):
+        address = ("127.0.0.1", limited.server.server_address[1])
+        held = [socket.create_connection(address, timeout=5) for _ in range(2)]
+        try:
+            deadline = time.monotonic() + 5
+            while limited.server.active_connections < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            with socket.create_connection(address, timeout=5) as extra:
+                assert extra.recv(1024).startswith(b"HTTP/1.1 503 Service Unavailable\r\n")
+            assert bs.METRICS.connections_rejected == 1
+        finally:
+            for sock in held:
+                sock.close()
+
+        deadline = time.monotonic() + 5
+        while limited.server.active_connections and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert request(limited, "/status")[0].status == 200
+
+    def test_reserved_connections_stay_free_for_pages(self, limited):
+        # One download slot: max_connections minus priority_reserve
+        assert bs.IPAHandler.download_slots.acquire(blocking=False)
+        try:
+            response, _ = request(limited, "/download")
+            assert response.status == 503
+            assert response.getheader("Retry-After") == "5"
+            assert request(limited, "/status")[0].status == 200
+        finally:
+            bs.IPAHandler.download_slots.release()
+        assert request(limited, "/download")[1] == b"ipa"
+
+
+class TestArtifactCache:
+    @pytest.fixture
+    def ipa(self, tmp_path, server):
+        path = tmp_path / "Ksign.ipa"
+        info = {"CFBundleName": "Ksign", "CFBundleIdentifier": "nya.asami.ksign",
+                "CFBundleShortVersionString": "1.4", "CFBundleVersion": "42"}
+        with zipfile.ZipFile(path, "w") as archive:
+            archive.writestr("Payload/Ksign.app/Info.plist", plistlib.dumps(info))
+        server.set_ipa(str(path))
+        return path
+
+    def test_state_is_reused_until_the_ipa_changes(self, ipa, monkeypatch):
+        first = bs.ARTIFACTS.current()
+        assert bs.ARTIFACTS.current() is first
+
+        renders = []
+        monkeypatch.setattr(bs, "render_landing_page", lambda *args: renders.append(args) or "page")
+        assert bs.ARTIFACTS.current() is first and not renders
+
+        os.utime(ipa, ns=(ipa.stat().st_atime_ns, ipa.stat().st_mtime_ns + 10**9))
+        assert bs.ARTIFACTS.current() is not first
+        assert len(renders) == 1
+
+    def test_page_and_status_show_the_metadata(self, server, ipa):
+        response, body = request(server, "/")
+        assert response.getheader("Content-Type") == "text/html; charset=utf-8"
+        assert b"1.4 (42)" in body and b"nya.asami.ksign" in body
+
+        status = json.loads(request(server, "/status")[1])
+        assert status["ipa_name"] == "Ksign.ipa"
+        assert status["ipa_size"] == ipa.stat().st_size
+        assert status["app"]["bundle_id"] == "nya.asami.ksign"
+
+    def test_missing_ipa(self, server, tmp_path):
+        server.set_ipa(str(tmp_path / "gone.ipa"))
+        status = json.loads(request(server, "/status")[1])
+        assert status["status"] == "ready" and status["ipa_available"] is False
+        assert b"Waiting" in request(server, "/")[1]
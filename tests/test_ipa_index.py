@@ -0,0 +1,84 @@
+import plistlib
+import zipfile
+
+import pytest
+
+import build_server as bs
+
+INFO = {
+    "CFBundleDisplayName": "EthSign",
+    "CFBundleName": "EthSignApp",
+    "CFBundleIdentifier": "xyz.ethsign.app",
+    "CFBundleShortVersionString": "2.1",
+    "CFBundleVersion": "310",
+    "MinimumOSVersion": "15.0",
+}
+
+
+def write_ipa(path, info=INFO, compression=zipfile.ZIP_DEFLATED, plist_format=plistlib.FMT_XML):
+    with zipfile.ZipFile(path, "w", compression) as archive:
+        archive.writestr("Payload/EthSign.app/Info.plist", plistlib.dumps(info, fmt=plist_format))
+        archive.writestr("Payload/EthSign.app/EthSign", b"\0" * 4096)
+        archive.writestr("Payload/EthSign.app/Frameworks/Pods.framework/Info.plist", plistlib.dumps({"CFBundleName": "Pods"}))
+    return str(path)
+
+
+@pytest.fixture
+def index(tmp_path):
+    return bs.IPAIndex(str(tmp_path / "index.json"))
+
+
+def test_reads_app_metadata(index, tmp_path):
+    metadata = index.lookup(write_ipa(tmp_path / "EthSign.ipa", plist_format=plistlib.FMT_BINARY))
+    assert metadata == {"name": "EthSign", "bundle_id": "xyz.ethsign.app", "version": "2.1",
+                        "build": "310", "min_ios": "15.0"}
+
+
+def test_fingerprint_ignores_compression(index, tmp_path):
+    deflated = write_ipa(tmp_path / "deflated.ipa")
+    stored = write_ipa(tmp_path / "stored.ipa", compression=zipfile.ZIP_STORED)
+    changed = write_ipa(tmp_path / "changed.ipa", dict(INFO, CFBundleVersion="311"))
+    assert index.fingerprint(deflated) == index.fingerprint(stored)
+    assert index.fingerprint(deflated) != index.fingerprint(changed)
+    assert index.find(index.fingerprint(changed)) == str(tmp_path / "changed.ipa")
+
+
+def test_known_files_are_not_reopened(index, tmp_path, monkeypatch):
+    path = write_ipa(tmp_path / "EthSign.ipa")
+    expected = index.lookup(path)
+
+    def no_zip(*args, **kwargs):
+        raise AssertionError("archive reopened")
+
+    monkeypatch.setattr(bs.zipfile, "ZipFile", no_zip)
+    assert index.lookup(path) == expected
+    # The index on disk maps the file too
+    assert bs.IPAIndex(index.index_path).lookup(path) == expected
+
+
+def test_changed_file_is_read_again(index, tmp_path):
+    path = write_ipa(tmp_path / "EthSign.ipa")
+    assert index.lookup(path)["build"] == "310"
+    write_ipa(tmp_path / "EthSign.ipa", dict(INFO, CFBundleVersion="311", CFBundleDisplayName="EthSign Beta"))
+    assert index.lookup(path)["build"] == "311"
+
+
+@pytest.mark.parametrize("content", [b"not a zip", b""])
+def test_unreadable_files(index, tmp_path, content):
+    path = tmp_path / "broken.ipa"
+    path.write_bytes(content)
+    assert index.lookup(str(path)) == {}
+    assert index.fingerprint(str(path)) is None
+
+
+def test_info_plist_that_is_not_a_dictionary(index, tmp_path):
+    path = tmp_path / "odd.ipa"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("Payload/Odd.app/Info.plist", plistlib.dumps(["not", "a", "dict"]))
+    assert index.lookup(str(path)) == {}
+
+
+def test_outdated_index_is_discarded(tmp_path):
+    index_path = tmp_path / "index.json"
+    index_path.write_text('{"format": 1, "digests": {"x": {}}, "files": {}}')
+    assert bs.IPAIndex(str(index_path))._digests == {}
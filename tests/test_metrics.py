@@ -0,0 +1,101 @@
+import http.client
+import os
+import socket
+import time
+
+import pytest
+
+import build_server as bs
+
+
+def wait_for(condition, timeout=5):
+    """Handlers record a request after its response went out; poll for that to happen"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+def get(server, path):
+    connection = http.client.HTTPConnection("127.0.0.1", server.server.server_address[1], timeout=5)
+    try:
+        connection.request("GET", path)
+        response = connection.getresponse()
+        return response, response.read()
+    finally:
+        connection.close()
+
+
+def samples(text):
+    return dict(line.rsplit(" ", 1) for line in text.splitlines() if line and not line.startswith("#"))
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = bs.Histogram((0.1, 1, 10))
+    for value in (0.05, 0.1, 0.5, 5, 50):
+        histogram.observe(value)
+    assert histogram.render("latency", 'route="page"') == [
+        'latency_bucket{route="page",le="0.1"} 2',
+        'latency_bucket{route="page",le="1"} 3',
+        'latency_bucket{route="page",le="10"} 4',
+        'latency_bucket{route="page",le="+Inf"} 5',
+        'latency_sum{route="page"} 55.650000',
+        'latency_count{route="page"} 5',
+    ]
+
+
+def test_render_counts():
+    metrics = bs.ServerMetrics()
+    metrics.observe_request("download", 200, 0.2)
+    metrics.observe_request("download", 200, 0.3)
+    metrics.observe_request("status", 304, 0.001)
+    metrics.add_bytes(4096)
+    metrics.download_finished(4096, 0.5)
+    metrics.download_aborted()
+    metrics.connection_rejected()
+
+    values = samples(metrics.render(active_connections=3))
+    assert values['ethsign_http_requests_total{route="download",code="200"}'] == "2"
+    assert values['ethsign_http_requests_total{route="status",code="304"}'] == "1"
+    assert values['ethsign_http_request_duration_seconds_count{route="download"}'] == "2"
+    assert values["ethsign_bytes_served_total"] == "4096"
+    assert values["ethsign_active_connections"] == "3"
+    assert values["ethsign_downloads_completed_total"] == "1"
+    assert values["ethsign_downloads_aborted_total"] == "1"
+    assert values["ethsign_connections_rejected_total"] == "1"
+    assert values['ethsign_download_throughput_bytes_per_second_bucket{le="262144"}'] == "1"
+
+
+@pytest.fixture
+def ipa(tmp_path, server):
+    path = tmp_path / "Ksign.ipa"
+    path.write_bytes(os.urandom(64 * 1024))
+    server.set_ipa(str(path))
+    return path
+
+
+def test_endpoint_reports_served_downloads(server, ipa):
+    assert get(server, "/download")[0].status == 200
+    assert get(server, "/nothing")[0].status == 200
+    wait_for(lambda: bs.METRICS.requests.get(("page", 200)) and bs.METRICS.requests.get(("download", 200)))
+    wait_for(lambda: server.server.active_connections == 0)
+
+    response, body = get(server, "/metrics")
+    assert response.getheader("Content-Type").startswith("text/plain; version=0.0.4")
+    values = samples(body.decode())
+    assert values['ethsign_http_requests_total{route="download",code="200"}'] == "1"
+    assert values['ethsign_http_requests_total{route="page",code="200"}'] == "1"
+    assert values["ethsign_bytes_served_total"] == str(ipa.stat().st_size)
+    assert values["ethsign_downloads_completed_total"] == "1"
+    assert values["ethsign_active_connections"] == "1"
+
+
+def test_abandoned_download_is_counted(server, tmp_path):
+    path = tmp_path / "Big.ipa"
+    path.write_bytes(os.urandom(16 * 1024 * 1024))
+    server.set_ipa(str(path))
+    with socket.create_connection(("127.0.0.1", server.server.server_address[1]), timeout=5) as sock:
+        sock.sendall(b"GET /download HTTP/1.1\r\nHost: test\r\n\r\n")
+        assert sock.recv(1024).startswith(b"HTTP/1.1 200")
+    wait_for(lambda: bs.METRICS.downloads_aborted == 1)
+    assert bs.METRICS.downloads_completed == 0
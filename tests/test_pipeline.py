@@ -0,0 +1,91 @@
+import pytest
+
+import build_server as bs
+from build_server import BuildStep, StepPipeline
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    workdir = tmp_path / "workspace"
+    (workdir / ".git").mkdir(parents=True)
+    (workdir / "Podfile.lock").write_text("PODS: v1\n")
+    return workdir
+
+
+@pytest.fixture
+def client(config, local_exec):
+    """A client whose remote commands run in the local bash"""
+    client = bs.SSHBuildClient(config)
+    client.client = local_exec()
+    return client
+
+
+def steps(command_suffix=""):
+    """deps reads Podfile.lock and writes deps/; build needs deps and reads it; lint has no inputs"""
+    return [
+        BuildStep("Install deps", f"echo deps >> runs.log && mkdir -p deps && cp Podfile.lock deps/{command_suffix}",
+                  inputs="cat Podfile.lock", outputs=("deps",)),
+        BuildStep("Build", "echo build >> runs.log && cat deps/Podfile.lock > build.out",
+                  needs=("Install deps",), inputs="cat deps/Podfile.lock", outputs=("build.out",)),
+        BuildStep("Lint", "echo lint >> runs.log"),
+    ]
+
+
+def run(client, workspace, pipeline_steps=None):
+    """Run the pipeline and return the steps that ran, in order"""
+    log = workspace / "runs.log"
+    log.write_text("")
+    assert StepPipeline(client, str(workspace), pipeline_steps or steps()).run()
+    return log.read_text().split()
+
+
+def test_unchanged_steps_are_skipped(client, workspace):
+    assert sorted(run(client, workspace)) == ["build", "deps", "lint"]
+    assert run(client, workspace) == ["lint"]
+    assert client.progress.steps["Build"] == "skipped"
+    assert (workspace / ".git" / "ethsign-stamps" / "install-deps").exists()
+
+
+def test_changed_input_reruns_the_step_and_what_reads_its_output(client, workspace):
+    run(client, workspace)
+    (workspace / "Podfile.lock").write_text("PODS: v2\n")
+    assert sorted(run(client, workspace)) == ["build", "deps", "lint"]
+    assert (workspace / "build.out").read_text() == "PODS: v2\n"
+
+
+def test_changed_command_reruns_the_step(client, workspace):
+    run(client, workspace)
+    assert sorted(run(client, workspace, steps(" && true"))) == ["deps", "lint"]
+
+
+def test_missing_output_reruns_the_step(client, workspace):
+    run(client, workspace)
+    (workspace / "build.out").unlink()
+    assert sorted(run(client, workspace)) == ["build", "lint"]
+
+
+def test_failure_skips_dependents_and_writes_no_stamp(client, workspace, capsys):
+    failing = steps()
+    failing[0].command = "echo deps >> runs.log && exit 7"
+    (workspace / "runs.log").write_text("")
+
+    assert not StepPipeline(client, str(workspace), failing).run()
+    assert "build" not in (workspace / "runs.log").read_text()
+    assert client.progress.steps["Install deps"] == "failed"
+    assert client.progress.steps["Build"] == "skipped"
+    assert "skipped after Install deps failed" in capsys.readouterr().out
+    assert not (workspace / ".git" / "ethsign-stamps" / "install-deps").exists()
+
+
+def test_allowed_failure_continues(client, workspace):
+    tolerant = steps()
+    tolerant[2].command = "echo lint >> runs.log && exit 1"
+    tolerant[2].allow_failure = True
+    assert sorted(run(client, workspace, tolerant)) == ["build", "deps", "lint"]
+
+
+def test_independent_steps_run_concurrently(client, workspace):
+    # The first step only succeeds if the second one is running at the same time
+    waiting = BuildStep("Wait", "for i in $(seq 100); do [ -e started ] && exit 0; sleep 0.05; done; exit 1")
+    signal = BuildStep("Signal", "touch started")
+    assert StepPipeline(client, str(workspace), [waiting, signal]).run()
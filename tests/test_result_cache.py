@@ -0,0 +1,128 @@
+import os
+
+import pytest
+
+import build_server as bs
+
+SHA = "ab" * 32
+
+
+@pytest.fixture
+def client(remote_client):
+    remote_client.config.set("", "build", "cache_dir")
+    return remote_client
+
+
+def make_ipa(client, data: bytes, mtime: int = None) -> str:
+    path = client.local_ipa_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Builds arrive as a new file, never by writing through the cache's hard link
+    with open(f"{path}.part", "wb") as f:
+        f.write(data)
+    os.replace(f"{path}.part", path)
+    if mtime:
+        os.utime(path, (mtime, mtime))
+    bs.write_artifact_manifest(path, bs.hash_file(path))
+    return path
+
+
+class TestBuildKey:
+    STATUS = "3f2a9c\n+1111111 Library (v1.0)\n 2222222 Vendor/Pods (heads/main)\n"
+
+    def key(self, client, output, project="Ksign"):
+        client.config.set(project, "build", "project_name")
+        client.shell.rules[:] = [("git rev-parse HEAD", 0, output)]
+        return client.build_key()
+
+    def test_stable_and_content_addressed(self, client):
+        key = self.key(client, self.STATUS)
+        assert len(key) == 64
+        # Submodule order and the checked-out flag don't matter
+        assert self.key(client, "3f2a9c\n-2222222 Vendor/Pods\n 1111111 Library (v1.0)\n") == key
+        assert self.key(client, self.STATUS.replace("3f2a9c", "3f2a9d")) != key
+        assert self.key(client, self.STATUS.replace("2222222", "2222223")) != key
+        assert self.key(client, self.STATUS, project="EthSign") != key
+
+    def test_unreadable_workspace(self, client):
+        client.shell.rules[:] = [("git rev-parse HEAD", 128, "fatal: not a git repository")]
+        assert client.build_key() is None
+
+
+class TestLocalCache:
+    def test_store_and_fetch(self, client):
+        path = make_ipa(client, b"build one")
+        client.store_build_result(SHA, path)
+        os.remove(path)
+        os.remove(f"{path}{bs.MANIFEST_SUFFIX}")
+
+        assert client.fetch_cached_ipa(SHA) == os.path.abspath(path)
+        assert client.result_cache_hit == "local"
+        with open(path, "rb") as f:
+            assert f.read() == b"build one"
+        assert bs.read_artifact_manifest(path)["sha256"] == bs.hash_file(path)
+        assert not client.shell.commands
+
+    def test_fetch_replaces_a_different_ipa(self, client):
+        client.store_build_result(SHA, make_ipa(client, b"cached"))
+        path = make_ipa(client, b"newer local build")
+        assert client.fetch_cached_ipa(SHA) == os.path.abspath(path)
+        with open(path, "rb") as f:
+            assert f.read() == b"cached"
+        assert not os.path.exists(f"{path}.part")
+
+    def test_miss(self, client):
+        assert client.fetch_cached_ipa(SHA) is None
+        assert not client.shell.commands
+
+    def test_keeps_the_newest_results(self, client, monkeypatch):
+        monkeypatch.setattr(bs.SSHBuildClient, "RESULT_CACHE_SIZE", 2)
+        for n, key in enumerate(("a" * 64, "b" * 64, "c" * 64)):
+            client.store_build_result(key, make_ipa(client, f"build {n}".encode(), mtime=1_700_000_000 + n))
+            os.remove(client.local_ipa_path())
+        cache = os.path.join(client.config.get("output", "local_dir"), "cache")
+        assert sorted(os.listdir(cache)) == sorted(
+            f"{key}.ipa{suffix}" for key in ("b" * 64, "c" * 64) for suffix in ("", bs.MANIFEST_SUFFIX))
+
+
+class TestRemoteCache:
+    @pytest.fixture
+    def client(self, client):
+        client.config.set("/Users/ci/cache", "build", "cache_dir")
+        return client
+
+    def test_remote_hit_is_downloaded_and_kept_locally(self, client, monkeypatch):
+        client.shell.rules.append(("shasum -a 256", 0, f"{SHA}  /Users/ci/cache/results/Ksign-{SHA}.ipa\n"))
+        downloads = []
+
+        def download_ipa(remote_path=None, remote_sha256=None):
+            downloads.append((remote_path, remote_sha256))
+            return make_ipa(client, b"from the build host")
+
+        monkeypatch.setattr(client, "download_ipa", download_ipa)
+        path = client.fetch_cached_ipa(SHA)
+        assert downloads == [(f"/Users/ci/cache/results/Ksign-{SHA}.ipa", SHA)]
+        assert client.result_cache_hit == "remote"
+
+        # The next lookup is a local hit
+        os.remove(path)
+        client.shell.commands.clear()
+        assert client.fetch_cached_ipa(SHA)
+        assert client.result_cache_hit == "local" and not client.shell.commands
+
+    def test_remote_miss(self, client):
+        client.shell.rules.append(("shasum -a 256", 1, "No such file or directory"))
+        assert client.fetch_cached_ipa(SHA) is None
+
+    def test_store_copies_the_package_on_the_build_host(self, client):
+        client.store_build_result(SHA, make_ipa(client, b"fresh"))
+        [command] = client.shell.commands
+        target_dir = client.config.get("build", "target_dir")
+        assert f"cp -c {target_dir}/packages/Ksign.ipa /Users/ci/cache/results/Ksign-{SHA}.ipa" in command
+        assert f"tail -n +{bs.SSHBuildClient.RESULT_CACHE_SIZE + 1}" in command
+
+    def test_streamed_build_is_cached_locally_only(self, client):
+        client.config.set("stream", "transfer", "packaging")
+        client.config.set(False, "transfer", "keep_remote_package")
+        client.store_build_result(SHA, make_ipa(client, b"streamed"))
+        assert not client.shell.commands
+        assert os.path.isfile(os.path.join(client.config.get("output", "local_dir"), "cache", f"{SHA}.ipa"))
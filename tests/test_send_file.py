@@ -0,0 +1,110 @@
+import errno
+import io
+import os
+import socket
+import threading
+
+import pytest
+
+import build_server as bs
+
+DATA = os.urandom(300 * 1024)
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "Ksign.ipa"
+    path.write_bytes(DATA)
+    with open(path, "rb") as f:
+        yield f
+
+
+@pytest.fixture
+def pair():
+    """A connected socket pair; everything written to the first is collected from the second"""
+    sender, receiver = socket.socketpair()
+    sender.settimeout(5)
+    received = bytearray()
+
+    def drain():
+        while True:
+            data = receiver.recv(65536)
+            if not data:
+                break
+            received.extend(data)
+
+    reader = threading.Thread(target=drain)
+    reader.start()
+
+    def finish():
+        sender.close()
+        reader.join(5)
+        receiver.close()
+        return bytes(received)
+
+    yield sender, finish
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(bs, "STREAM_CHUNK_SIZE", 64 * 1024)
+
+
+def test_sends_the_requested_slice(source, pair, small_chunks):
+    sock, finish = pair
+    chunks = []
+    assert bs.send_file(sock, source, 1000, 200 * 1024, chunks.append) == 200 * 1024
+    assert finish() == DATA[1000:1000 + 200 * 1024]
+    assert sum(chunks) == 200 * 1024 and len(chunks) >= 4
+
+
+def test_stops_at_end_of_file(source, pair):
+    sock, finish = pair
+    assert bs.send_file(sock, source, len(DATA) - 10, 100) == 10
+    assert finish() == DATA[-10:]
+
+
+def test_falls_back_when_sendfile_is_unsupported(source, pair, monkeypatch):
+    def unsupported(*args):
+        raise OSError(errno.EINVAL, "sendfile not supported")
+
+    monkeypatch.setattr(bs.os, "sendfile", unsupported)
+    sock, finish = pair
+    assert bs.send_file(sock, source, 5, 50 * 1024) == 50 * 1024
+    assert finish() == DATA[5:5 + 50 * 1024]
+
+
+def test_falls_back_for_files_without_a_descriptor(pair):
+    sock, finish = pair
+    assert bs.send_file(sock, io.BytesIO(DATA), 0, len(DATA)) == len(DATA)
+    assert finish() == DATA
+
+
+def test_mid_stream_failure_is_raised(source, pair, small_chunks, monkeypatch):
+    real_sendfile = os.sendfile
+    calls = []
+
+    def flaky(*args):
+        calls.append(args)
+        if len(calls) > 1:
+            raise OSError(errno.EIO, "disk went away")
+        return real_sendfile(*args)
+
+    monkeypatch.setattr(bs.os, "sendfile", flaky)
+    sock, finish = pair
+    with pytest.raises(OSError, match="disk went away"):
+        bs.send_file(sock, source, 0, len(DATA))
+    finish()
+
+
+def test_throttle_grants_are_respected(source, pair):
+    sock, finish = pair
+    grants = []
+
+    def throttle(wanted):
+        grants.append(wanted)
+        return min(wanted, 10_000)
+
+    assert bs.send_file(sock, source, 0, 100_000, throttle=throttle) == 100_000
+    assert finish() == DATA[:100_000]
+    assert len(grants) >= 10 and all(wanted <= 100_000 for wanted in grants)
@@ -0,0 +1,91 @@
+import hashlib
+import os
+import zipfile
+
+import pytest
+
+import build_server as bs
+
+BINARY = os.urandom(200 * 1024)
+
+
+def sha256_of(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+@pytest.fixture
+def archive_client(config, tmp_path, local_exec, monkeypatch):
+    """A client streaming from a fake xcarchive under tmp_path/ci, with exec channels run locally"""
+    target_dir = tmp_path / "ci"
+    app = target_dir / "build" / "Ksign.xcarchive" / "Products" / "Applications" / "Ksign.app"
+    app.mkdir(parents=True)
+    (app / "Ksign").write_bytes(BINARY)
+    (app / "Info.plist").write_bytes(b"<plist/>")
+    config.set(str(target_dir), "build", "target_dir")
+    config.set("Ksign", "build", "project_name")
+    client = bs.SSHBuildClient(config)
+    client.client = local_exec()
+    monkeypatch.setattr(client, "DOWNLOAD_ATTEMPTS", 1)
+    return client
+
+
+def test_streamed_archive_is_the_app_payload(archive_client, tmp_path):
+    local = str(tmp_path / "Ksign.ipa")
+    size, sha256, remote_sha256 = archive_client._stream_archive(local)
+
+    part = f"{local}.part"
+    assert size == os.path.getsize(part)
+    assert sha256 == remote_sha256 == sha256_of(part)
+    with zipfile.ZipFile(part) as archive:
+        assert archive.read("Payload/Ksign.app/Ksign") == BINARY
+        assert archive.read("Payload/Ksign.app/Info.plist") == b"<plist/>"
+
+    # keep_remote_package tees the same bytes into packages/
+    assert sha256_of(tmp_path / "ci" / "packages" / "Ksign.ipa") == sha256
+
+
+def test_without_keep_remote_package_nothing_is_left_on_the_host(archive_client, tmp_path):
+    archive_client.config.set(False, "transfer", "keep_remote_package")
+    archive_client._stream_archive(str(tmp_path / "Ksign.ipa"))
+    assert not (tmp_path / "ci" / "packages").exists()
+
+
+def test_missing_archive_fails_without_a_part_file(archive_client, tmp_path):
+    archive_client.config.set("Missing", "build", "project_name")
+    local = str(tmp_path / "Missing.ipa")
+    with pytest.raises(RuntimeError, match="Remote command failed"):
+        archive_client._stream_archive(local)
+    assert not os.path.exists(f"{local}.part")
+
+
+def test_download_ipa_streams_and_verifies(archive_client):
+    archive_client.config.set("stream", "transfer", "packaging")
+    local = archive_client.download_ipa()
+
+    assert local and not os.path.exists(f"{local}.part")
+    manifest = bs.read_artifact_manifest(local)
+    assert manifest["verified"] is True
+    assert manifest["sha256"] == manifest["remote_sha256"] == sha256_of(local)
+    assert manifest["source"].endswith("(streamed)")
+
+
+def test_exec_download_gunzips(archive_client, tmp_path):
+    payload = tmp_path / "payload.bin"
+    payload.write_bytes(BINARY + b"tail" * 10000)
+    local = str(tmp_path / "payload.out")
+
+    size, sha256, _ = archive_client._exec_download(
+        bs.SSHBuildClient.EXEC_METHODS["gzip"].format(path=payload), local, decompress=True)
+    with open(f"{local}.part", "rb") as f:
+        assert f.read() == payload.read_bytes()
+    assert size == payload.stat().st_size
+    assert sha256 == sha256_of(payload)
+    assert archive_client.client.commands == [f"gzip -1 -c {payload}"]
+
+
+def test_exec_download_stops_when_cancelled(archive_client, tmp_path):
+    archive_client.cancel()
+    local = str(tmp_path / "payload.out")
+    with pytest.raises(bs.BuildCancelled):
+        archive_client._exec_download("yes", local)
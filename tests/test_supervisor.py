@@ -0,0 +1,60 @@
+import pytest
+
+from build_server import BuildSupervisor
+
+
+@pytest.mark.parametrize("line", [
+    "/Users/ci/EthSign/App/ViewController.swift:12:5: error: cannot find 'foo' in scope",
+    "/Users/ci/My App/Bridge.m:40: fatal error: 'Pods.h' file not found",
+    "<unknown>:0: error: unable to load standard library for target 'arm64-apple-ios15.0'",
+    "error: No signing certificate \"iOS Development\" found",
+    "fatal error: module map file not found",
+    "clang: error: linker command failed with exit code 1 (use -v to see invocation)",
+    "xcodebuild: error: Unable to find a destination matching the provided destination specifier",
+    "ld: library not found for -lPods-EthSign",
+    "ld: symbol(s) not found for architecture arm64",
+    "ld: error: undefined symbol: _main",
+    "** BUILD FAILED **",
+    "** ARCHIVE FAILED **",
+    "Code Signing Error: No profiles for 'xyz.ethsign.app' were found",
+    "/Users/ci/build/EthSign.app: errSecInternalComponent",
+    "fatal: repository 'https://github.com/ethsign/missing.git/' not found",
+])
+def test_fatal_lines(line):
+    supervisor = BuildSupervisor()
+    assert supervisor.feed(f"{line}\r\n".encode())
+    assert supervisor.errors == [line]
+
+
+@pytest.mark.parametrize("line", [
+    "note: error: shown in the previous diagnostic",
+    "warning: error: treated as a warning",
+    "ld: warning: directory not found for option '-L/usr/lib/swift'",
+    "ld: note: using the new linker",
+    "    let error: Error? = nil",
+    "remark: error: handling is incomplete",
+    "Test Case '-[EthSignTests testErrorMessage]' passed (0.002 seconds).",
+    "CompileSwift normal arm64 /Users/ci/EthSign/App/Error.swift",
+    "warning: No signing certificate found; signing ad hoc",
+    "Checking keychain for errSecInternalComponent workarounds",
+    "2026-10-17 12:00:00.000 xcodebuild[123:456] Writing error result bundle to /tmp/ResultBundle",
+    "** BUILD SUCCEEDED **",
+    "Pods: error: nothing to report",
+])
+def test_benign_lines(line):
+    supervisor = BuildSupervisor()
+    assert not supervisor.feed(f"{line}\n".encode())
+    assert not supervisor.tripped
+
+
+def test_lines_split_across_chunks():
+    supervisor = BuildSupervisor()
+    assert not supervisor.feed(b"Compiling...\n** BUILD FAI")
+    assert supervisor.feed(b"LED **\n")
+    assert supervisor.errors == ["** BUILD FAILED **"]
+
+
+def test_keeps_at_most_max_errors():
+    supervisor = BuildSupervisor()
+    supervisor.feed(b"".join(b"a.swift:%d:1: error: bad\n" % n for n in range(BuildSupervisor.MAX_ERRORS + 5)))
+    assert len(supervisor.errors) == BuildSupervisor.MAX_ERRORS
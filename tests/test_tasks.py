@@ -0,0 +1,147 @@
+import io
+import os
+import re
+import threading
+
+import pytest
+
+import build_server
+from build_server import Application, Dashboard, SSHBuildClient
+
+
+@pytest.fixture
+def app(config, monkeypatch):
+    config.set("mac.local", "ssh", "host")
+    config.set(0, "server", "port")
+    config.save()
+    monkeypatch.setattr("builtins.input", lambda prompt="": "y")
+    monkeypatch.setattr(build_server.time, "sleep", lambda seconds: None)
+    disconnected = []
+    monkeypatch.setattr(SSHBuildClient, "disconnect", lambda client: disconnected.append(client))
+    app = Application()
+    app.disconnected = disconnected
+    yield app
+    if app.server.running:
+        app.server.stop()
+
+
+def run_build(app, monkeypatch, build):
+    """Start a build from the menu and wait for its thread"""
+    monkeypatch.setattr(SSHBuildClient, "build_artifact", build)
+    app.start_build_process()
+    task = app.tasks[-1]
+    task.thread.join(5)
+    assert not task.running
+    return task
+
+
+def test_build_uses_its_own_connection(app, monkeypatch, tmp_path):
+    ipa = tmp_path / "out" / "App.ipa"
+    ipa.parent.mkdir(exist_ok=True)
+    ipa.write_bytes(b"PK")
+
+    threads = []
+
+    def build(client):
+        threads.append(threading.current_thread())
+        return str(ipa)
+
+    task = run_build(app, monkeypatch, build)
+    assert task.client is not app.ssh_client
+    assert app.disconnected == [task.client]
+    assert threads[0] is not threading.main_thread()
+
+
+def test_finished_build_is_published_on_the_main_thread(app, monkeypatch, tmp_path):
+    ipa = tmp_path / "out" / "App.ipa"
+    ipa.parent.mkdir(exist_ok=True)
+    ipa.write_bytes(b"PK")
+    task = run_build(app, monkeypatch, lambda client: str(ipa))
+
+    # The build thread only queues the task; the server is untouched until the menu loop runs
+    assert list(app.finished) == [task]
+    assert not app.server.running and app.ipa_path is None
+
+    app.handle_finished()
+    assert not app.finished
+    assert app.server.running
+    assert app.ipa_path == str(ipa)
+    assert build_server.IPAHandler.ipa_path == str(ipa)
+
+
+def test_failed_build_prints_a_summary(app, monkeypatch, capsys):
+    def build(client):
+        client.progress.set_phase("Building")
+        client.last_errors = ["ViewController.swift:12: error: cannot find 'foo' in scope"]
+        client.last_log.write(b"** BUILD FAILED **\n")
+        return None
+
+    task = run_build(app, monkeypatch, build)
+    capsys.readouterr()
+    app.handle_finished()
+
+    out = capsys.readouterr().out
+    assert f"BUILD #{task.number} FAILED" in out
+    assert "stopped during building" in out
+    assert "cannot find 'foo' in scope" in out
+    assert "** BUILD FAILED **" in out
+    assert task.log_path and task.log_path in out
+    assert not app.server.running
+
+
+def test_exception_is_reported(app, monkeypatch, capsys):
+    def build(client):
+        raise RuntimeError("disk full")
+
+    run_build(app, monkeypatch, build)
+    capsys.readouterr()
+    app.handle_finished()
+    assert "disk full" in capsys.readouterr().out
+
+
+def test_cancelled_build_is_not_reported(app, monkeypatch, capsys):
+    def build(client):
+        client.cancel()
+        raise build_server.BuildCancelled()
+
+    run_build(app, monkeypatch, build)
+    capsys.readouterr()
+    app.handle_finished()
+    assert "FAILED" not in capsys.readouterr().out
+
+
+def test_read_choice_returns_none_on_interrupt(monkeypatch):
+    monkeypatch.setattr(Dashboard, "live", property(lambda self: True))
+    monkeypatch.setattr(build_server.select, "select", lambda *args: ([], [], []))
+    pending = iter([False, False, True])
+    dashboard = Dashboard()
+    assert dashboard.read_choice(lambda: ["line"], "> ", interrupt=lambda: next(pending)) is None
+
+
+def test_console_router_keeps_background_output():
+    terminal = io.StringIO()
+    router = build_server.ConsoleRouter(terminal)
+    router.write("main\n")
+    thread = threading.Thread(target=router.write, args=("\x1b[31mfailed\x1b[0m\npartial\rprogress",))
+    thread.start()
+    thread.join()
+    assert terminal.getvalue() == "main\n"
+    assert router.recent(5) == ["failed", "progress"]
+
+
+def test_each_build_writes_its_own_ipa(app, monkeypatch):
+    def build(client):
+        path = client.local_ipa_path()
+        with open(path, "wb") as f:
+            f.write(b"PK")
+        return path
+
+    first = run_build(app, monkeypatch, build)
+    second = run_build(app, monkeypatch, build)
+    app.handle_finished()
+
+    names = [os.path.basename(task.ipa_path) for task in (first, second)]
+    assert names[0] != names[1]
+    assert all(re.fullmatch(r"Ksign-[0-9a-f]{12}\.ipa", name) for name in names)
+    assert first.config.get("build", "target_dir") == app.config.get("build", "target_dir")
+    assert sorted(entry.name for entry in app.catalog.entries()) == sorted(names)
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import threading
+
+import pytest
+
+import build_server as bs
+
+
+def sha256_of(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+@pytest.fixture
+def remote_file(tmp_path):
+    path = tmp_path / "remote.ipa"
+    path.write_bytes(os.urandom(5 * 1024 * 1024 + 123))
+    return str(path)
+
+
+class TestChunkedDownloader:
+    def test_download_leaves_a_verified_part_file(self, tmp_path, remote_file, local_sftp):
+        local = str(tmp_path / "Ksign.ipa")
+        downloader = bs.ChunkedDownloader(local_sftp(), channels=3, chunk_size=1024 * 1024)
+
+        size, sha256 = downloader.download(remote_file, local)
+
+        assert size == os.path.getsize(remote_file)
+        assert sha256 == sha256_of(remote_file)
+        assert sha256_of(f"{local}.part") == sha256
+        assert not os.path.exists(local)
+        assert not os.path.exists(f"{local}.part.json")
+
+    def test_resumes_from_the_journal(self, tmp_path, remote_file, local_sftp):
+        local = str(tmp_path / "Ksign.ipa")
+        with pytest.raises(EOFError):
+            bs.ChunkedDownloader(local_sftp(fail_after=2), channels=1, chunk_size=1024 * 1024).download(remote_file, local)
+        with open(f"{local}.part.json") as f:
+            assert len(json.load(f)["done"]) == 2
+
+        sftp = local_sftp()
+        size, sha256 = bs.ChunkedDownloader(sftp, channels=2, chunk_size=1024 * 1024).download(remote_file, local)
+
+        assert sha256 == sha256_of(remote_file)
+        # The two finished chunks (1 MiB each, read in 1 MiB pieces) are not fetched again
+        assert len(sftp.reads) == 4
+
+    def test_workers_stay_within_the_window_of_the_hash(self, tmp_path, remote_file, local_sftp):
+        chunk = 256 * 1024
+        first_chunk_done = threading.Event()
+        started_early = []
+
+        class SlowFirstChunk(local_sftp):
+            def open(self, path, mode):
+                remote = super().open(path, mode)
+                readv = remote.readv
+
+                def slow_readv(chunks):
+                    offset = chunks[0][0]
+                    if offset == 0:
+                        first_chunk_done.wait(0.5)
+                    elif not first_chunk_done.is_set():
+                        started_early.append(offset // chunk)
+                    try:
+                        return readv(chunks)
+                    finally:
+                        if offset == 0:
+                            first_chunk_done.set()
+                remote.readv = slow_readv
+                return remote
+
+        downloader = bs.ChunkedDownloader(SlowFirstChunk(), channels=2, chunk_size=chunk)
+        local = str(tmp_path / "Ksign.ipa")
+        size, sha256 = downloader.download(remote_file, local)
+
+        assert sha256 == sha256_of(remote_file)
+        assert max(started_early) < 2 * downloader.AHEAD_PER_CHANNEL
+
+
+class TestVerifiedPublish:
+    def test_staged_manifest_is_moved_with_the_artifact(self, tmp_path):
+        path = str(tmp_path / "Ksign.ipa")
+        with open(f"{path}.part", "wb") as f:
+            f.write(b"new build")
+        digest = hashlib.sha256(b"new build").hexdigest()
+
+        manifest = bs.write_artifact_manifest(path, digest, digest, "mac:/Ksign.ipa", staged=True)
+
+        assert not os.path.exists(f"{path}.part")
+        assert manifest["name"] == "Ksign.ipa"
+        assert bs.read_artifact_manifest(path)["verified"] is True
+
+    def test_manifest_of_another_file_is_ignored(self, tmp_path):
+        path = str(tmp_path / "Ksign.ipa")
+        with open(path, "wb") as f:
+            f.write(b"old")
+        bs.write_artifact_manifest(path, "a" * 64)
+        with open(path, "wb") as f:
+            f.write(b"replaced without a manifest")
+
+        assert bs.read_artifact_manifest(path) == {}
+
+    def test_checksum_mismatch_keeps_the_last_good_ipa(self, config, remote_file, local_sftp, monkeypatch):
+        client = bs.SSHBuildClient(config)
+        monkeypatch.setattr(client, "_open_sftp", local_sftp())
+        monkeypatch.setattr(client, "DOWNLOAD_ATTEMPTS", 1)
+        good = client.download_ipa(remote_file, sha256_of(remote_file))
+        good_manifest = bs.read_artifact_manifest(good)
+        assert good_manifest["verified"] is True
+
+        with open(remote_file, "ab") as f:
+            f.write(b"corrupted in transit")
+        assert client.download_ipa(remote_file, good_manifest["sha256"]) is None
+
+        assert sha256_of(good) == good_manifest["sha256"]
+        assert bs.read_artifact_manifest(good) == good_manifest
+        assert not os.path.exists(f"{good}.part")
+        assert not os.path.exists(f"{good}.part.json")
+
+    def test_download_is_hashed_only_once(self, config, remote_file, local_sftp, monkeypatch):
+        client = bs.SSHBuildClient(config)
+        monkeypatch.setattr(client, "_open_sftp", local_sftp())
+        local = client.download_ipa(remote_file)
+
+        # The digest computed while downloading is what the server hands out
+        monkeypatch.setattr(bs, "hash_file", lambda path: pytest.fail("re-hashed the download"))
+        assert bs.CONTENT_HASHES.get(local) == sha256_of(remote_file)
+        manifest = bs.read_artifact_manifest(local)
+        assert manifest["sha256"] == sha256_of(remote_file)
+        assert manifest["remote_sha256"] is None and manifest["verified"] is None
+
+
+class TestContentHashCache:
+    def counting(self, monkeypatch):
+        calls = []
+        real = bs.hash_file
+
+        def hash_file(path):
+            calls.append(path)
+            return real(path)
+
+        monkeypatch.setattr(bs, "hash_file", hash_file)
+        return calls
+
+    def test_cached_until_the_file_changes(self, tmp_path, monkeypatch):
+        calls = self.counting(monkeypatch)
+        path = tmp_path / "Ksign.ipa"
+        path.write_bytes(b"first")
+        cache = bs.ContentHashCache()
+
+        assert cache.get(str(path)) == cache.get(str(path)) == hashlib.sha256(b"first").hexdigest()
+        assert len(calls) == 1
+        path.write_bytes(b"second build")
+        assert cache.get(str(path)) == hashlib.sha256(b"second build").hexdigest()
+        assert len(calls) == 2
+
+    def test_seeded_digest_is_used(self, tmp_path, monkeypatch):
+        calls = self.counting(monkeypatch)
+        path = tmp_path / "Ksign.ipa"
+        path.write_bytes(b"downloaded")
+        cache = bs.ContentHashCache()
+        cache.seed(str(path), "f" * 64)
+        assert cache.get(str(path)) == "f" * 64
+        assert not calls
+
+    def test_concurrent_requests_hash_once(self, tmp_path, monkeypatch):
+        calls = self.counting(monkeypatch)
+        path = tmp_path / "Ksign.ipa"
+        path.write_bytes(os.urandom(8 * 1024 * 1024))
+        cache = bs.ContentHashCache()
+        digests = []
+        threads = [threading.Thread(target=lambda: digests.append(cache.get(str(path)))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert digests == [sha256_of(path)] * 8
+        assert len(calls) == 1
@@ -0,0 +1,133 @@
+import os
+import subprocess
+
+import pytest
+
+from build_server import SSHBuildClient
+
+
+def git(cwd, *args):
+    return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+@pytest.fixture
+def origin(tmp_path, monkeypatch):
+    """A repository with a submodule, standing in for the remote"""
+    for name in ("AUTHOR", "COMMITTER"):
+        monkeypatch.setenv(f"GIT_{name}_NAME", "ci")
+        monkeypatch.setenv(f"GIT_{name}_EMAIL", "ci@example.com")
+    monkeypatch.setenv("GIT_CONFIG_COUNT", "1")
+    monkeypatch.setenv("GIT_CONFIG_KEY_0", "protocol.file.allow")
+    monkeypatch.setenv("GIT_CONFIG_VALUE_0", "always")
+
+    library = tmp_path / "library"
+    library.mkdir()
+    git(library, "init", "-q", "-b", "main")
+    (library / "lib.swift").write_text("let version = 1\n")
+    git(library, "add", ".")
+    git(library, "commit", "-q", "-m", "library")
+
+    repo = tmp_path / "origin"
+    repo.mkdir()
+    git(repo, "init", "-q", "-b", "main")
+    (repo / "App.swift").write_text("print(1)\n")
+    git(repo, "submodule", "-q", "add", library.as_uri(), "Library")
+    git(repo, "add", ".")
+    git(repo, "commit", "-q", "-m", "first")
+    return repo
+
+
+@pytest.fixture
+def client(config, origin, tmp_path):
+    """A build client whose remote commands run in a local shell"""
+    config.set(origin.as_uri(), "build", "repo_url")
+    config.set("main", "build", "branch")
+    config.set(str(tmp_path / "workspace"), "build", "target_dir")
+    client = SSHBuildClient(config)
+    client.commands = []
+
+    def execute(command, show_output=True, capture=True, supervisor=None):
+        client.commands.append(command)
+        result = subprocess.run(["bash", "-c", command], capture_output=True, text=True)
+        return result.returncode, result.stdout + result.stderr
+
+    client.execute = execute
+    return client
+
+
+def workspace(client):
+    return client.config.get("build", "target_dir")
+
+
+def test_first_build_clones(client, origin):
+    assert client.clone_repo()
+    assert git(workspace(client), "rev-parse", "HEAD") == git(origin, "rev-parse", "HEAD")
+    assert os.path.isfile(os.path.join(workspace(client), "Library", "lib.swift"))
+    assert any("git clone --filter=blob:none" in command for command in client.commands)
+
+
+def test_update_keeps_build_outputs(client, origin):
+    assert client.clone_repo()
+    root = workspace(client)
+    for output in SSHBuildClient.WORKSPACE_OUTPUTS:
+        os.makedirs(os.path.join(root, output))
+        with open(os.path.join(root, output, "marker"), "w") as f:
+            f.write("kept")
+    with open(os.path.join(root, "stray.txt"), "w") as f:
+        f.write("untracked")
+    with open(os.path.join(root, "App.swift"), "w") as f:
+        f.write("local edit\n")
+
+    (origin / "App.swift").write_text("print(2)\n")
+    git(origin, "commit", "-q", "-am", "second")
+    client.commands.clear()
+
+    assert client.clone_repo()
+    assert not any("git clone" in command for command in client.commands)
+    assert git(root, "rev-parse", "HEAD") == git(origin, "rev-parse", "HEAD")
+    with open(os.path.join(root, "App.swift")) as f:
+        assert f.read() == "print(2)\n"
+    assert not os.path.exists(os.path.join(root, "stray.txt"))
+    for output in SSHBuildClient.WORKSPACE_OUTPUTS:
+        assert os.path.isfile(os.path.join(root, output, "marker"))
+
+
+def test_workspace_of_another_repository_is_recloned(client, origin, tmp_path):
+    other = tmp_path / "other"
+    other.mkdir()
+    git(other, "init", "-q", "-b", "main")
+    (other / "README").write_text("other\n")
+    git(other, "add", ".")
+    git(other, "commit", "-q", "-m", "other")
+    git(tmp_path, "clone", "-q", other.as_uri(), workspace(client))
+
+    assert client.clone_repo()
+    assert any("git clone --filter=blob:none" in command for command in client.commands)
+    assert git(workspace(client), "remote", "get-url", "origin") == origin.as_uri()
+
+
+def test_fresh_mode_always_clones(client, origin):
+    client.config.set("fresh", "build", "workspace_mode")
+    assert client.clone_repo()
+    os.makedirs(os.path.join(workspace(client), "build"))
+    assert client.clone_repo()
+    assert sum("git clone --recursive" in command for command in client.commands) == 2
+    assert not os.path.exists(os.path.join(workspace(client), "build"))
+
+
+def test_unknown_branch_fails(client):
+    client.config.set("no-such-branch", "build", "branch")
+    assert not client.clone_repo()
+
+
+def test_moved_submodule_is_synced(client, origin, tmp_path):
+    assert client.clone_repo()
+    library = tmp_path / "library"
+    (library / "lib.swift").write_text("let version = 2\n")
+    git(library, "commit", "-q", "-am", "library 2")
+    git(origin / "Library", "pull", "-q", "origin", "main")
+    git(origin, "commit", "-q", "-am", "bump library")
+
+    assert client.clone_repo()
+    with open(os.path.join(workspace(client), "Library", "lib.swift")) as f:
+        assert f.read() == "let version = 2\n"